@@ -27,6 +27,11 @@ namespace EBIVisualiser
         private List<(double x, double y)> _scatterPositions = new List<(double x, double y)>();
 
         private List<string> _freqLabels = new List<string> {"1kHz", "2kHz", "3kHz", "7kHz", "11kHz", "17kHz", "23kHz", "31kHz", "43kHz", "61kHz", "89kHz", "127kHz", "179kHz", "251kHz", "349kHz" };
+
+        // Binary messages, see visualiser_protocol.py
+        private const byte MessageMarker = 0xEB;
+        private const int MessageHeaderSize = 16;
+        private Dictionary<char, List<List<double>>> _binarySeries = new Dictionary<char, List<List<double>>> { { 'R', new List<List<double>>() }, { 'C', new List<List<double>>() } };
         public MainWindow()
         {
             InitializeComponent();
@@ -175,6 +180,91 @@ namespace EBIVisualiser
             return (dataSeries, freqSorted);
         }
 
+        private Dictionary<int, List<double>> SeriesByFrequency(List<List<double>> seriesList)
+        {
+            Dictionary<int, List<double>> dataSeries = new Dictionary<int, List<double>>();
+            foreach (List<double> seriesVals in seriesList.Where(p => p != null))
+            {
+                for (int freq = 0; freq < seriesVals.Count; freq++)
+                {
+                    if (!dataSeries.ContainsKey(freq))
+                    {
+                        dataSeries.Add(freq, new List<double>());
+                    }
+                    dataSeries[freq].Add(seriesVals[freq]);
+                }
+            }
+
+            return dataSeries;
+        }
+
+        private void HandleBinaryMessages(List<byte> buffer)
+        {
+            while (buffer.Count >= MessageHeaderSize)
+            {
+                byte[] header = buffer.GetRange(0, MessageHeaderSize).ToArray();
+                char type = (char)header[1];
+                bool delta = (header[2] & 1) != 0;
+                int components = header[3];
+                int frameLength = (int)BitConverter.ToUInt32(header, 4);
+                int start = BitConverter.ToUInt16(header, 8);
+                int rows = BitConverter.ToUInt16(header, 10);
+                int columns = BitConverter.ToUInt16(header, 12);
+
+                if (buffer.Count < frameLength)
+                {
+                    return;
+                }
+
+                byte[] frame = buffer.GetRange(0, frameLength).ToArray();
+                buffer.RemoveRange(0, frameLength);
+
+                // Only the first component is plotted, as with the text messages
+                List<List<double>> series = new List<List<double>>();
+                for (int row = 0; row < rows; row++)
+                {
+                    List<double> seriesVals = new List<double>();
+                    for (int column = 0; column < columns; column++)
+                    {
+                        seriesVals.Add(BitConverter.ToSingle(frame, MessageHeaderSize + (row * columns + column) * components * 4));
+                    }
+                    series.Add(seriesVals);
+                }
+
+                switch (type)
+                {
+                    case 'R':
+                    case 'C':
+                    {
+                        List<List<double>> current = _binarySeries[type];
+                        if (!delta)
+                        {
+                            current.Clear();
+                        }
+                        for (int row = 0; row < rows; row++)
+                        {
+                            while (current.Count <= start + row)
+                            {
+                                current.Add(null);
+                            }
+                            current[start + row] = series[row];
+                        }
+
+                        PlotView view = type == 'R' ? RawPlot : ConductivityPlot;
+                        ClearPlot(view);
+                        AddMultipleDataRanges(ConvertToSeries(SeriesByFrequency(current)), view);
+                        break;
+                    }
+                    case 'P':
+                        AddHeatPoint((int)series[0][0], (int)series[0][1], series[0][2]);
+                        break;
+                    case 'A':
+                        AddScatterPoint(series[0][0], series[0][1]);
+                        break;
+                }
+            }
+        }
+
         private void TcpConnection()
         {
             TcpListener server = null;
@@ -200,6 +290,9 @@ namespace EBIVisualiser
                     // Get a stream object for reading and writing
                     NetworkStream stream = client.GetStream();
 
+                    // Binary messages can span several reads
+                    List<byte> binaryBuffer = new List<byte>();
+
                     int i;
 
                     // Loop to receive all the data sent by the client.
@@ -207,6 +300,12 @@ namespace EBIVisualiser
                     {
                         try
                         {
+                            if (binaryBuffer.Count > 0 || bytes[0] == MessageMarker)
+                            {
+                                binaryBuffer.AddRange(bytes.Take(i));
+                                HandleBinaryMessages(binaryBuffer);
+                                continue;
+                            }
 
                             // Translate data bytes to a ASCII string.
                             string data = Encoding.UTF8.GetString(bytes, 0, i);
@@ -25,6 +25,22 @@ while 1
             break
         end
     end
+    % Binary protocol probe, answer with the frame magic
+    if strcmp(data, "p")
+        write(server, uint8('EBIB'), "uint8");
+    end
+
+    % Binary sample: header followed by single precision value pairs, frequency by frequency
+    if strcmp(data, "b")
+        output = ElikoSample();
+        % Components in the same order the text frame is read in on the Python side
+        pairs = single([imag(output(:)).'; real(output(:)).']);
+        payload = typecast(pairs(:).', 'uint8');
+        header = [uint8('EBIB'), typecast(uint32(16 + numel(payload)), 'uint8'), ...
+            typecast(uint32(size(output, 1)), 'uint8'), typecast(uint16(size(output, 2)), 'uint8'), uint8(4), uint8(0)];
+        write(server, [header, payload], "uint8");
+    end
+
     % End loop if end char received
     if strcmp(data, "e")
         break;
@@ -0,0 +1,224 @@
+import os, time
+import numpy as np
+from calculation_functions import rectangular_to_array
+
+# File layout: a fixed size header followed by records of a fixed size record header and the
+# reading's complex samples, frequency by frequency. Records can differ in sample count, so the offset
+# of every record is appended to an index file next to the log.
+LOG_MAGIC = b'EBIRAWLG'
+LOG_VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u2'), ('reserved', 'V22')])
+
+# Position values in the order Sampler.SaveData writes them to data.txt
+POSITION_FIELDS = ['cse_x', 'cse_y', 'surface_height', 'sampling_depth', 'vme_x', 'vme_y', 'distance', 'step_size']
+RECORD_DTYPE = np.dtype([('timestamp', '<f8')] + [(field, '<f8') for field in POSITION_FIELDS] + [('frequency_count', '<u4'), ('sample_count', '<u4')])
+SAMPLE_DTYPE = np.dtype('<c16')
+
+# Classes
+
+class AcquisitionLog:
+    def __init__(self, path):
+        """Initialises an append-only binary log of raw readings, kept open for the whole session.
+
+        Args:
+            path (str): Path to log file, the index is written to path + '.idx'
+
+        Returns:
+            New AcquisitionLog object
+        """
+        self.path = path
+        self.index_path = path + '.idx'
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            read_log_header(self.path)
+        else:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header['magic'] = LOG_MAGIC
+            header['version'] = LOG_VERSION
+            with open(self.path, 'wb') as f:
+                f.write(header.tobytes())
+            with open(self.index_path, 'wb'):
+                pass
+
+        # Drop a partly written last record and rebuild the index if an earlier session was interrupted
+        (offsets, end) = scan_offsets(self.path)
+        if os.path.getsize(self.path) > end:
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) != len(offsets) * 8:
+            offsets.astype('<u8').tofile(self.index_path)
+
+        self.file = open(self.path, 'ab')
+        self.index_file = open(self.index_path, 'ab')
+        self.count = len(offsets)
+
+    def __len__(self):
+        return self.count
+
+    def Append(self, position, data, timestamp = None):
+        """Appends a reading
+
+        Args:
+            position (list<float>): Position values in the order of POSITION_FIELDS
+            data (np.ndarray or dict<int, list<tuple<float, float>>>): Complex samples shaped (frequencies, samples), or a reading as returned by GetComplexData
+            timestamp (float): Seconds since the epoch, now if None
+
+        Returns:
+            int: Index of the new record
+        """
+        samples = reading_to_complex(data)
+
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record['timestamp'] = time.time() if timestamp is None else timestamp
+        for field, value in zip(POSITION_FIELDS, position):
+            record[field] = value
+        record['frequency_count'] = samples.shape[0]
+        record['sample_count'] = samples.shape[1]
+
+        offset = self.file.tell()
+        self.file.write(record.tobytes())
+        self.file.write(samples.astype(SAMPLE_DTYPE).tobytes())
+        self.file.flush()
+
+        self.index_file.write(np.array([offset], dtype='<u8').tobytes())
+        self.index_file.flush()
+
+        self.count += 1
+        return self.count - 1
+
+    def Close(self):
+        self.file.close()
+        self.index_file.close()
+
+class AcquisitionLogReader:
+    def __init__(self, path):
+        """Initialises a memory-mapped reader of a log written by AcquisitionLog.
+
+        Args:
+            path (str): Path to log file
+
+        Returns:
+            New AcquisitionLogReader object
+        """
+        self.path = path
+        read_log_header(path)
+
+        index_path = path + '.idx'
+        if os.path.exists(index_path):
+            self.offsets = np.fromfile(index_path, dtype='<u8').astype(np.int64)
+        else:
+            self.offsets = scan_offsets(path)[0]
+
+        self.data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) > HEADER_DTYPE.itemsize else np.zeros(0, dtype=np.uint8)
+
+        # An offset can be written before its record is complete if a session was interrupted
+        while len(self.offsets) > 0 and not self.IsComplete(len(self.offsets) - 1):
+            self.offsets = self.offsets[:-1]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def IsComplete(self, index):
+        offset = self.offsets[index]
+        if offset + RECORD_DTYPE.itemsize > len(self.data):
+            return False
+        record = self.data[offset:offset + RECORD_DTYPE.itemsize].view(RECORD_DTYPE)[0]
+        return offset + RECORD_DTYPE.itemsize + int(record['frequency_count']) * int(record['sample_count']) * SAMPLE_DTYPE.itemsize <= len(self.data)
+
+    def Record(self, index):
+        """Header of one record
+
+        Args:
+            index (int): Record index
+
+        Returns:
+            np.void: Record with timestamp, position fields, frequency_count and sample_count
+        """
+        offset = self.offsets[index]
+        return self.data[offset:offset + RECORD_DTYPE.itemsize].view(RECORD_DTYPE)[0]
+
+    def Samples(self, index):
+        """Samples of one record, without copying
+
+        Args:
+            index (int): Record index
+
+        Returns:
+            np.ndarray: Read-only complex samples shaped (frequencies, samples), as returned by GetComplexData
+        """
+        record = self.Record(index)
+        start = self.offsets[index] + RECORD_DTYPE.itemsize
+        shape = (int(record['frequency_count']), int(record['sample_count']))
+        return self.data[start:start + shape[0] * shape[1] * SAMPLE_DTYPE.itemsize].view(SAMPLE_DTYPE).reshape(shape)
+
+    def Records(self):
+        """All record headers
+
+        Returns:
+            np.ndarray: Structured array of RECORD_DTYPE, one entry per record
+        """
+        records = np.zeros(len(self), dtype=RECORD_DTYPE)
+        for i in range(len(self)):
+            records[i] = self.Record(i)
+        return records
+
+    def Positions(self):
+        """Position values of all records
+
+        Returns:
+            np.ndarray: Values shaped (records, 8) in the order of POSITION_FIELDS
+        """
+        records = self.Records()
+        return np.stack([records[field] for field in POSITION_FIELDS], axis=1)
+
+# Functions
+
+def read_log_header(path):
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header['magic'][0] != LOG_MAGIC:
+        raise ValueError('%s is not an acquisition log' % (path))
+
+    if header['version'][0] != LOG_VERSION:
+        raise ValueError('Unsupported acquisition log version %d' % (header['version'][0]))
+
+def scan_offsets(path):
+    """Finds the offset of every complete record by walking the log
+
+    Args:
+        path (str): Path to log file
+
+    Returns:
+        (np.ndarray, int): Record offsets and the end of the last complete record
+    """
+    offsets = []
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = HEADER_DTYPE.itemsize
+        while offset + RECORD_DTYPE.itemsize <= size:
+            f.seek(offset)
+            record = np.frombuffer(f.read(RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)[0]
+            end = offset + RECORD_DTYPE.itemsize + int(record['frequency_count']) * int(record['sample_count']) * SAMPLE_DTYPE.itemsize
+            if end > size:
+                break
+            offsets.append(offset)
+            offset = end
+
+    return np.array(offsets, dtype=np.int64), offset
+
+def reading_to_complex(data):
+    """Converts a reading to complex samples shaped (frequencies, samples)
+
+    Args:
+        data (np.ndarray or dict<int, list<tuple<float, float>>>): Complex array, or a reading as returned by GetComplexData
+
+    Returns:
+        np.ndarray: complex128 samples
+    """
+    if isinstance(data, np.ndarray):
+        return data
+
+    array = rectangular_to_array(data)
+    if array is None:
+        raise ValueError('All frequencies of a logged reading need the same number of samples')
+
+    return array[..., 0] + 1j * array[..., 1]
@@ -0,0 +1,920 @@
+import os, sys, math, time, random, socket, threading, tracemalloc, inspect
+from datetime import datetime
+import multiprocessing
+import numpy as np
+from sim_loading import load_comsol_columns, get_data, get_data_grid, iter_data_points, comsol_cache
+from calculation_functions import ConductivitySet, StreamingComplexMedian, get_complex_medians_from_rectangular, get_means, calculate_conductivity_series, calculate_conductivity_batch
+from robot_sockets import MatlabSockets, VisualisationConnection
+from sampler import Sampler
+from sensor_emulator import SensorEmulator
+from sensor_protocol import encode_text_frame, encode_binary_frame, decode_binary_frame, complex_array_to_dict
+from visualiser_protocol import VisualiserStreamDecoder
+from acquisition_log import AcquisitionLog, AcquisitionLogReader
+from format_conversion import parse_to_datapoints, log_to_datapoints
+from robot_controller import Robot
+from robot_calibration import r1_calibration, r2_calibration, ur1_Rot, ur2_Rot, ur1_Org, ur2_Org, theta1, theta2
+from robot_session import SessionManager
+from motion_scheduler import MotionScheduler
+from rtde_standin import standin_factory
+from scan_planner import grid_points
+from util import Logger, read_binary_log, parse_string_to_complex, parse_complex_array, stringify_complex_noscale, reshape_data_set_tuples, windows_from_rows
+
+# Functions
+
+def time_call(func, *args, **kwargs):
+    tic = time.perf_counter()
+    result = func(*args, **kwargs)
+    toc = time.perf_counter()
+    return result, toc - tic
+
+def benchmark_comsol_cache(folder_path, header):
+    """Reports cold and warm load times of the COMSOL column cache for a folder of exports
+
+    Args:
+        folder_path (str): Folder of COMSOL exports, e.g. 'water_data_output'
+        header (dict): A dictionary over keys and their column numbers in the data files
+
+    Returns:
+        None
+    """
+    files = [os.path.join(folder_path, f) for f in sorted(os.listdir(folder_path))]
+
+    comsol_cache.Clear()
+
+    cold_time = 0
+    for file_path in files:
+        _, elapsed = time_call(load_comsol_columns, file_path, header)
+        cold_time += elapsed
+
+    warm_time = 0
+    for file_path in files:
+        _, elapsed = time_call(load_comsol_columns, file_path, header)
+        warm_time += elapsed
+
+    rows_time = 0
+    for file_path in files:
+        _, elapsed = time_call(get_data, file_path, header, False)
+        rows_time += elapsed
+
+    print('COMSOL cache, %d files' % (len(files)))
+    print('Cold load: %f s' % (cold_time))
+    print('Warm load: %f s (%.1fx faster)' % (warm_time, cold_time / warm_time))
+    print('Warm get_data incl. row dictionaries: %f s' % (rows_time))
+
+def benchmark_complex_parser(samples = 200, frequencies = 15, repeats = 20):
+    """Compares per-value parse_string_to_complex against the bulk parse_complex_array
+
+    Args:
+        samples (int): Samples per frequency in the synthetic measurement line
+        frequencies (int): Number of frequencies in the synthetic measurement line
+        repeats (int): Number of times each parser is run
+
+    Returns:
+        None
+    """
+    values = [(random.uniform(0.001, 0.01), random.uniform(-0.001, 0.001)) for _ in range(samples * frequencies)]
+    tokens = [stringify_complex_noscale(v) for v in values]
+    line = '; '.join(tokens) + '\n'
+
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        [parse_string_to_complex(token) for token in line.split('; ')]
+    per_value_time = (time.perf_counter() - tic) / repeats
+
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        parse_complex_array(line)
+    bulk_time = (time.perf_counter() - tic) / repeats
+
+    print('Complex parser, %d samples x %d frequencies' % (samples, frequencies))
+    print('parse_string_to_complex: %f ms per line' % (per_value_time * 1000))
+    print('parse_complex_array: %f ms per line (%.1fx faster)' % (bulk_time * 1000, per_value_time / bulk_time))
+
+def benchmark_conductivity_batch(sample_counts = (10000, 100000, 1000000), positions = 6, frequencies = 15, digits = 4, chunk_size = 100000, loop_samples = 1000):
+    """Compares calculate_conductivity_series in a loop against calculate_conductivity_batch
+
+    Args:
+        sample_counts (list<int>): Numbers of samples to time the batched call for
+        positions (int): Electrode positions per sample
+        frequencies (int): Frequencies per position
+        digits (int): Number of digits to round to
+        chunk_size (int): Largest number of samples converted in one call, bounds memory use
+        loop_samples (int): Number of samples timed with the per-sample loop, extrapolated to the larger counts
+
+    Returns:
+        None
+    """
+    rng = np.random.default_rng(0)
+    distances = np.array([6, 7, 9, 11, 15, 21][:positions], dtype=np.float64)
+
+    def make_data(n):
+        return rng.uniform(1, 10, (n, positions, frequencies)) + 1j * rng.uniform(-1, 1, (n, positions, frequencies))
+
+    data = make_data(loop_samples)
+    tuple_data = [[list(zip(p.real.tolist(), p.imag.tolist())) for p in sample] for sample in data]
+
+    tic = time.perf_counter()
+    loop_result = [calculate_conductivity_series(sample, distances.tolist(), digits=digits) for sample in tuple_data]
+    loop_time = (time.perf_counter() - tic) / loop_samples
+
+    batch_result = calculate_conductivity_batch(data, distances, digits=digits)
+    max_error = np.max(np.abs(batch_result - np.array(loop_result)))
+
+    print('Conductivity batch, %d positions x %d frequencies, max difference %g' % (positions, frequencies, max_error))
+    for count in sample_counts:
+        batch_time = 0
+        for start in range(0, count, chunk_size):
+            chunk = make_data(min(chunk_size, count - start))
+            _, elapsed = time_call(calculate_conductivity_batch, chunk, distances, digits=digits)
+            batch_time += elapsed
+
+        print('%d samples: loop %f s (extrapolated), batch %f s (%.1fx faster)' % (count, loop_time * count, batch_time, loop_time * count / batch_time))
+
+def measure_peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    result = func(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+def benchmark_windowing(file_path, header, samples_to_group = 8):
+    """Compares memory use and time of reshape_data_set_tuples against the array backed DataWindows
+
+    Args:
+        file_path (str): Path to a COMSOL export
+        header (dict): A dictionary over keys and their column numbers in the data file
+        samples_to_group (int): Number of consecutive distances per window
+
+    Returns:
+        None
+    """
+    X_grid, _ = get_data_grid(file_path, header)
+
+    tuples, tuple_peak = measure_peak_memory(reshape_data_set_tuples, X_grid, samples_to_group)
+    _, tuple_time = time_call(reshape_data_set_tuples, X_grid, samples_to_group)
+
+    def build_windows():
+        windows = windows_from_rows(X_grid, samples_to_group)
+        return windows, windows.Conductivities()
+
+    (windows, _), window_peak = measure_peak_memory(build_windows)
+    _, window_time = time_call(build_windows)
+
+    print('Windowing %s, %d windows of %d samples' % (file_path, len(windows), samples_to_group))
+    print('reshape_data_set_tuples: peak %.1f MB, %f s' % (tuple_peak / 1e6, tuple_time))
+    print('DataWindows incl. conductivities: peak %.1f MB, %f s' % (window_peak / 1e6, window_time))
+
+def write_synthetic_comsol_export(file_path, target_bytes, grid_step = 1):
+    """Writes a synthetic COMSOL grid export of roughly the given size
+
+    Args:
+        file_path (str): Path of export to write
+        target_bytes (int): Approximate file size in bytes
+        grid_step (int): Spacing of probe positions in mm
+
+    Returns:
+        None
+    """
+    rng = np.random.default_rng(0)
+    distances = [6, 7, 9, 11, 15, 21]
+    frequencies = [1, 2, 3, 7, 11, 17, 23, 31, 43, 61, 89, 127, 179, 251, 349]
+    rows_per_position = len(distances) * len(frequencies)
+
+    with open(file_path, 'w', newline='') as f:
+        for i in range(5):
+            f.write('%% Synthetic export line %d\r\n' % (i))
+
+        x = -20
+        while f.tell() < target_bytes:
+            for y in range(-20, 21, grid_step):
+                real = rng.uniform(0.001, 0.01, rows_per_position)
+                imag = rng.uniform(-0.001, 0.001, rows_per_position)
+                lines = []
+                for index in range(rows_per_position):
+                    d = distances[index // len(frequencies)]
+                    freq = frequencies[index % len(frequencies)]
+                    lines.append('0  0  -30  %d  %d  %d  %d  %.9f%+.9fi\r\n' % (x, y, d, freq, real[index], imag[index]))
+                f.write(''.join(lines))
+            x += grid_step
+
+def consume_data_points(file_path, header, samples_to_group, chunk_size, result_queue):
+    import resource
+
+    row_count = 0
+    tic = time.perf_counter()
+    for batch in iter_data_points(file_path, header, 'test', samples_to_group, chunk_size=chunk_size):
+        row_count += len(batch)
+    toc = time.perf_counter()
+
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_bytes = peak if sys.platform == 'darwin' else peak * 1024
+
+    result_queue.put((row_count, toc - tic, peak_bytes))
+
+def benchmark_streaming(file_path = 'synthetic_export.txt', target_bytes = 5 * 10**9, samples_to_group = 8, chunk_sizes = (10000, 100000)):
+    """Reports peak RSS and throughput of the streaming reader on a large synthetic export.
+    Each run happens in a fresh process so peak RSS is not shared between runs. Needs the Unix resource module.
+
+    Args:
+        file_path (str): Path of the synthetic export, written first if it doesn't exist
+        target_bytes (int): Approximate size of the synthetic export
+        samples_to_group (int): Number of consecutive distances per window
+        chunk_sizes (list<int>): Chunk sizes to run the streaming reader with
+
+    Returns:
+        None
+    """
+    if not os.path.exists(file_path):
+        print('Writing %.1f GB synthetic export to %s' % (target_bytes / 1e9, file_path))
+        write_synthetic_comsol_export(file_path, target_bytes)
+
+    header = {'lymph_y':0, 'lymph_x':1, 'depth':2, 'x_dist':3, 'y_dist':4, 'distance':5, 'frequency':6, 'potential':7}
+    file_size = os.path.getsize(file_path)
+
+    print('Streaming %s (%.2f GB)' % (file_path, file_size / 1e9))
+    for chunk_size in chunk_sizes:
+        result_queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=consume_data_points, args=(file_path, header, samples_to_group, chunk_size, result_queue))
+        process.start()
+        (window_count, elapsed, peak_bytes) = result_queue.get()
+        process.join()
+
+        print('Chunk size %d: %d windows in %f s (%.1f MB/s), peak RSS %.1f MB' % (chunk_size, window_count, elapsed, file_size / 1e6 / elapsed, peak_bytes / 1e6))
+
+def benchmark_sensor_protocol(sample_count = 99, repeats = 200):
+    """Compares wire size, decode latency and round trip throughput of text and binary sensor frames against the sensor emulator
+
+    Args:
+        sample_count (int): Samples per reading
+        repeats (int): Number of readings per protocol
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(sample_count=sample_count, seed=0)
+    emulator.Start()
+
+    reading = emulator.GenerateReading()
+    text_frame = encode_text_frame(reading)
+    binary_frame = encode_binary_frame(reading, value_size=4)
+
+    def decode_text():
+        response = text_frame.decode('utf-8').replace('?', '').replace('[', '').replace(']', '')
+        values = parse_complex_array(response)
+        return values.imag + 1j * values.real
+
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        decode_text()
+    text_decode_time = (time.perf_counter() - tic) / repeats
+
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        decode_binary_frame(binary_frame)
+    binary_decode_time = (time.perf_counter() - tic) / repeats
+
+    print('Sensor protocol, %d frequencies x %d samples' % (reading.shape[0], reading.shape[1]))
+    print('Text frame: %d bytes, decode %f ms' % (len(text_frame), text_decode_time * 1000))
+    print('Binary frame: %d bytes, decode %f ms' % (len(binary_frame), binary_decode_time * 1000))
+
+    for binary in [False, True]:
+        conn = MatlabSockets(emulator.host, emulator.port)
+        conn.Connect()
+        if binary:
+            conn.NegotiateBinary()
+
+        tic = time.perf_counter()
+        for _ in range(repeats):
+            conn.GetComplexData()
+        elapsed = time.perf_counter() - tic
+
+        frame_size = len(binary_frame) if binary else len(text_frame)
+        print('%s round trip: %f ms per reading, %.1f MB/s' % ('Binary' if binary else 'Text', elapsed / repeats * 1000, frame_size * repeats / elapsed / 1e6))
+        print('Receive stats: %s' % (str(conn.stats)))
+        conn.sock.close()
+
+    emulator.Stop()
+
+def benchmark_acquisition_soak(duration = 30, binary = True, latency = 0.02, jitter = 0.01, fragment_size = 1400, malformed_rate = 0.05, frame_timeout = 0.5):
+    """Requests readings from a faulty sensor emulator for a fixed time and reports throughput, latency and recoveries
+
+    Args:
+        duration (float): Seconds to run for
+        binary (bool): Whether to use binary frames
+        latency (float): Emulated reply latency in seconds
+        jitter (float): Emulated latency jitter in seconds
+        fragment_size (int): Emulated fragment size in bytes
+        malformed_rate (float): Probability of a malformed reply
+        frame_timeout (float): Client timeout for incomplete frames
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0, latency=latency, jitter=jitter, fragment_size=fragment_size, malformed_rate=malformed_rate, malformed_kinds=('misshapen', 'zero', 'truncated'))
+    emulator.Start()
+
+    conn = MatlabSockets(emulator.host, emulator.port)
+    conn.frame_timeout = frame_timeout
+    conn.Connect()
+    if binary:
+        conn.NegotiateBinary()
+
+    times = []
+    failures = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        tic = time.perf_counter()
+        try:
+            conn.GetComplexData()
+        except RuntimeError:
+            failures += 1
+        times.append(time.perf_counter() - tic)
+
+    conn.Disconnect()
+    emulator.Stop()
+
+    times = np.array(times)
+    print('Soak test, %s frames, %f s latency, %f s jitter, %d byte fragments, %.0f%% malformed' % ('binary' if binary else 'text', latency, jitter, fragment_size, malformed_rate * 100))
+    print('%d readings in %f s, %.1f readings/s, %d failed' % (len(times), times.sum(), len(times) / times.sum(), failures))
+    print('Reading time: median %f ms, 95th percentile %f ms, max %f ms' % (np.median(times) * 1000, np.percentile(times, 95) * 1000, times.max() * 1000))
+    print('Emulator sent %d frames, %d malformed, client stats: %s' % (emulator.frames_sent, emulator.malformed_sent, str(conn.stats)))
+
+def start_slow_visualiser(read_delay, read_size = 10000):
+    """Starts a visualiser stand-in that reads its socket slowly
+
+    Args:
+        read_delay (float): Seconds to wait between reads
+        read_size (int): Bytes per read, the visualiser's buffer size
+
+    Returns:
+        (int, socket): Port to connect to and the listening socket
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Small receive buffer so a slow reader pushes back on the sender quickly
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, read_size)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            while conn.recv(read_size):
+                time.sleep(read_delay)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1], server
+
+def benchmark_visualiser_sender(positions = 50, read_delay = 0.02):
+    """Times ConductivitySet.AddData against a slow visualiser with blocking and background sending
+
+    Args:
+        positions (int): Number of positions added, the R and C messages grow with each
+        read_delay (float): Seconds the visualiser stand-in waits between reads
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0)
+    readings = [complex_array_to_dict(emulator.GenerateReading()) for _ in range(positions)]
+    vme_positions = [(0.004 + 0.001 * i, 0) for i in range(positions)]
+
+    for background in [False, True]:
+        port, server = start_slow_visualiser(read_delay)
+        conn = VisualisationConnection('127.0.0.1', port, background=background)
+        conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 10000)
+        conn.connect()
+
+        cs = ConductivitySet(conn, (0, 0), vme_positions)
+        times = []
+        for data in readings:
+            tic = time.perf_counter()
+            cs.AddData(data)
+            times.append(time.perf_counter() - tic)
+
+        print('%s sending: AddData mean %f ms, max %f ms' % ('Background' if background else 'Blocking', np.mean(times) * 1000, np.max(times) * 1000))
+        if background:
+            print('Sent %d, coalesced %d, dropped %d messages, %d deltas refused' % (conn.sent_count, conn.coalesced_count, conn.dropped_count, conn.refused_delta_count))
+
+        conn.close()
+        server.close()
+
+def benchmark_reducers(sample_counts = [99, 300, 3000], repeats = 200):
+    """Times the per frequency median and trimmed mean of a reading, and a streaming median over a long acquisition
+
+    Args:
+        sample_counts (list<int>): Samples per reading to time
+        repeats (int): Number of calls timed per sample count
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0)
+    for sample_count in sample_counts:
+        emulator.sample_count = sample_count
+        reading = complex_array_to_dict(emulator.GenerateReading())
+
+        # A plain dictionary has to be converted to an array first, a reading from GetComplexData already holds one
+        for data, name in [(dict(reading), 'dict'), (reading, 'reading')]:
+            tic = time.perf_counter()
+            for _ in range(repeats):
+                get_complex_medians_from_rectangular(data)
+            median_time = (time.perf_counter() - tic) / repeats
+
+            # get_means drops 50 samples from each end
+            if sample_count <= 100:
+                print('%d samples from %s: median %f ms' % (sample_count, name, median_time * 1000))
+                continue
+
+            tic = time.perf_counter()
+            for _ in range(repeats):
+                get_means(data)
+            mean_time = (time.perf_counter() - tic) / repeats
+
+            print('%d samples from %s: median %f ms, trimmed mean %f ms' % (sample_count, name, median_time * 1000, mean_time * 1000))
+
+    # Long acquisition in short readings, a running median against the median of everything so far
+    emulator.sample_count = 10
+    readings = [complex_array_to_dict(emulator.GenerateReading()) for _ in range(300)]
+    streaming = StreamingComplexMedian()
+
+    tic = time.perf_counter()
+    for reading in readings:
+        streaming.Add(reading)
+        streaming.Median()
+    streaming_time = time.perf_counter() - tic
+
+    combined = {freqbin: [] for freqbin in range(15)}
+    tic = time.perf_counter()
+    for reading in readings:
+        for freqbin, samples in reading.items():
+            combined[freqbin].extend(samples)
+        get_complex_medians_from_rectangular(combined)
+    batch_time = time.perf_counter() - tic
+
+    print('Median after each of 300 readings of 10 samples: streaming %f s, recomputed %f s, same result %s' % (streaming_time, batch_time, streaming.Median() == get_complex_medians_from_rectangular(combined)))
+
+def benchmark_acquisition_log(records = 294, text_path = 'benchmark_data.txt', log_path = 'benchmark_data.acq'):
+    """Compares writing and reading back a session's readings as data.txt lines and as a binary acquisition log
+
+    Args:
+        records (int): Number of readings, 294 is a 7x7 grid with 6 VME positions each
+        text_path (str): Temporary text file
+        log_path (str): Temporary log file
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0)
+    readings = [complex_array_to_dict(emulator.GenerateReading()) for _ in range(records)]
+    positions = [[0.001 * (i // 6), 0, 0.046, 0.002, 0.006 + 0.001 * (i % 6), 0, 0.006 + 0.001 * (i % 6), 0.001] for i in range(records)]
+
+    for path in [text_path, log_path, log_path + '.idx']:
+        if os.path.exists(path):
+            os.remove(path)
+
+    # Only SaveData is used, so skip setting up a full sampler
+    class TextSampler(Sampler):
+        def __init__(self):
+            self.acquisition_log = None
+            self.data_path = text_path
+
+    tic = time.perf_counter()
+    sampler = TextSampler()
+    for position, reading in zip(positions, readings):
+        sampler.SaveData([position, reading])
+    text_write = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    log = AcquisitionLog(log_path)
+    for position, reading in zip(positions, readings):
+        log.Append(position, reading)
+    log.Close()
+    log_write = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    with open(text_path, 'r') as f:
+        parse_to_datapoints(f.readlines(), 99)
+    text_read = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    reader = AcquisitionLogReader(log_path)
+    samples = [reader.Samples(i) for i in range(len(reader))]
+    log_read = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    log_to_datapoints(reader, 99)
+    log_points = time.perf_counter() - tic
+
+    print('%d readings, text %d bytes, log %d bytes' % (records, os.path.getsize(text_path), os.path.getsize(log_path)))
+    print('Write: text %f ms, log %f ms per reading' % (text_write / records * 1000, log_write / records * 1000))
+    print('Read: text to data points %f s, log to arrays %f s, log to data points %f s' % (text_read, log_read, log_points))
+
+    del samples, reader
+    for path in [text_path, log_path, log_path + '.idx']:
+        os.remove(path)
+
+def benchmark_logger(calls = 20000, log_path = 'benchmark_logger.log'):
+    """Compares the caller side cost of Logger.LogData with opening the file and walking the stack on every call
+
+    Args:
+        calls (int): Number of entries to log
+        log_path (str): Temporary log file
+
+    Returns:
+        None
+    """
+    # Logger.LogData as it was before buffering
+    def unbuffered_log_data(data):
+        caller = inspect.stack()[1].function
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        output_str = '%s | %s | %s\r\n' % (timestamp, caller, '; '.join([str(item) for item in data]))
+        with open(log_path, 'a+') as f:
+            f.write(output_str)
+
+    # Same values Robot.TransformCoordinates logs
+    def TransformCoordinates(log_data, i):
+        log_data([0.001 * i, -0.0025, 0.046])
+
+    if os.path.exists(log_path):
+        os.remove(log_path)
+
+    unbuffered_calls = calls // 20
+    tic = time.perf_counter()
+    for i in range(unbuffered_calls):
+        TransformCoordinates(unbuffered_log_data, i)
+    unbuffered = (time.perf_counter() - tic) / unbuffered_calls
+    os.remove(log_path)
+    print('Unbuffered: %f us per call' % (unbuffered * 10**6))
+
+    for format in ['text', 'jsonl', 'binary']:
+        logger = Logger(log_path, format, buffer_size=calls)
+        tic = time.perf_counter()
+        for i in range(calls):
+            TransformCoordinates(logger.LogData, i)
+        per_call = (time.perf_counter() - tic) / calls
+
+        tic = time.perf_counter()
+        logger.Close()
+        drain = time.perf_counter() - tic
+
+        if format == 'binary':
+            entries = read_binary_log(log_path)
+            assert len(entries) == calls and entries[-1][1] == 'TransformCoordinates'
+        else:
+            with open(log_path, 'r') as f:
+                assert len(f.readlines()) == calls
+
+        print('%s: %f us per call (%.0fx faster), %d bytes, %f s to drain on close, %d dropped' % (format, per_call * 10**6, unbuffered / per_call, os.path.getsize(log_path), drain, logger.dropped_count))
+        os.remove(log_path)
+
+def simulate_grid_run(vme_robot, cse_robot, points, vme_distances = [6, 7, 9, 11, 15, 21], height = 0.05, lift_height = 0.01, scheduler = None):
+    """Makes the robot moves of main.grid_sample without sampling
+
+    Args:
+        vme_robot (Robot): VME robot
+        cse_robot (Robot): CSE robot
+        points (np.ndarray): CSE positions shaped (positions, 2)
+        vme_distances (list<float>): VME distances from the CSE in mm
+        height (float): Height above the surface between positions
+        lift_height (float): Lift between positions
+        scheduler (MotionScheduler): Schedules the moves of both robots as main.sample_at_position does, one robot after the other if None
+
+    Returns:
+        None
+    """
+    for (x, y) in points:
+        if scheduler is not None:
+            scheduler.MoveBoth([(x + vme_distances[0] / 1000, y, height)], [(x, y, height), (x, y, height - lift_height)])
+        else:
+            cse_robot.Move(x, y, height)
+            cse_robot.Move(x, y, height - lift_height)
+        cse_robot.Idle()
+
+        for d in vme_distances:
+            vme_robot.Move(x + d / 1000, y, height)
+            vme_robot.Move(x + d / 1000, y, height - lift_height)
+            vme_robot.Move(x + d / 1000, y, height)
+
+        cse_robot.Resume()
+        if scheduler is not None:
+            scheduler.Defer('cse', (x, y, height))
+        else:
+            cse_robot.Move(x, y, height)
+
+    if scheduler is not None:
+        scheduler.FlushDeferred()
+
+def benchmark_robot_sessions(connect_time = 2.0, time_scale = 0.01, drop_rate = 0.005, log_path = 'benchmark_robot.log'):
+    """Compares reconnecting the CSE robot at every grid position with idling it within one persistent session, against RTDE stand-ins
+
+    Args:
+        connect_time (float): Simulated seconds to create a control interface
+        time_scale (float): Real seconds per simulated second
+        drop_rate (float): Probability of a dropped connection after each move in the session run
+        log_path (str): Temporary robot log
+
+    Returns:
+        None
+    """
+    points = grid_points((-0.015, -0.015, 0.015, 0.015), 7, 7)
+
+    for persistent in [False, True]:
+        factory = standin_factory(connect_time=connect_time, time_scale=time_scale, drop_rate=drop_rate if persistent else 0, seed=0)
+        vme_robot = Robot('vme', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], Logger(log_path), controller_factory=factory)
+        cse_robot = Robot('cse', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], Logger(log_path), controller_factory=factory)
+
+        tic = time.perf_counter()
+        if persistent:
+            sessions = SessionManager({'vme': vme_robot, 'cse': cse_robot}, retry_delay=0.01)
+            sessions.Open()
+        else:
+            vme_robot.ConnectController()
+            cse_robot.ConnectController()
+
+        simulate_grid_run(vme_robot, cse_robot, points)
+
+        resume_time = 0
+        if persistent:
+            resume_time = sum([sum(session.resume_times) for session in sessions.sessions.values()])
+            sessions.Close()
+        else:
+            vme_robot.Disconnect()
+            cse_robot.Disconnect()
+
+        setup_time = sum(vme_robot.connect_times) + sum(cse_robot.connect_times)
+        print('%s: %d connections taking %f s, script uploads taking %f s (simulated), %f s wall time at %.0fx speed' % ('Persistent sessions' if persistent else 'Reconnect per position', len(vme_robot.connect_times) + len(cse_robot.connect_times), setup_time / time_scale, resume_time / time_scale, time.perf_counter() - tic, 1 / time_scale))
+
+    os.remove(log_path)
+
+class RecordingVisualiser:
+    def __init__(self, binary):
+        self.binary = binary
+        self.messages = []
+
+    def send(self, msg):
+        self.messages.append(msg)
+
+def benchmark_visualiser_messages(positions = 100):
+    """Compares bytes and CPU time per ConductivitySet update of text and binary delta visualiser messages
+
+    Args:
+        positions (int): Number of positions added
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0)
+    readings = [complex_array_to_dict(emulator.GenerateReading()) for _ in range(positions)]
+    vme_positions = [(0.004 + 0.001 * i, 0) for i in range(positions)]
+
+    for binary in [False, True]:
+        conn = RecordingVisualiser(binary)
+        cs = ConductivitySet(conn, (0, 0), vme_positions)
+
+        # Time only the message building, the medians and conductivities are the same for both
+        send_time = 0
+        original_send = cs.SendSeries
+        def timed_send(*args):
+            nonlocal send_time
+            tic = time.perf_counter()
+            original_send(*args)
+            send_time += time.perf_counter() - tic
+        cs.SendSeries = timed_send
+
+        for data in readings:
+            cs.AddData(data)
+
+        sizes = [len(msg) for msg in conn.messages]
+        print('%s messages: %d bytes in total, %d bytes for the last update, %f ms per update' % ('Binary' if binary else 'Text', sum(sizes), sizes[-1] + sizes[-2], send_time / positions * 1000))
+
+        if binary:
+            decoder = VisualiserStreamDecoder()
+            tic = time.perf_counter()
+            for msg in conn.messages:
+                decoder.Feed(msg)
+            decode_time = time.perf_counter() - tic
+
+            raw_error = np.abs(decoder.series[b'R'] - np.array(cs.data, dtype=np.float32)).max()
+            conductivity_error = np.abs(decoder.series[b'C'][:, :, 0] - np.array(cs.conductivities, dtype=np.float32)).max()
+            print('Decoded in %f ms per update, largest difference from the sent series: %g raw, %g conductivity' % (decode_time / positions * 1000, raw_error, conductivity_error))
+
+class SimulatedRobot:
+    def __init__(self, move_time):
+        """Robot stand-in whose moves take a fixed time
+
+        Args:
+            move_time (float): Seconds per move
+        """
+        self.move_time = move_time
+
+    def Move(self, x, y, z):
+        time.sleep(self.move_time)
+
+class SimulatedVisualiser:
+    def __init__(self, send_time):
+        self.send_time = send_time
+
+    def send(self, msg):
+        time.sleep(self.send_time)
+
+class ConstantModel:
+    def predict(self, data):
+        return [0.5]
+
+def benchmark_sampler_pipeline(move_time = 0.2, send_time = 0.02, positions = [6, 7, 9, 11, 15, 21]):
+    """Compares per position wall time of sequential and pipelined sampling against the sensor emulator
+
+    Args:
+        move_time (float): Simulated seconds per robot move
+        send_time (float): Simulated seconds per visualiser message
+        positions (list<float>): VME distances from the CSE in mm
+
+    Returns:
+        None
+    """
+    emulator = SensorEmulator(seed=0)
+    emulator.Start()
+    conn = MatlabSockets(emulator.host, emulator.port)
+    conn.Connect()
+    conn.NegotiateBinary()
+
+    class DepthInfo:
+        lift_between = True
+        lift_height = 0.01
+
+        def InitialHeight(self):
+            return 0.05
+
+    class SamplingInfo:
+        initial_distance = 0.004
+        step_size = 0.001
+
+    # Don't append benchmark readings to data.txt
+    class BenchmarkSampler(Sampler):
+        def SaveData(self, data):
+            pass
+
+    sampling_positions = [(d / 1000, 0) for d in positions]
+
+    for pipelined in [False, True]:
+        sampler = BenchmarkSampler(ConstantModel(), sampling_positions, SimulatedRobot(move_time), DepthInfo(), False, SamplingInfo(), conn, SimulatedVisualiser(send_time), [0, 0, 0.046, 0.002], (0, 0), (None, None), pipelined=pipelined)
+        tic = time.perf_counter()
+        sampler.SampleAll()
+        print('%s: %f s in total' % ('Pipelined' if pipelined else 'Sequential', time.perf_counter() - tic))
+
+    conn.sock.close()
+    emulator.Stop()
+
+def benchmark_motion_paths(cse_positions = 7, blend_radius = 0.002, vme_distances = [6, 7, 9, 11, 15, 21], log_path = 'benchmark_motion.log'):
+    """Compares simulated robot motion time of dry run sampling with stop and go moves and with blended paths
+
+    Args:
+        cse_positions (int): Number of CSE positions along x, 5 mm apart
+        blend_radius (float): Blend radius in metres
+        vme_distances (list<float>): VME distances from the CSE in mm
+        log_path (str): Temporary robot log
+
+    Returns:
+        None
+    """
+    class DepthInfo:
+        lift_between = True
+        lift_height = 0.01
+
+        def InitialHeight(self):
+            return 0.05
+
+    class SamplingInfo:
+        initial_distance = 0.004
+        step_size = 0.001
+
+    # Motion time is taken from the stand-ins, so they only need to sleep a little
+    time_scale = 0.01
+    factory = standin_factory(connect_time=0, time_scale=time_scale)
+    depth_info = DepthInfo()
+
+    for blend in [None, blend_radius]:
+        logger = Logger(log_path)
+        vme_robot = Robot('vme', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], logger, controller_factory=factory)
+        cse_robot = Robot('cse', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], logger, controller_factory=factory)
+        vme_robot.ConnectController()
+        cse_robot.ConnectController()
+        height = depth_info.InitialHeight()
+
+        tic = time.perf_counter()
+        for i in range(cse_positions):
+            x = 0.005 * i
+            if blend is None:
+                cse_robot.Move(x, 0, height)
+                cse_robot.Move(x, 0, height - depth_info.lift_height)
+            else:
+                cse_robot.MovePath([(x, 0, height, blend), (x, 0, height - depth_info.lift_height, 0)])
+
+            sampling_positions = [(x + d / 1000, 0) for d in vme_distances]
+            sampler = Sampler(ConstantModel(), sampling_positions, vme_robot, depth_info, True, SamplingInfo(), None, SimulatedVisualiser(0), [x, 0, 0.046, 0.002], (x, 0), (None, None), blend_radius=blend)
+            sampler.SampleAll()
+            cse_robot.Move(x, 0, height)
+        wall_time = time.perf_counter() - tic
+
+        vme_time = vme_robot.controller.simulated_time
+        cse_time = cse_robot.controller.simulated_time
+        print('%s: VME %f s, CSE %f s simulated motion over %d positions (%d and %d commands), %f s wall time' % ('Stop and go' if blend is None else 'Blended paths, %.1f mm blends' % (blend * 1000), vme_time, cse_time, cse_positions, vme_robot.controller.move_count, cse_robot.controller.move_count, wall_time))
+        logger.Close()
+
+    os.remove(log_path)
+
+def benchmark_batch_transform(grid_size = 100, vme_distances = [6, 7, 9, 11, 15, 21], log_path = 'benchmark_transform.log'):
+    """Compares transforming the search grid's sampling positions one at a time and in one batch, and times checking them all
+
+    Args:
+        grid_size (int): Grid positions along x and y
+        vme_distances (list<float>): VME distances from the CSE in mm
+        log_path (str): Temporary robot log
+
+    Returns:
+        None
+    """
+    logger = Logger(log_path, buffer_size=10**6)
+    robot1 = Robot('vme', ur1_Rot, theta1 - (math.pi/2), ur1_Org, r1_calibration, logger)
+    robot2 = Robot('cse', ur2_Rot, theta2 - (math.pi/2), ur2_Org, r2_calibration, logger)
+
+    # VME positions next to every CSE position of the search grid, sampling height and lifted
+    cse_points = grid_points((-0.02, -0.02, 0.02, 0.02), grid_size, grid_size)
+    vme_points = (cse_points[:, None, :] + np.array([(d / 1000, 0) for d in vme_distances])[None, :, :]).reshape(-1, 2)
+    points = np.concatenate([np.column_stack([vme_points, np.full(len(vme_points), h)]) for h in [0.054, 0.044]])
+
+    tic = time.perf_counter()
+    single = np.array([robot1.TransformCoordinates(*point) for point in points.tolist()])
+    single_time = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    batch = robot1.TransformBatch(points)
+    batch_time = time.perf_counter() - tic
+    assert np.abs(single - batch).max() < 1e-12
+    assert np.abs(robot1.InverseTransformBatch(batch) - points).max() < 1e-12
+
+    tic = time.perf_counter()
+    reachable = robot1.CheckReachable(points)
+    cse_reachable = robot2.CheckReachable(np.column_stack([cse_points, np.full(len(cse_points), 0.054)]))
+    check_time = time.perf_counter() - tic
+
+    print('%d points: one at a time %f ms, batch %f ms (%.0fx faster), reachability of both robots checked in %f ms, %d and %d unreachable' % (len(points), single_time * 1000, batch_time * 1000, single_time / batch_time, check_time * 1000, np.count_nonzero(~reachable), np.count_nonzero(~cse_reachable)))
+
+    logger.Close()
+    os.remove(log_path)
+
+def benchmark_motion_scheduler(time_scale = 0.02, log_path = 'benchmark_scheduler.log'):
+    """Compares a simulated 7x7 grid run, including homing, with one robot moving at a time and with the motion scheduler overlapping moves
+
+    Args:
+        time_scale (float): Stand-in durations are multiplied by this to run faster than real time
+        log_path (str): Temporary robot log
+
+    Returns:
+        None
+    """
+    factory = standin_factory(connect_time=0, time_scale=time_scale)
+    points = grid_points((-0.015, -0.015, 0.015, 0.015), 7, 7)
+
+    for concurrent in [False, True]:
+        logger = Logger(log_path)
+        vme_robot = Robot('vme', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], logger, controller_factory=factory)
+        cse_robot = Robot('cse', [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], logger, controller_factory=factory)
+        sessions = SessionManager({'vme': vme_robot, 'cse': cse_robot})
+        sessions.Open()
+        scheduler = MotionScheduler(vme_robot, cse_robot, concurrent=concurrent)
+
+        tic = time.perf_counter()
+        scheduler.MoveBoth([(0.05, 0, 0.15)], [(-0.05, 0, 0.15)])
+        simulate_grid_run(vme_robot, cse_robot, points, scheduler=scheduler)
+        scheduler.MoveBoth([(0.05, 0, 0.15)], [(-0.05, 0, 0.15)])
+        run_time = time.perf_counter() - tic
+
+        print('%s: %f s simulated run time, %d concurrent and %d sequential moves, overlap saved %f s simulated' % ('Concurrent' if concurrent else 'One at a time', run_time / time_scale, scheduler.concurrent_count, scheduler.sequential_count, scheduler.saved_time / time_scale))
+        scheduler.Close()
+        sessions.Close()
+        logger.Close()
+
+    os.remove(log_path)
+
+if __name__ == "__main__":
+    grid_header = {'lymph_y':0, 'lymph_x':1, 'depth':2, 'x_dist':3, 'y_dist':4, 'distance':5, 'frequency':6, 'potential':7}
+    benchmark_comsol_cache('water_data_output', grid_header)
+    benchmark_complex_parser()
+    benchmark_conductivity_batch()
+    benchmark_windowing(os.path.join('water_data_output', sorted(os.listdir('water_data_output'))[0]), grid_header)
+    benchmark_streaming()
+    benchmark_sensor_protocol()
+    benchmark_sampler_pipeline()
+    benchmark_visualiser_sender()
+    benchmark_visualiser_messages()
+    benchmark_reducers()
+    benchmark_acquisition_log()
+    benchmark_robot_sessions()
+    benchmark_logger()
+    benchmark_motion_paths()
+    benchmark_batch_transform()
+    benchmark_motion_scheduler()
+    benchmark_acquisition_soak(binary=False)
+    benchmark_acquisition_soak(binary=True)
@@ -1,5 +1,7 @@
-import math
+import math, heapq
 import numpy as np
+from sensor_protocol import ComplexReading
+from visualiser_protocol import encode_message
 
 # Classes
 
@@ -35,7 +37,9 @@ class ConductivitySet:
             self.data[index] = scaled_data
             self.raw_data[index] = data
 
-        self.connection.send(self.StringifyData(self.data, 'R'))
+        # Only the added or replaced series changed
+        changed = len(self.data) - 1 if index is None else index
+        self.SendSeries('R', self.data, changed, changed + 1)
 
         if not len(self.data) > 1: return
 
@@ -43,7 +47,30 @@ class ConductivitySet:
 
         conductivity_series = calculate_conductivity_series(self.data, distances)
         self.conductivities = conductivity_series
-        self.connection.send(self.StringifyData(conductivity_series, 'C'))    
+
+        # Conductivity series i depends on data i and i + 1
+        self.SendSeries('C', conductivity_series, max(changed - 1, 0), min(changed + 1, len(conductivity_series)))
+
+    def SendSeries(self, prefix, data, start, end):
+        """Sends series to the visualiser, as text or, if the connection is binary, as a binary delta of the series from start to end, or all series if the delta is refused
+
+        Args:
+            prefix (str): Message type, 'R' or 'C'
+            data (list<list>): All series
+            start (int): Index of the first changed series
+            end (int): Index after the last changed series
+
+        Returns:
+            None
+        """
+        if not getattr(self.connection, 'binary', False):
+            self.connection.send(self.StringifyData(data, prefix))
+            return
+
+        # Changes from the first series on replace whatever the visualiser showed before. A delta the
+        # connection can't queue would leave a gap, so the full series is sent in its place.
+        if start == 0 or self.connection.send(encode_message(prefix.encode(), data[start:end], start=start, delta=True)) is False:
+            self.connection.send(encode_message(prefix.encode(), data))
 
     def StringifyData(self, data, prefix):
         joined_series = []
@@ -52,6 +79,67 @@ class ConductivitySet:
         stringified = prefix + '[' + '|'.join(joined_series) + ']'
         return stringified
 
+class StreamingComplexMedian:
+    def __init__(self, frequency_count = 15):
+        """Initialises a running median by real part for each frequency, for acquisitions too long to keep sorting.
+
+        Two heaps per frequency hold the lower and upper halves of the samples seen so far,
+        ties are broken by arrival order so the result matches get_complex_medians_from_rectangular.
+
+        Args:
+            frequency_count (int): Number of frequencies
+
+        Returns:
+            New StreamingComplexMedian object
+        """
+        self.frequency_count = frequency_count
+        self.Reset()
+
+    def Reset(self):
+        # Lower halves are max heaps of (-real, -index, imag), upper halves min heaps of (real, index, imag)
+        self.lower = [[] for _ in range(self.frequency_count)]
+        self.upper = [[] for _ in range(self.frequency_count)]
+        self.count = 0
+
+    def Add(self, data):
+        """Adds a reading
+
+        Args:
+            data (dict<int, list<tuple<float, float>>>): Samples for each frequency index, as returned by GetComplexData
+
+        Returns:
+            None
+        """
+        for fbin, samples in enumerate(data.values()):
+            lower = self.lower[fbin]
+            upper = self.upper[fbin]
+            index = self.count
+            for (real, imag) in samples:
+                heapq.heappush(lower, (-real, -index, imag))
+                (neg_real, neg_index, top_imag) = heapq.heappop(lower)
+                heapq.heappush(upper, (-neg_real, -neg_index, top_imag))
+                if len(upper) > len(lower):
+                    (top_real, top_index, top_imag) = heapq.heappop(upper)
+                    heapq.heappush(lower, (-top_real, -top_index, top_imag))
+                index += 1
+
+        self.count += len(next(iter(data.values()), []))
+
+    def Median(self):
+        """Median of every frequency so far
+
+        Returns:
+            list<tuple<float, float>>: Median for each frequency
+        """
+        medians = []
+        for lower, upper in zip(self.lower, self.upper):
+            low = (-lower[0][0], lower[0][2])
+            if len(lower) > len(upper):
+                medians.append(low)
+            else:
+                medians.append(((low[0] + upper[0][0]) / 2, (low[1] + upper[0][2]) / 2))
+        return medians
+
 # Functions
 
 def euclidean_distance(x1, y1, x2, y2):
@@ -68,38 +156,94 @@ def euclid_dist_nd(p1, p2):
 def calc_k(am, an):
     return 1/am - 1/an
 
-def get_complex_medians_from_rectangular(data, format_vals = False):
-    medians = []
-    for fbin in data.values():
-        sorted_bin = sorted(fbin, key=lambda x: x[0])
-        med_i = int(len(fbin)/2)
+def rectangular_to_array(data):
+    """Stacks the per frequency samples of a reading into one array
 
-        selected_val = None
-        if len(fbin) % 2 == 0:
-            med1 = sorted_bin[med_i-1]
-            med2 = sorted_bin[med_i]
+    Args:
+        data (dict<int, list<tuple<float, float>>>): Samples for each frequency index, as returned by GetComplexData
+
+    Returns:
+        np.ndarray: Samples shaped (frequencies, samples, 2), None if the frequencies have different sample counts
+    """
+    if isinstance(data, ComplexReading):
+        return data.array
+
+    lengths = set(len(fbin) for fbin in data.values())
+    if len(lengths) != 1:
+        return None
+
+    return np.asarray(list(data.values()), dtype=np.float64).reshape(len(data), lengths.pop(), 2)
+
+def select_by_real(values, k):
+    """Selects the k-th sample of each frequency by real part, as if sorted with a stable sort
+
+    Args:
+        values (np.ndarray): Samples shaped (frequencies, samples, 2)
+        k (int): Rank to select
+
+    Returns:
+        np.ndarray: Selected samples shaped (frequencies, 2)
+    """
+    real = values[:, :, 0]
+    kth = np.partition(real, k, axis=1)[:, k]
+
+    # Among samples whose real part equals the k-th, a stable sort keeps them in their original order
+    ties = real == kth[:, np.newaxis]
+    tie_rank = k - np.sum(real < kth[:, np.newaxis], axis=1)
+    selected = np.argmax(ties & (np.cumsum(ties, axis=1) == tie_rank[:, np.newaxis] + 1), axis=1)
+
+    return values[np.arange(len(values)), selected]
+
+def get_complex_medians_array(values):
+    """Vectorised median by real part of every frequency
+
+    Args:
+        values (np.ndarray): Samples shaped (frequencies, samples, 2)
+
+    Returns:
+        np.ndarray: Medians shaped (frequencies, 2), the mean of the two middle samples if the sample count is even
+    """
+    med_i = values.shape[1] // 2
+    if values.shape[1] % 2 == 0:
+        return (select_by_real(values, med_i - 1) + select_by_real(values, med_i)) / 2
+    return select_by_real(values, med_i)
+
+def get_complex_medians_from_rectangular(data, format_vals = False):
+    values = rectangular_to_array(data)
+    if values is None:
+        medians = [tuple(get_complex_medians_array(np.asarray(fbin, dtype=np.float64)[np.newaxis])[0].tolist()) for fbin in data.values()]
+    else:
+        medians = [tuple(val) for val in get_complex_medians_array(values).tolist()]
 
-            selected_val = ((med1[0] + med2[0]) / 2, (med1[1] + med2[1]) / 2)
-        else:
-            selected_val = sorted_bin[med_i]
-        medians.append(selected_val)
-    
     if format_vals:
         medians = ["%f %f" % (val[0], val[1]) for val in medians]
 
     return medians
 
-def get_means(data, format_vals = False):
-    means = []
-    for fbin in data.values():
-        sorted_bin = list(sorted(fbin, key=lambda x: x[0]))
-        reduced = sorted_bin[50:-50]
+def get_trimmed_means_array(values, trim = 50):
+    """Vectorised mean of every frequency after dropping the samples with the smallest and largest real parts
+
+    Args:
+        values (np.ndarray): Samples shaped (frequencies, samples, 2)
+        trim (int): Number of samples dropped from each end
 
-        total_real = sum([v[0] for v in reduced])
-        total_imag = sum([v[1] for v in reduced])
-        real_mean = total_real/len(reduced)
-        imag_mean = total_imag/len(reduced)
-        means.append((real_mean, imag_mean))
+    Returns:
+        np.ndarray: Means shaped (frequencies, 2)
+    """
+    order = np.argsort(values[:, :, 0], axis=1, kind='stable')
+    reduced = np.take_along_axis(values, order[:, :, np.newaxis], axis=1)[:, trim:values.shape[1] - trim]
+    if reduced.shape[1] == 0:
+        raise ZeroDivisionError('Not enough samples to trim %d from each end' % (trim))
+
+    # Cumulative sum adds in order like sum() does, so results match the unvectorised version exactly
+    return np.cumsum(reduced, axis=1)[:, -1] / reduced.shape[1]
+
+def get_means(data, format_vals = False):
+    values = rectangular_to_array(data)
+    if values is None:
+        means = [tuple(get_trimmed_means_array(np.asarray(fbin, dtype=np.float64)[np.newaxis])[0].tolist()) for fbin in data.values()]
+    else:
+        means = [tuple(val) for val in get_trimmed_means_array(values).tolist()]
 
     if format_vals:
         means = ["%f %f" % (val[0], val[1]) for val in means]
@@ -136,6 +280,38 @@ def calculate_conductivity_series(data, distances, offset = 0.5, digits = 4):
 
         return conductivity_series
 
+def calculate_conductivity_batch(data, distances, offset = 0.5, digits = 4):
+    """Vectorised calculate_conductivity_series over many samples at once
+
+    Args:
+        data (np.ndarray): Complex potentials shaped (samples, positions, frequencies), or real/imaginary pairs shaped (samples, positions, frequencies, 2)
+        distances (np.ndarray): Electrode distances shaped (positions,) or (samples, positions)
+        offset (float): Offset added to all distances
+        digits (int): Number of digits to round to, no rounding if None
+
+    Returns:
+        np.ndarray: Conductivities shaped (samples, positions - 1, frequencies)
+    """
+    data = np.asarray(data)
+    if not np.iscomplexobj(data):
+        data = data[..., 0] + 1j * data[..., 1]
+
+    d = np.asarray(distances, dtype=np.float64) + offset
+    if d.ndim == 1:
+        d = d[np.newaxis, :]
+
+    k = 1 / d[:, :-1] - 1 / d[:, 1:]
+
+    diff = data[:, 1:, :] - data[:, :-1, :]
+    real_diff = diff.real
+    imag_diff = diff.imag
+
+    sigma = (k[:, :, np.newaxis] / (2 * np.pi)) * real_diff / (real_diff * real_diff + imag_diff * imag_diff)
+    if digits is not None:
+        sigma = np.round(sigma, digits)
+
+    return sigma
+
 def lymph_equation(x, y, mid, lymph_x, lymph_y, l_type):
     var = 1 if l_type == 1 else 2
     if mid > -25:
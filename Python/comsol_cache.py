@@ -0,0 +1,126 @@
+import os, json, hashlib
+import numpy as np
+
+# Classes
+
+class ComsolCache:
+    def __init__(self, cache_dir = 'comsol_cache'):
+        """Initialises an on-disk cache of parsed COMSOL export columns.
+
+        Each cached export is stored as one .npy file per column plus a metadata file
+        recording the size, modification time and content hash of the source file.
+
+        Args:
+            cache_dir (str): Folder to keep cached columns in, created on first store
+
+        Returns:
+            New ComsolCache object
+        """
+        self.cache_dir = cache_dir
+
+    def GetEntryPath(self, file_path, header, skip_line_count):
+        """Determines the cache folder used for a file and header combination
+
+        Args:
+            file_path (str): Path to COMSOL export
+            header (dict): A dictionary over keys and their column numbers in the data file
+            skip_line_count (int): Number of header lines skipped in the export
+
+        Returns:
+            str: Path to cache entry folder
+        """
+        key_data = json.dumps([os.path.abspath(file_path), header, skip_line_count], sort_keys=True)
+        key = hashlib.sha1(key_data.encode()).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def Load(self, file_path, header, skip_line_count):
+        """Loads cached columns for a file if the cache entry is still valid
+
+        Args:
+            file_path (str): Path to COMSOL export
+            header (dict): A dictionary over keys and their column numbers in the data file
+            skip_line_count (int): Number of header lines skipped in the export
+
+        Returns:
+            dict<str, np.ndarray>: Memory-mapped columns, None if not cached or stale
+        """
+        entry_path = self.GetEntryPath(file_path, header, skip_line_count)
+        meta_path = os.path.join(entry_path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+        stat = os.stat(file_path)
+        if stat.st_size != meta['size']:
+            return None
+
+        # Same size but touched or copied, only trust the entry if the contents are unchanged
+        if stat.st_mtime_ns != meta['mtime_ns']:
+            if hash_file(file_path) != meta['sha256']:
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+
+        columns = {}
+        for column in meta['columns']:
+            columns[column] = np.load(os.path.join(entry_path, '%s.npy' % column), mmap_mode='r')
+
+        return columns
+
+    def Store(self, file_path, header, skip_line_count, columns):
+        """Stores parsed columns for a file
+
+        Args:
+            file_path (str): Path to COMSOL export
+            header (dict): A dictionary over keys and their column numbers in the data file
+            skip_line_count (int): Number of header lines skipped in the export
+            columns (dict<str, np.ndarray>): Parsed columns to store
+
+        Returns:
+            None
+        """
+        entry_path = self.GetEntryPath(file_path, header, skip_line_count)
+        os.makedirs(entry_path, exist_ok=True)
+
+        for column, values in columns.items():
+            np.save(os.path.join(entry_path, '%s.npy' % column), values)
+
+        stat = os.stat(file_path)
+        meta = {
+            'path': os.path.abspath(file_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': hash_file(file_path),
+            'columns': list(columns.keys())
+        }
+
+        # Metadata is written last so a partially written entry is never treated as valid
+        with open(os.path.join(entry_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    def Clear(self):
+        """Removes all cached entries
+
+        Returns:
+            None
+        """
+        if not os.path.exists(self.cache_dir):
+            return
+
+        for entry in os.listdir(self.cache_dir):
+            entry_path = os.path.join(self.cache_dir, entry)
+            for file_name in os.listdir(entry_path):
+                os.remove(os.path.join(entry_path, file_name))
+            os.rmdir(entry_path)
+
+# Functions
+
+def hash_file(file_path, block_size = 1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
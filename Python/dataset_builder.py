@@ -0,0 +1,183 @@
+import os, json, time, shutil
+from comsol_cache import hash_file
+from real_loading import load_real_data, calculate_conductivities
+from training_store import TrainingStore
+from util import process_files
+
+MANIFEST_VERSION = 1
+
+# Classes
+
+class IncrementalDatasetBuilder:
+    def __init__(self, folder_path, store_path = 'dataset.bin', manifest_path = 'dataset.manifest.json', feature_count = 75):
+        """Initialises a builder that keeps a training data store in sync with a folder of tissue measurement files.
+
+        A manifest records each source file's hash and the range of store records it produced,
+        so a rebuild only reprocesses files that were added, changed or removed.
+
+        Args:
+            folder_path (str): Folder of measurement files, as loaded by load_real_model_data
+            store_path (str): Path to the consolidated TrainingStore, owned by the builder, so not the data.bin save_training_data appends to
+            manifest_path (str): Path to the manifest of processed files
+            feature_count (int): Number of features per record
+
+        Returns:
+            New IncrementalDatasetBuilder object
+        """
+        self.folder_path = folder_path
+        self.store_path = store_path
+        self.manifest_path = manifest_path
+        self.feature_count = feature_count
+
+        # A build is written to temporary copies of both files, then the store and the manifest are replaced in that order
+        self.temp_store_path = store_path + '.tmp'
+        self.temp_manifest_path = manifest_path + '.tmp'
+
+        self.Recover()
+        self.store = TrainingStore(store_path, feature_count)
+
+    def Recover(self):
+        """Finishes or discards a build that was interrupted while replacing the store and manifest
+
+        Returns:
+            None
+        """
+        if os.path.exists(self.temp_manifest_path) and not os.path.exists(self.temp_store_path):
+            # The new store is already in place, so its manifest must follow
+            os.replace(self.temp_manifest_path, self.manifest_path)
+            return
+
+        # The store wasn't replaced yet, the old store and manifest still match
+        for path in [self.temp_store_path, self.temp_manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def LoadManifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'version': MANIFEST_VERSION, 'files': {}}
+
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+        if manifest['version'] != MANIFEST_VERSION:
+            raise ValueError('Unsupported manifest version %d' % (manifest['version']))
+
+        return manifest
+
+    def SaveManifest(self, manifest, path):
+        with open(path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    def FindChanges(self, manifest):
+        """Compares the folder against the manifest
+
+        Args:
+            manifest (dict): Manifest as returned by LoadManifest
+
+        Returns:
+            (list<str>, list<str>, list<str>, dict<str, dict>): Added, changed and removed file names, and the current state of every file
+        """
+        added = []
+        changed = []
+        state = {}
+
+        for file_name in sorted(os.listdir(self.folder_path)):
+            stat = os.stat(os.path.join(self.folder_path, file_name))
+            entry = manifest['files'].get(file_name)
+
+            # Size and modification time match, skip hashing the file
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                state[file_name] = entry
+                continue
+
+            file_hash = hash_file(os.path.join(self.folder_path, file_name))
+            state[file_name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash}
+
+            if entry is None:
+                added.append(file_name)
+            elif entry['sha256'] != file_hash:
+                changed.append(file_name)
+            else:
+                # Touched but unchanged, keep its records
+                state[file_name]['start'] = entry['start']
+                state[file_name]['count'] = entry['count']
+
+        removed = [file_name for file_name in manifest['files'] if file_name not in state]
+
+        return added, changed, removed, state
+
+    def Build(self, workers = None):
+        """Brings the store up to date with the folder
+
+        The store is copied, records of removed and changed files are dropped by compacting the copy,
+        and records of added and changed files are appended to it. The copy and the new manifest then replace
+        the store and manifest, so an interrupted build never leaves a manifest pointing into the wrong records.
+
+        Args:
+            workers (int): Number of worker processes used to load new files
+
+        Returns:
+            dict<str, int>: Number of added, changed, removed and unchanged files
+        """
+        tic = time.perf_counter()
+
+        manifest = self.LoadManifest()
+        added, changed, removed, state = self.FindChanges(manifest)
+
+        if os.path.exists(self.store_path):
+            shutil.copyfile(self.store_path, self.temp_store_path)
+        store = TrainingStore(self.temp_store_path, self.feature_count)
+
+        # Drop records of removed and changed files, keeping the rest in store order
+        dropped = set(removed) | set(changed)
+        if len(dropped) > 0:
+            kept = sorted([(entry['start'], entry['count'], file_name) for file_name, entry in manifest['files'].items() if file_name not in dropped])
+            new_starts = store.KeepRanges([(start, count) for start, count, _ in kept])
+            for (_, _, file_name), start in zip(kept, new_starts):
+                state[file_name]['start'] = start
+
+        # Load new and changed files and append their rows
+        to_process = sorted(added + changed)
+        rows = process_files(load_training_rows, [(os.path.join(self.folder_path, file_name), self.feature_count) for file_name in to_process], workers)
+
+        start = len(store)
+        for file_name, file_rows in zip(to_process, rows):
+            store.AppendPairs(file_rows)
+            state[file_name]['start'] = start
+            state[file_name]['count'] = len(file_rows)
+            start += len(file_rows)
+
+        manifest['files'] = state
+        self.SaveManifest(manifest, self.temp_manifest_path)
+
+        # See Recover for finishing an interrupted replace
+        if os.path.exists(self.temp_store_path):
+            os.replace(self.temp_store_path, self.store_path)
+        os.replace(self.temp_manifest_path, self.manifest_path)
+
+        summary = {'added': len(added), 'changed': len(changed), 'removed': len(removed), 'unchanged': len(state) - len(added) - len(changed)}
+        print('Dataset rebuilt in %f s: %d added, %d changed, %d removed, %d unchanged, %d records' % (time.perf_counter() - tic, summary['added'], summary['changed'], summary['removed'], summary['unchanged'], len(self.store)))
+
+        return summary
+
+# Functions
+
+def is_valid_training_row(data, feature_count = 75):
+    if len(data) != feature_count:
+        print('Train data not long enough')
+        return False
+    if not all(v > 0 for v in data):
+        print('Negative found in training data, discarding')
+        return False
+    return True
+
+def load_training_rows(file_path, feature_count = 75):
+    sample = load_real_data(file_path)
+    calculate_conductivities([sample])
+
+    rows = [(sample.ground_truth, sample.conductivities)]
+    return [(gt, data) for gt, data in rows if is_valid_training_row(data, feature_count)]
+
+if __name__ == "__main__":
+    builder = IncrementalDatasetBuilder('/Tissue training data')
+    builder.Build()
@@ -1,5 +1,5 @@
 import os
-from util import select_n_vals, stringify_complex, get_unique_name, parse_string_to_complex
+from util import select_n_vals, stringify_complex, get_unique_name, parse_complex_array, complex_array_to_tuples
 
 class DataPoint:
     def __init__(self, cse_x, cse_y, vme_x) -> None:
@@ -11,20 +11,14 @@ class DataPoint:
         self.cse_key = '%f %f' %(cse_x, cse_y)
     
     def SetData(self, contents, samples_taken):
-        data_dict = {}
-        iterator = 0
+        # Values are stored frequency by frequency, samples_taken values per frequency
+        values = parse_complex_array(contents[:15 * samples_taken]).reshape(15, samples_taken)
+        self.data = [complex_array_to_tuples(freq_values) for freq_values in values]
 
-        for freq in range(15):
-            if freq not in data_dict.keys():
-                data_dict[freq] = []
-
-            for _ in range(samples_taken):
-                # Get value
-                string_val = contents[iterator]
-
-                data_dict[freq].append(parse_string_to_complex(string_val))
-                iterator += 1
-        self.data = list(data_dict.values())
+    def SetArray(self, values, samples_taken):
+        # Raw readings are scaled to volts the same way as in data.txt
+        values = values[:, :samples_taken] * 0.001
+        self.data = [complex_array_to_tuples(freq_values) for freq_values in values]
 
 
 def parse_to_datapoints(data, samples_taken):
@@ -51,6 +45,34 @@ def parse_to_datapoints(data, samples_taken):
 
     return groups
 
+def log_to_datapoints(reader, samples_taken, group_size = 6):
+    """Groups the readings of an acquisition log like parse_to_datapoints does for data.txt, without parsing text
+
+    Args:
+        reader (AcquisitionLogReader): Log to read
+        samples_taken (int): Number of samples per frequency to keep
+        group_size (int): Number of VME positions per CSE position
+
+    Returns:
+        list<list<DataPoint>>: Data points grouped by CSE position
+    """
+    groups = []
+    points = []
+
+    positions = reader.Positions()
+    for i in range(len(reader)):
+        (cse_x, cse_y, _, _, vme_x, _, _, _) = positions[i]
+        point = DataPoint(cse_x * 1000, cse_y * 1000, vme_x * 1000)
+        point.SetArray(reader.Samples(i), samples_taken)
+
+        points.append(point)
+
+        if len(points) == group_size:
+            groups.append(points)
+            points = []
+
+    return groups
+
 def select_frequency_values(point, num_vals):
     vals = [select_n_vals(point_data, num_vals) for point_data in point.data]
     return vals
@@ -3,6 +3,10 @@ import numpy as np
 from robot_controller import Robot
 from robot_sockets import MatlabSockets, VisualisationConnection
 from sampler import Sampler
+from acquisition_log import AcquisitionLog
+from scan_planner import plan_scan_order
+from robot_session import SessionManager
+from motion_scheduler import MotionScheduler
 from model_definitions import FunctionalDenseModel
 from util import Logger
 from active_search import ActiveSearch, save_as_data, get_as_initial_points, plot_as_data
@@ -27,7 +31,7 @@ class DepthInfo:
     def InitialHeight(self):
         if self.lift_between:
             return self.surface_height - self.sampling_depth + self.lift_height
-        self.surface_height - self.sampling_depth
+        return self.surface_height - self.sampling_depth
 
 # Functions
 
@@ -59,7 +63,36 @@ def get_vme_sampling_positions(cse_pos, sampling_info):
     
     return vme_positions
 
-def sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, sampling_position, height, matlab_conn = None, vis_conn = None, dry_run = False, safe_move_vme = False):
+def check_run_positions(vme_robot, cse_robot, sampling_positions, sampling_info, depth_info, safe_move_vme = False):
+    """Checks every position both robots will sample at against their working envelopes before any sampling moves
+
+    Args:
+        vme_robot (Robot): VME robot
+        cse_robot (Robot): CSE robot
+        sampling_positions (list<tuple>): CSE positions as generated by generate_grid_positions
+        sampling_info (SamplingInfo): Sampling info giving the VME positions
+        depth_info (DepthInfo): Depth info giving the heights
+        safe_move_vme (bool): Also check the VME's safe position at x = 0.045
+
+    Returns:
+        None
+    """
+    points = np.array([position[:2] for position in sampling_positions], dtype=np.float64)
+    vme_offsets = np.array(get_vme_sampling_positions((0, 0), sampling_info), dtype=np.float64)
+    vme_points = (points[:, None, :] + vme_offsets[None, :, :]).reshape(-1, 2)
+    if safe_move_vme:
+        vme_points = np.concatenate([vme_points, np.column_stack([np.full(len(points), 0.045), points[:, 1]])])
+
+    height = depth_info.InitialHeight()
+    heights = [height, height - depth_info.lift_height] if depth_info.lift_between else [height]
+
+    for name, robot, xy in [('VME', vme_robot, vme_points), ('CSE', cse_robot, points)]:
+        xyz = np.concatenate([np.column_stack([xy, np.full(len(xy), h)]) for h in heights])
+        reachable = robot.CheckReachable(xyz)
+        if not reachable.all():
+            raise RuntimeError('%s robot can\'t reach %d of %d positions, first at %s' % (name, np.count_nonzero(~reachable), len(xyz), str(xyz[np.argmin(reachable)])))
+
+def sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, sampling_position, height, matlab_conn = None, vis_conn = None, dry_run = False, safe_move_vme = False, pipelined = False, acquisition_log = None, blend_radius = None, scheduler = None):
     (x, y, x_index, y_index) = (0, 0, None, None)
 
     if len(sampling_position) == 4:
@@ -68,12 +101,26 @@ def sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, s
         (x, y) = sampling_position
     else:
         raise Exception('Sampling position wrong format')
-    if safe_move_vme:
-        vme_robot.Move(0.045, y, height)
 
-    cse_robot.Move(x, y, height)
-    
     vme_positions = get_vme_sampling_positions((x, y), sampling_info)
+
+    if scheduler is not None:
+        # Bring the VME over its first sampling position while the CSE lifts from the last position, moves and lowers
+        vme_target = (0.045, y, height) if safe_move_vme else (vme_positions[0][0], vme_positions[0][1], height)
+        cse_path = [(x, y, height)]
+        if depth_info.lift_between:
+            cse_path.append((x, y, height - depth_info.lift_height))
+        scheduler.MoveBoth([vme_target], cse_path)
+    else:
+        if safe_move_vme:
+            vme_robot.Move(0.045, y, height)
+
+        # Blend from the move to the position into lowering
+        if depth_info.lift_between and blend_radius is not None:
+            cse_robot.MovePath([(x, y, height, blend_radius), (x, y, height - depth_info.lift_height, 0)])
+        else:
+            cse_robot.Move(x, y, height)
+    
     output_prefix = [x, y, depth_info.surface_height, depth_info.sampling_depth]
     sampler = Sampler(
         model,
@@ -86,27 +133,37 @@ def sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, s
         vis_conn,
         output_prefix,
         (x, y),
-        (x_index, y_index))
+        (x_index, y_index),
+        pipelined=pipelined,
+        acquisition_log=acquisition_log,
+        blend_radius=blend_radius)
 
-    if depth_info.lift_between:
+    if depth_info.lift_between and blend_radius is None and scheduler is None:
         cse_robot.Move(x, y, height - depth_info.lift_height)
-    cse_robot.Disconnect()
+    cse_robot.Idle()
 
     prediction = sampler.SampleAll()
 
-    cse_robot.ConnectController()
+    cse_robot.Resume()
     if depth_info.lift_between:
-        cse_robot.Move(x, y, height)
+        if scheduler is not None:
+            # Lift as part of the next move, overlapping the VME's move to the next position
+            scheduler.Defer('cse', (x, y, height))
+        else:
+            cse_robot.Move(x, y, height)
 
     return prediction
 
-def grid_sample(model, vme_robot, cse_robot, sampling_info, depth_info, sampling_positions, matlab_conn = None, vis_conn = None, dry_run = False):
+def grid_sample(model, vme_robot, cse_robot, sampling_info, depth_info, sampling_positions, matlab_conn = None, vis_conn = None, dry_run = False, pipelined = False, acquisition_log = None, blend_radius = None, scheduler = None):
     height = depth_info.InitialHeight()
     for i, pos in enumerate(sampling_positions):
         print("Position %d of %d | %s" % (i + 1, len(sampling_positions), str(pos)))
-        sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, pos, height, matlab_conn, vis_conn, dry_run)
+        sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, pos, height, matlab_conn, vis_conn, dry_run, pipelined=pipelined, acquisition_log=acquisition_log, blend_radius=blend_radius, scheduler=scheduler)
+
+    if scheduler is not None:
+        scheduler.FlushDeferred()
 
-def run_active_search(model, vme_robot, cse_robot, sampling_info, depth_info, possible_positions, bounds, num_samples, matlab_conn = None, vis_conn = None):
+def run_active_search(model, vme_robot, cse_robot, sampling_info, depth_info, possible_positions, bounds, num_samples, matlab_conn = None, vis_conn = None, acquisition_log = None, blend_radius = None, scheduler = None):
     height = depth_info.InitialHeight()    
     a_search = ActiveSearch(possible_positions)
 
@@ -116,8 +173,8 @@ def run_active_search(model, vme_robot, cse_robot, sampling_info, depth_info, po
 
     values = []
     for pos in initial_positions:
-        vis_conn.send('A[%f;%f]' % (pos[0], pos[1]))
-        prediction = sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, (pos[0] / 1000, pos[1] / 1000), height, matlab_conn, vis_conn, False, safe_move_vme=True)
+        vis_conn.SendPoint('A', 'A[%f;%f]' % (pos[0], pos[1]), [pos[0], pos[1]])
+        prediction = sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, (pos[0] / 1000, pos[1] / 1000), height, matlab_conn, vis_conn, False, safe_move_vme=True, acquisition_log=acquisition_log, blend_radius=blend_radius, scheduler=scheduler)
         save_as_data([pos[0], pos[1], prediction])
         values.append((prediction, pos[0], pos[1]))
         a_search.TryRemovePoint(pos, exclusion_radius=3)
@@ -127,23 +184,30 @@ def run_active_search(model, vme_robot, cse_robot, sampling_info, depth_info, po
 
     for i in range(num_samples - 5):
         new_position = a_search.GetNewPos()
-        vis_conn.send('A[%f;%f]' % (new_position[0], new_position[1]))
+        vis_conn.SendPoint('A', 'A[%f;%f]' % (new_position[0], new_position[1]), [new_position[0], new_position[1]])
         print('Iteration %d at %f, %f' % (i + 6, new_position[0], new_position[1]))
-        prediction = sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, (new_position[0] / 1000, new_position[1] / 1000), height, matlab_conn, vis_conn, False, safe_move_vme=True)
+        prediction = sample_at_position(model, vme_robot, cse_robot, sampling_info, depth_info, (new_position[0] / 1000, new_position[1] / 1000), height, matlab_conn, vis_conn, False, safe_move_vme=True, acquisition_log=acquisition_log, blend_radius=blend_radius, scheduler=scheduler)
         save_as_data([new_position[0], new_position[1], prediction])
         a_search.TeachModel(new_position, prediction)
         values.append((prediction, new_position[0], new_position[1]))
         plot_as_data(values, i+6)
 
+    if scheduler is not None:
+        scheduler.FlushDeferred()
 
-def do_work(mode, surface_level, dry_run=False):
-    robot1 = Robot(robot_1_ip, ur1_Rot, theta1 - (math.pi/2) , ur1_Org, r1_calibration, Logger('r1_log.log'))
-    robot1.ConnectController()
 
+def do_work(mode, surface_level, dry_run=False, pipelined=False, log_path=None, scan_order=None, blend_radius=None, concurrent_moves=True):
+    robot1 = Robot(robot_1_ip, ur1_Rot, theta1 - (math.pi/2) , ur1_Org, r1_calibration, Logger('r1_log.log'))
     robot2 = Robot(robot_2_ip, ur2_Rot, theta2 - (math.pi/2), ur2_Org, r2_calibration, Logger('r2_log.log'))
-    robot2.ConnectController()
 
-    home_robots(robot1, robot2)
+    # One controller connection per robot for the whole run
+    sessions = SessionManager({'robot1': robot1, 'robot2': robot2})
+    sessions.Open()
+
+    # Moves both robots at once whenever the electrodes stay apart
+    scheduler = MotionScheduler(robot1, robot2, concurrent=concurrent_moves, blend_radius=blend_radius)
+
+    home_robots(robot1, robot2, scheduler)
 
     conn = None
     matlab_conn = None
@@ -153,6 +217,7 @@ def do_work(mode, surface_level, dry_run=False):
         conn.connect()
         matlab_conn = MatlabSockets('127.0.0.1', 30007)
         matlab_conn.Connect()
+        matlab_conn.NegotiateBinary()
 
     sampling_info = SamplingInfo(
         initial_d = 0.004, 
@@ -170,23 +235,35 @@ def do_work(mode, surface_level, dry_run=False):
 
     model = FunctionalDenseModel('asmodel/model', 75)
     model.load()
+
+    # Log readings to a binary acquisition log instead of data.txt
+    acquisition_log = None
+    if log_path is not None and not dry_run:
+        acquisition_log = AcquisitionLog(log_path)
     
     if mode == 'grid':
         grid_positions = generate_grid_positions((-0.015, -0.015, 0.015, 0.015), 7, 7, add_indices=True)
-        grid_sample(model, robot1, robot2, sampling_info, depth_info, grid_positions, matlab_conn, conn, dry_run=dry_run)
+        if scan_order is not None:
+            grid_positions = plan_scan_order(grid_positions, scan_order)
+        check_run_positions(robot1, robot2, grid_positions, sampling_info, depth_info)
+        grid_sample(model, robot1, robot2, sampling_info, depth_info, grid_positions, matlab_conn, conn, dry_run=dry_run, pipelined=pipelined, acquisition_log=acquisition_log, blend_radius=blend_radius, scheduler=scheduler)
 
     if mode == 'search':
         bounds = (-0.02, -0.02, 0.02, 0.02)
         grid_positions = generate_grid_positions(bounds, 100, 100)
-        run_active_search(model, robot1, robot2, sampling_info, depth_info, grid_positions, bounds, 49, matlab_conn, conn)
+        check_run_positions(robot1, robot2, grid_positions, sampling_info, depth_info, safe_move_vme=True)
+        run_active_search(model, robot1, robot2, sampling_info, depth_info, grid_positions, bounds, 49, matlab_conn, conn, acquisition_log=acquisition_log, blend_radius=blend_radius, scheduler=scheduler)
 
-    home_robots(robot1, robot2)
+    home_robots(robot1, robot2, scheduler)
+    scheduler.Close()
 
     if not dry_run:
         matlab_conn.Disconnect()
+
+    if acquisition_log is not None:
+        acquisition_log.Close()
     
-    robot1.Disconnect()
-    robot2.Disconnect()
+    sessions.Close()
 
 if __name__ == "__main__":       
     do_work(mode='grid', surface_level=0.046, dry_run=False)
\ No newline at end of file
@@ -8,6 +8,8 @@ from performance_evaluation import calc_MCC
 from model_definitions import FunctionalDenseModel
 from sim_loading import load_data, load_training_data
 from real_loading import load_real_model_data
+from training_store import TrainingStore, import_text_training_data
+from dataset_builder import IncrementalDatasetBuilder
 import numpy as np
 import random, time
 from sklearn.model_selection import KFold
@@ -181,23 +183,37 @@ def plot_conductivity_val(val, identifier):
 
     pass
 
-def save_training_data(training_data):
-    with open('data.txt', 'a+') as f:
-        for gt, data in training_data:
-            output = '%s|%s\n' % (str(gt), ';'.join([str(v) for v in data]))
-            f.write(output)
+def save_training_data(training_data, store_path = 'data.bin'):
+    TrainingStore(store_path).AppendPairs(training_data)
 
-def load_training_data_from_disk():
-    training_data = []
-    with open('data.txt', 'r+') as f:
-        data = f.readlines()
-        for line in data:
-            split_line = line.split('|')
-            gt = split_line[0] == 'True'
-            data = [float(v) for v in split_line[1].split(';')]
-            training_data.append((gt, data))
+def load_training_arrays(store_path = 'data.bin', text_path = 'data.txt'):
+    # Convert an old text file on first use
+    if not path.exists(store_path) and path.exists(text_path):
+        import_text_training_data(text_path, store_path)
 
-    return training_data
+    return TrainingStore(store_path).Load()
+
+def load_training_data_from_disk(store_path = 'data.bin', text_path = 'data.txt'):
+    labels, features = load_training_arrays(store_path, text_path)
+    return list(zip(labels.tolist(), features.tolist()))
+
+def load_built_training_arrays(folder_path, workers = None):
+    """Brings the incremental dataset of a folder of tissue measurements up to date and loads it
+
+    Args:
+        folder_path (str): Folder of measurement files
+        workers (int): Number of worker processes used to load new files
+
+    Returns:
+        (np.ndarray, np.ndarray): Labels shaped (records,) and memory-mapped features shaped (records, 75)
+    """
+    builder = IncrementalDatasetBuilder(folder_path)
+    builder.Build(workers)
+    return builder.store.Load()
+
+def load_built_training_data(folder_path, workers = None):
+    labels, features = load_built_training_arrays(folder_path, workers)
+    return list(zip(labels.tolist(), features.tolist()))
 
 def test_model_type(model, num_samples, retrain_model, real_data = True):
     if not real_data:
@@ -215,27 +231,9 @@ def test_model_type(model, num_samples, retrain_model, real_data = True):
 
     else:
         if retrain_model:
-            # Uncomment to load new data
-
-            # folder_path = '/Tissue training data'
-            # train_data = load_real_model_data(folder_path, "Train")
+            # Only files added or changed since the last build are loaded
+            filtered_train_data = load_built_training_data('/Tissue training data')
 
-
-            # filtered_train_data = []
-            # for gt, data in train_data:
-            #     if len(data) != 75:
-            #         print('Train data not long enough')
-            #         continue
-            #     if not all(v > 0 for v in data):
-            #         print('Negative found in training data, discarding')
-            #         continue
-
-            #     filtered_train_data.append((gt, data))
-
-            # save_training_data(filtered_train_data)
-            filtered_train_data = load_training_data_from_disk()
-
-            #print('%d Points removed' % (len(train_data) - len(filtered_train_data)))
             # for index, val in enumerate(filtered_train_data):
             #     plot_conductivity_val(val, index)
 
@@ -278,18 +276,15 @@ def test_model_type(model, num_samples, retrain_model, real_data = True):
 
 # K-Fold data test
 def train_model():
-    data = load_training_data_from_disk()
-
-    random.shuffle(data)
+    targets, inputs = load_built_training_arrays('/Tissue training data')
 
-    inputs = [v[1] for v in data]
-    targets = [v[0] for v in data]
+    # Shuffle a copy, the loaded features are memory-mapped read only
+    permutation = np.random.permutation(len(targets))
+    inputs = np.array(inputs[permutation])
+    targets = targets[permutation]
 
     kf = KFold(n_splits = 5, shuffle = True)
 
-    inputs = np.array(inputs)
-    targets = np.array(targets)
-
     all_scores = []
 
     for train, test in kf.split(inputs, targets):
@@ -0,0 +1,134 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Classes
+
+class MotionScheduler:
+    def __init__(self, vme_robot, cse_robot, min_x_gap = 0.005, concurrent = True, blend_radius = None):
+        """Initialises a scheduler that moves both robots at the same time whenever their paths can't bring the electrodes too close.
+        The VME always works on the positive x side of the CSE, so moves are only overlapped if the VME stays at least min_x_gap further along x than the CSE throughout.
+
+        Args:
+            vme_robot (Robot): VME robot
+            cse_robot (Robot): CSE robot
+            min_x_gap (float): Smallest allowed x distance between the electrodes in workspace frame (in meters)
+            concurrent (bool): Overlap moves when allowed, otherwise always move one robot after the other
+            blend_radius (float): Blend radius for a robot's consecutive targets, each target is reached with a stop if None
+
+        Returns:
+            New MotionScheduler object
+        """
+        self.robots = {'vme': vme_robot, 'cse': cse_robot}
+        self.min_x_gap = min_x_gap
+        self.concurrent = concurrent
+        self.blend_radius = blend_radius
+
+        # Moves held back to run with the robot's next moves, see Defer
+        self.deferred = {'vme': [], 'cse': []}
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.concurrent_count = 0
+        self.sequential_count = 0
+        self.move_time = 0
+        self.saved_time = 0
+
+    def Position(self, name):
+        """Current workspace position of a robot, from its last commanded pose
+
+        Args:
+            name (str): 'vme' or 'cse'
+
+        Returns:
+            np.ndarray: X, Y and Z in workspace frame, None if the robot hasn't moved yet
+        """
+        robot = self.robots[name]
+        if robot.pose is None:
+            return None
+        return robot.InverseTransformBatch(np.array([robot.pose]))[0]
+
+    def Defer(self, name, target):
+        """Holds a move back until the robot's next MoveBoth, so it can overlap the other robot's moves
+
+        Args:
+            name (str): 'vme' or 'cse'
+            target (tuple<float, float, float>): X, Y and Z in workspace frame
+
+        Returns:
+            None
+        """
+        self.deferred[name].append(target)
+
+    def IsSeparated(self, vme_xs, cse_xs):
+        return min(vme_xs) - max(cse_xs) >= self.min_x_gap
+
+    def MoveBoth(self, vme_path, cse_path):
+        """Moves both robots through their targets, at the same time if the electrodes stay apart however the moves line up
+
+        Args:
+            vme_path (list<tuple<float, float, float>>): VME targets in workspace frame, in order
+            cse_path (list<tuple<float, float, float>>): CSE targets in workspace frame, in order
+
+        Returns:
+            None
+        """
+        paths = {'vme': self.deferred['vme'] + list(vme_path), 'cse': self.deferred['cse'] + list(cse_path)}
+        self.deferred = {'vme': [], 'cse': []}
+
+        starts = {name: self.Position(name) for name in paths}
+        if any([start is None for start in starts.values()]):
+            # Starting positions are unknown until each robot has moved, so keep the original order
+            self.RunSequential(paths, ['vme', 'cse'])
+            return
+
+        xs = {name: [starts[name][0]] + [target[0] for target in paths[name]] for name in paths}
+        ends = {name: xs[name][-1] for name in paths}
+
+        if self.concurrent and len(paths['vme']) > 0 and len(paths['cse']) > 0 and self.IsSeparated(xs['vme'], xs['cse']):
+            self.RunConcurrent(paths)
+            return
+
+        # Move the robot first whose path clears the other one at rest, then the other against the first one's end
+        if self.IsSeparated(xs['vme'], [starts['cse'][0]]) and self.IsSeparated([ends['vme']], xs['cse']):
+            self.RunSequential(paths, ['vme', 'cse'])
+        elif self.IsSeparated(xs['vme'], [ends['cse']]) and self.IsSeparated([starts['vme'][0]], xs['cse']):
+            self.RunSequential(paths, ['cse', 'vme'])
+        else:
+            raise RuntimeError('Moves would bring the electrodes closer than %f m in x, VME %s, CSE %s' % (self.min_x_gap, str(paths['vme']), str(paths['cse'])))
+
+    def RunPath(self, name, path):
+        tic = time.perf_counter()
+        if self.blend_radius is not None and len(path) > 1:
+            self.robots[name].MovePath([(x, y, z, self.blend_radius) for (x, y, z) in path])
+        else:
+            for (x, y, z) in path:
+                self.robots[name].Move(x, y, z)
+        return time.perf_counter() - tic
+
+    def RunSequential(self, paths, order):
+        for name in order:
+            self.move_time += self.RunPath(name, paths[name])
+        self.sequential_count += 1
+
+    def RunConcurrent(self, paths):
+        tic = time.perf_counter()
+        vme_future = self.executor.submit(self.RunPath, 'vme', paths['vme'])
+        cse_time = self.RunPath('cse', paths['cse'])
+        vme_time = vme_future.result()
+        elapsed = time.perf_counter() - tic
+
+        self.move_time += elapsed
+        self.saved_time += vme_time + cse_time - elapsed
+        self.concurrent_count += 1
+
+    def FlushDeferred(self):
+        if len(self.deferred['vme']) > 0 or len(self.deferred['cse']) > 0:
+            self.MoveBoth([], [])
+
+    def Report(self):
+        print('Motion scheduler: %d concurrent and %d sequential moves, %f s moving, overlap saved %f s' % (self.concurrent_count, self.sequential_count, self.move_time, self.saved_time))
+
+    def Close(self):
+        self.FlushDeferred()
+        self.executor.shutdown()
+        self.Report()
@@ -1,6 +1,7 @@
 import os
-from util import progress_bar, flatten_list, parse_string_to_complex, transpose_list_of_lists
-from calculation_functions import calculate_conductivity_series, euclidean_distance
+import numpy as np
+from util import process_files, parse_complex_array, complex_array_to_tuples
+from calculation_functions import calculate_conductivity_batch, euclidean_distance
 
 # Classes
 
@@ -17,8 +18,7 @@ class Sample:
         self.ground_truth = self.CalculateGroundTruthLine()
 
     def CalculateConductivity(self):
-        conductivities = calculate_conductivity_series(self.raw_data, self.distances, offset=0.5, digits=8)
-        self.conductivities = flatten_list(transpose_list_of_lists(conductivities))
+        calculate_conductivities([self])
     
     def CalculateGroundTruth(self):
         return euclidean_distance(self.gt_x, self.gt_y, self.x, self.y) < 5.5
@@ -54,20 +54,37 @@ def load_real_data(file_path):
             sample = Sample(l_x, l_y, depth, c_x, c_y)
 
         sample.distances.append(float(header_data[5]))
-        sample.raw_data.append([parse_string_to_complex(freq_data[freq]) for freq in range(15)])
+        sample.raw_data.append(complex_array_to_tuples(parse_complex_array(freq_data[:15])))
 
     return sample
 
-def load_real_model_data(folder_path, data_type):
-    files = os.listdir(folder_path)
-    p = progress_bar(len(files))
-    samples = []
-    for path in files:
-        file_path = os.path.join(folder_path, path)
-        s = load_real_data(file_path)
-        s.CalculateConductivity()
-        samples.append(s)
-        p.step()
+def calculate_conductivities(samples):
+    """Calculates the conductivities of many samples, one vectorised call per number of positions
+
+    Args:
+        samples (list<Sample>): Loaded samples
+
+    Returns:
+        None
+    """
+    groups = {}
+    for sample in samples:
+        groups.setdefault(len(sample.distances), []).append(sample)
+
+    for group in groups.values():
+        data = np.array([sample.raw_data for sample in group])
+        distances = np.array([sample.distances for sample in group])
+        conductivities = calculate_conductivity_batch(data, distances, offset=0.5, digits=8)
+
+        # Order by frequency, then position
+        flattened = conductivities.transpose(0, 2, 1).reshape(len(group), -1)
+        for sample, values in zip(group, flattened.tolist()):
+            sample.conductivities = values
+
+def load_real_model_data(folder_path, data_type, workers = None):
+    files = sorted(os.listdir(folder_path))
+    samples = process_files(load_real_data, [(os.path.join(folder_path, path),) for path in files], workers)
+    calculate_conductivities(samples)
 
     if data_type == 'Train':
         return [(val.ground_truth, val.conductivities) for val in samples]
@@ -0,0 +1,218 @@
+import time
+from types import SimpleNamespace
+import numpy as np
+from sampler import Sampler
+from acquisition_log import AcquisitionLogReader
+from sensor_protocol import ComplexReading
+from util import parse_complex_array
+
+# Classes
+
+class NullVisualiser:
+    binary = False
+
+    def send(self, msg):
+        pass
+
+    def SendPoint(self, prefix, text, values):
+        pass
+
+class ReplaySampler(Sampler):
+    def __init__(self, model, session, timings):
+        """Initialises a sampler that runs a recorded position through SampleAll without robots or sensor.
+
+        Args:
+            model (MlModel): Model to predict with
+            session (ReplaySession): Recorded readings of one CSE position
+            timings (dict<str, float>): Stage timings, added to in place
+
+        Returns:
+            New ReplaySampler object
+        """
+        depth_info = SimpleNamespace(lift_between=False, lift_height=0, InitialHeight=lambda: 0)
+        sampling_info = SimpleNamespace(initial_distance=0, step_size=session.step_size)
+        super().__init__(model, session.vme_positions, None, depth_info, False, sampling_info, None, NullVisualiser(), session.output_prefix, session.cse_position, (None, None))
+
+        self.session = session
+        self.timings = timings
+        self.reset_count = 0
+
+    def Sample(self, index, on_data = None):
+        data = self.session.readings[index]
+        if on_data is not None:
+            on_data(data)
+        return data
+
+    def ProcessData(self, data):
+        tic = time.perf_counter()
+        result = super().ProcessData(data)
+        self.timings['conductivity'] += time.perf_counter() - tic
+        return result
+
+    def SampleAll(self):
+        # A reset would replay the same readings again, so stop at the first one
+        self.reset_count += 1
+        if self.reset_count > 1:
+            return None
+        return super().SampleAll()
+
+    def SaveData(self, data):
+        pass
+
+    def ReportTimes(self):
+        pass
+
+class TimedModel:
+    def __init__(self, model, timings):
+        self.model = model
+        self.timings = timings
+
+    def predict(self, data):
+        tic = time.perf_counter()
+        result = self.model.predict(data)
+        self.timings['prediction'] += time.perf_counter() - tic
+        return result
+
+class ReplaySession:
+    def __init__(self, cse_position, output_prefix, step_size):
+        """Initialises the recorded readings of one CSE position.
+
+        Args:
+            cse_position (tuple<float, float>): CSE position in metres
+            output_prefix (list<float>): CSE x, y, surface height and sampling depth, as saved by the sampler
+            step_size (float): Step size saved with the readings
+
+        Returns:
+            New ReplaySession object
+        """
+        self.cse_position = cse_position
+        self.output_prefix = output_prefix
+        self.step_size = step_size
+        self.vme_positions = []
+        self.readings = []
+
+    def AddReading(self, vme_position, values):
+        self.vme_positions.append(vme_position)
+        self.readings.append(ComplexReading(values))
+
+# Functions
+
+def group_sessions(positions, readings):
+    """Groups consecutive readings into CSE positions, a new group starts when the CSE moves or a VME position repeats
+
+    Args:
+        positions (list<list<float>>): Saved position values, CSE x, y, surface height, sampling depth, VME x, y, distance and step size
+        readings (list<np.ndarray>): Raw complex readings shaped (frequencies, samples)
+
+    Returns:
+        list<ReplaySession>: Recorded positions in order
+    """
+    sessions = []
+    current = None
+    for position, values in zip(positions, readings):
+        (x, y, surface_height, sampling_depth, vme_x, vme_y, _, step_size) = [float(v) for v in position]
+
+        if current is None or current.output_prefix != [x, y, surface_height, sampling_depth] or (vme_x, vme_y) in current.vme_positions:
+            current = ReplaySession((x, y), [x, y, surface_height, sampling_depth], step_size)
+            sessions.append(current)
+
+        current.AddReading((vme_x, vme_y), values)
+
+    return sessions
+
+def load_text_sessions(file_path):
+    """Loads readings saved to data.txt by Sampler.SaveData
+
+    Args:
+        file_path (str): Path to data.txt
+
+    Returns:
+        list<ReplaySession>: Recorded positions in order
+    """
+    positions = []
+    readings = []
+    with open(file_path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            split_line = line.strip().split('; ')
+            positions.append(split_line[1:9])
+
+            # Values are saved in volts frequency by frequency, GetComplexData returns millivolts
+            values = parse_complex_array(split_line[9:]) * 1000
+            readings.append(values.reshape(15, -1))
+
+    return group_sessions(positions, readings)
+
+def load_log_sessions(file_path):
+    """Loads readings from an acquisition log
+
+    Args:
+        file_path (str): Path to log
+
+    Returns:
+        list<ReplaySession>: Recorded positions in order
+    """
+    reader = AcquisitionLogReader(file_path)
+    return group_sessions(reader.Positions(), [np.array(reader.Samples(i)) for i in range(len(reader))])
+
+def replay(model, sessions):
+    """Runs recorded positions through the sampler's conductivity, outlier reset and prediction logic as fast as possible
+
+    Args:
+        model (MlModel): Model to predict with
+        sessions (list<ReplaySession>): Recorded positions
+
+    Returns:
+        (list<dict>, dict<str, float>): Per position CSE position, prediction and whether an outlier reset was hit, and total seconds spent in each stage
+    """
+    timings = {'conductivity': 0, 'prediction': 0, 'total': 0}
+    timed_model = TimedModel(model, timings)
+
+    results = []
+    tic = time.perf_counter()
+    for session in sessions:
+        sampler = ReplaySampler(timed_model, session, timings)
+        prediction = sampler.SampleAll()
+        results.append({'cse_position': session.cse_position, 'prediction': prediction, 'reset': sampler.reset_count > 1})
+    timings['total'] = time.perf_counter() - tic
+
+    return results, timings
+
+def replay_file(model, file_path):
+    """Replays data.txt or an acquisition log and prints the predictions and stage timings
+
+    Args:
+        model (MlModel): Model to predict with
+        file_path (str): Path to data.txt or an acquisition log
+
+    Returns:
+        list<dict>: Per position results, see replay
+    """
+    tic = time.perf_counter()
+    if file_path.endswith('.txt'):
+        sessions = load_text_sessions(file_path)
+    else:
+        sessions = load_log_sessions(file_path)
+    load_time = time.perf_counter() - tic
+
+    results, timings = replay(model, sessions)
+
+    for result in results:
+        if result['reset']:
+            print('%f, %f: outlier reset' % (result['cse_position'][0], result['cse_position'][1]))
+        else:
+            print('%f, %f: %f' % (result['cse_position'][0], result['cse_position'][1], result['prediction']))
+
+    count = max(len(results), 1)
+    print('Replayed %d positions: loading %f s, conductivity %f ms, prediction %f ms, total %f ms per position' % (len(results), load_time, timings['conductivity'] / count * 1000, timings['prediction'] / count * 1000, timings['total'] / count * 1000))
+
+    return results
+
+if __name__ == "__main__":
+    from model_definitions import FunctionalDenseModel
+
+    model = FunctionalDenseModel('asmodel/model', 75)
+    model.load()
+
+    replay_file(model, 'data.txt')
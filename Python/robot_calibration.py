@@ -18,9 +18,12 @@ ur2_Rot = [1.764, -1.176, 2.106]
 r1_calibration = [0.046, 0.002, 0.0024]
 r2_calibration = [0.0535, 0, 0.0015]
 
-def home_robots(robot1, robot2):
-    robot1.Move(0.05, 0, 0.15)
-    robot2.Move(-0.05, 0, 0.15)
+def home_robots(robot1, robot2, scheduler = None):
+    if scheduler is not None:
+        scheduler.MoveBoth([(0.05, 0, 0.15)], [(-0.05, 0, 0.15)])
+    else:
+        robot1.Move(0.05, 0, 0.15)
+        robot2.Move(-0.05, 0, 0.15)
     time.sleep(2)
 
 def calibration(robot, calibration_height = 0.002):
@@ -1,7 +1,8 @@
-import rtde_control, math
+import math, time
+import numpy as np
 
 class Robot:
-    def __init__(self, ip, rot, theta, orig, calibration, logger):
+    def __init__(self, ip, rot, theta, orig, calibration, logger, controller_factory = None):
         """Initialises new robot controller object.
 
         Args:
@@ -11,6 +12,7 @@ class Robot:
             orig (list<double>): Origin of robot
             calibration (list<double>): List of offsets to x, y, z positions for minor calibrations
             logger (Logger): Logger object 
+            controller_factory (function default None): Creates a controller from an IP address, an RTDEControlInterface if None
 
         Returns:
             New Robot object
@@ -19,12 +21,23 @@ class Robot:
         # Define controller and connection IP
         self.controller = None
         self.ip_addr = ip
+        self.controller_factory = default_controller_factory if controller_factory is None else controller_factory
+
+        # Session keeping the controller alive between positions, see robot_session
+        self.session = None
+
+        # Seconds taken by each controller connection
+        self.connect_times = []
+
+        # Last commanded pose in robot frame, used to limit blend radii of paths
+        self.pose = None
 
         # Set transformation parameters
         self.rot = rot
         self.theta = theta
         self.orig = orig
         self.calibration = calibration
+        self.UpdateTransform()
 
         # Internal command logger
         self.logger = logger
@@ -42,7 +55,9 @@ class Robot:
             self.Disconnect()
 
         # Establish connection
-        self.controller = rtde_control.RTDEControlInterface(self.ip_addr)
+        tic = time.perf_counter()
+        self.controller = self.controller_factory(self.ip_addr)
+        self.connect_times.append(time.perf_counter() - tic)
 
         # Log action
         self.logger.LogData(['Info', 'Robot connected'])
@@ -78,8 +93,8 @@ class Robot:
         Z += self.calibration[2]
 
         # Rotate around z axis
-        x = X * math.cos(self.theta) + Y * math.sin(self.theta)
-        y = X * -math.sin(self.theta) + Y * math.cos(self.theta)
+        x = X * self.cos_theta + Y * self.sin_theta
+        y = X * -self.sin_theta + Y * self.cos_theta
         z = Z
 
         # Translate positions given robot's origin
@@ -92,6 +107,62 @@ class Robot:
 
         return (x, y, z)
 
+    def UpdateTransform(self):
+        """Precomputes the workspace to robot frame transformation, call again after changing theta, orig or calibration
+
+        Returns:
+            None
+        """
+        self.cos_theta = math.cos(self.theta)
+        self.sin_theta = math.sin(self.theta)
+
+        # Robot frame position = rotation @ (workspace position + offset) + origin
+        self.offset = np.array(self.calibration, dtype=np.float64)
+        self.rotation = np.array([
+            [self.cos_theta, self.sin_theta, 0],
+            [-self.sin_theta, self.cos_theta, 0],
+            [0, 0, 1]
+        ])
+        self.origin = np.array(self.orig, dtype=np.float64)
+
+    def TransformBatch(self, points):
+        """Converts positions in workspace frame to robot frame in one go, without logging.
+        Args:
+            points (np.ndarray): Positions in workspace frame shaped (N, 3) (in meters)
+
+        Returns:
+            np.ndarray: Positions in robot's frame shaped (N, 3)
+        """
+        return (np.asarray(points, dtype=np.float64) + self.offset) @ self.rotation.T + self.origin
+
+    def InverseTransformBatch(self, points):
+        """Converts positions in robot frame back to workspace frame.
+        Args:
+            points (np.ndarray): Positions in robot's frame shaped (N, 3) (in meters)
+
+        Returns:
+            np.ndarray: Positions in workspace frame shaped (N, 3)
+        """
+        return (np.asarray(points, dtype=np.float64) - self.origin) @ self.rotation - self.offset
+
+    def CheckReachable(self, points, max_reach = 0.85, min_reach = 0.15, min_z = None):
+        """Checks positions in workspace frame against the robot's working envelope before moving
+        Args:
+            points (np.ndarray): Positions in workspace frame shaped (N, 3) (in meters)
+            max_reach (double default 0.85): Largest distance from the base, 0.85 m for a UR5
+            min_reach (double default 0.15): Smallest horizontal distance from the base axis, moves closer pass near singularities
+            min_z (double default None): Lowest allowed height in robot frame, not checked if None
+
+        Returns:
+            np.ndarray: bool array, True for each position the robot can safely reach
+        """
+        transformed = self.TransformBatch(points)
+        horizontal = np.hypot(transformed[:, 0], transformed[:, 1])
+        reachable = (np.sqrt(horizontal * horizontal + transformed[:, 2] * transformed[:, 2]) <= max_reach) & (horizontal >= min_reach)
+        if min_z is not None:
+            reachable &= transformed[:, 2] >= min_z
+        return reachable
+
     def Move(self, X, Y, Z, rotation = None):
         """Moves robot to given position in workspace frame
         Args:
@@ -114,9 +185,103 @@ class Robot:
         self.logger.LogData([x, y, z, rotation])
 
         # Ensure connection
-        if not self.controller.isConnected():
+        self.EnsureConnection()
+
+        # Perform move
+        self.controller.moveL([x, y, z, rotation[0], rotation[1], rotation[2]], 0.5, 0.5)
+        self.pose = (x, y, z)
+
+    def MovePath(self, waypoints, speed = 0.5, acceleration = 0.5, rotation = None):
+        """Moves robot through a list of positions in workspace frame as a single path command, blending past each waypoint instead of stopping
+        Args:
+            waypoints (list<tuple<double, double, double, double>>): X, Y, Z in workspace frame and blend radius (in meters), the last waypoint is always reached without blending
+            speed (double default 0.5): Tool speed in m/s
+            acceleration (double default 0.5): Tool acceleration in m/s^2
+            rotation (list<double> default None): Expected TCP rotation, will override with defaults if None
+
+        Returns:
+            None
+        """
+
+        # Determine which rotation to use
+        rotation = self.rot if rotation == None else rotation
+
+        # Transform all waypoints to robot frame
+        waypoints = np.array(waypoints, dtype=np.float64).reshape(-1, 4)
+        transformed = self.TransformBatch(waypoints[:, :3]).tolist()
+        path = [[x, y, z, rotation[0], rotation[1], rotation[2], speed, acceleration, blend] for (x, y, z), blend in zip(transformed, waypoints[:, 3].tolist())]
+        limit_blend_radii(path, self.pose)
+
+        # Log move
+        self.logger.LogData(['Path'] + [waypoint[:3] + [waypoint[8]] for waypoint in path])
+
+        # Ensure connection
+        self.EnsureConnection()
+
+        # Perform all moves, the controller only stops at the end of the path
+        self.controller.moveL(path)
+        self.pose = tuple(path[-1][:3])
+
+    def EnsureConnection(self):
+        """Makes sure the controller is connected and running before a move
+
+        Returns:
+            None
+        """
+        if self.session is not None:
+            self.session.EnsureReady()
+        elif not self.controller.isConnected():
             print("Trying to reestablish robot connection")
             self.ConnectController()
 
-        # Perform move
-        self.controller.moveL([x, y, z, rotation[0], rotation[1], rotation[2]], 0.5, 0.5)
\ No newline at end of file
+    def Idle(self):
+        """Releases the robot while the other robot works, keeping the session's connection if there is one
+
+        Returns:
+            None
+        """
+        if self.session is not None:
+            self.session.Idle()
+        else:
+            self.Disconnect()
+
+    def Resume(self):
+        """Takes control of the robot again after Idle
+
+        Returns:
+            None
+        """
+        if self.session is not None:
+            self.session.Resume()
+        else:
+            self.ConnectController()
+
+def limit_blend_radii(path, start = None):
+    """Shrinks blend radii in place so no blend takes up more than half of a segment next to its waypoint, overlapping blends are rejected by the controller
+
+    Args:
+        path (list<list<double>>): Path as sent to moveL, x, y, z, rx, ry, rz, speed, acceleration and blend radius per waypoint
+        start (tuple<double, double, double> default None): Position the path starts from, only the following segment limits the first blend if None
+
+    Returns:
+        None
+    """
+    points = ([list(start)] if start is not None else []) + [waypoint[:3] for waypoint in path]
+    lengths = [math.dist(a, b) for a, b in zip(points[:-1], points[1:])]
+    offset = 1 if start is not None else 0
+
+    for i, waypoint in enumerate(path):
+        if i == len(path) - 1:
+            waypoint[8] = 0
+            break
+
+        # Segments before and after waypoint i
+        limits = [lengths[i + offset]]
+        if i + offset > 0:
+            limits.append(lengths[i + offset - 1])
+        waypoint[8] = max(0, min([waypoint[8]] + [length / 2 for length in limits]))
+
+def default_controller_factory(ip):
+    # Imported here so robots can be driven by a stand-in without ur_rtde installed
+    import rtde_control
+    return rtde_control.RTDEControlInterface(ip)
@@ -0,0 +1,145 @@
+import time
+
+# Classes
+
+class RobotSession:
+    def __init__(self, robot, name, max_retries = 5, retry_delay = 0.5, max_retry_delay = 8):
+        """Initialises a session that keeps one controller connection to a robot for a whole run.
+
+        Args:
+            robot (Robot): Robot to manage, its moves check the session before moving
+            name (str): Name used in reports
+            max_retries (int): Reconnect attempts before giving up
+            retry_delay (float): Seconds before the first retry, doubled on each further retry
+            max_retry_delay (float): Longest wait between retries
+
+        Returns:
+            New RobotSession object
+        """
+        self.robot = robot
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self.idle = False
+        self.reconnect_count = 0
+        self.idle_count = 0
+
+        # Seconds taken by each script upload when resuming
+        self.resume_times = []
+
+        robot.session = self
+
+    def Open(self):
+        if self.robot.controller is None:
+            self.robot.ConnectController()
+
+    def Close(self):
+        if self.robot.controller is not None:
+            self.robot.Disconnect()
+        self.robot.session = None
+
+    def IsHealthy(self):
+        return self.robot.controller is not None and self.robot.controller.isConnected()
+
+    def EnsureConnected(self):
+        """Reconnects with exponential backoff if the connection was lost
+
+        Returns:
+            None
+        """
+        for retry_no in range(self.max_retries + 1):
+            if self.IsHealthy():
+                return
+
+            if retry_no > 0:
+                time.sleep(min(self.retry_delay * 2 ** (retry_no - 1), self.max_retry_delay))
+
+            print('%s: reestablishing robot connection' % (self.name))
+            self.reconnect_count += 1
+            try:
+                # Reuse the existing interface if it can reconnect itself, it is much cheaper than a new one
+                if self.robot.controller is not None and hasattr(self.robot.controller, 'reconnect'):
+                    tic = time.perf_counter()
+                    self.robot.controller.reconnect()
+                    self.robot.connect_times.append(time.perf_counter() - tic)
+                else:
+                    self.robot.controller = None
+                    self.robot.ConnectController()
+            except RuntimeError as err:
+                print(err)
+
+        if not self.IsHealthy():
+            raise RuntimeError('%s: could not reconnect to robot' % (self.name))
+
+    def EnsureReady(self):
+        self.EnsureConnected()
+        if self.idle:
+            self.Resume()
+
+    def Idle(self):
+        """Stops the control script so the robot is released, without closing the connection
+
+        Returns:
+            None
+        """
+        if self.idle:
+            return
+
+        self.EnsureConnected()
+        self.robot.controller.stopScript()
+        self.idle = True
+        self.idle_count += 1
+
+    def Resume(self):
+        if not self.idle:
+            return
+
+        self.EnsureConnected()
+        tic = time.perf_counter()
+        self.robot.controller.reuploadScript()
+        self.resume_times.append(time.perf_counter() - tic)
+        self.idle = False
+
+class SessionManager:
+    def __init__(self, robots, **kwargs):
+        """Initialises sessions for all robots of a run.
+
+        Args:
+            robots (dict<str, Robot>): Robots by name
+            kwargs: Passed on to each RobotSession
+
+        Returns:
+            New SessionManager object
+        """
+        self.sessions = {name: RobotSession(robot, name, **kwargs) for name, robot in robots.items()}
+        self.start_time = None
+
+    def Open(self):
+        self.start_time = time.perf_counter()
+        for session in self.sessions.values():
+            session.Open()
+
+    def CheckHealth(self):
+        """Reconnects any robot whose connection was lost
+
+        Returns:
+            dict<str, bool>: Whether each robot was healthy before the check
+        """
+        health = {name: session.IsHealthy() for name, session in self.sessions.items()}
+        for session in self.sessions.values():
+            session.EnsureConnected()
+        return health
+
+    def Close(self):
+        for session in self.sessions.values():
+            session.Close()
+        self.Report()
+
+    def Report(self):
+        run_time = 0 if self.start_time is None else time.perf_counter() - self.start_time
+        print('Robot sessions over %f s' % (run_time))
+        for name, session in self.sessions.items():
+            connect_times = session.robot.connect_times
+            print('%s: %d connections taking %f s in total, %d reconnects, idled %d times, resuming took %f s in total' % (name, len(connect_times), sum(connect_times), session.reconnect_count, session.idle_count, sum(session.resume_times)))
@@ -1,5 +1,12 @@
-import socket
-from util import parse_string_to_complex
+import socket, threading, time
+from collections import deque
+import numpy as np
+from util import parse_complex_array, complex_array_to_tuples
+from sensor_protocol import COMMAND_SAMPLE, COMMAND_BINARY_SAMPLE, COMMAND_PROBE, COMMAND_RECONNECT, COMMAND_END, TEXT_FRAME_LENGTH, TEXT_PADDING, FRAME_MAGIC, FRAME_HEADER, decode_binary_header, decode_binary_frame, complex_array_to_dict
+from visualiser_protocol import MESSAGE_MARKER, FLAG_DELTA, encode_message, decode_message_header
+
+# Last byte of a complete text frame, padding or the closing bracket of an unpadded frame
+TEXT_FRAME_ENDS = (TEXT_PADDING[0], ord(']'))
 
 class MatlabSockets:
     def __init__(self, ip_address: str, port: int):
@@ -10,118 +17,446 @@ class MatlabSockets:
 
         # Make a huge buffer (There's potentially a lot of data coming from the sensor)
         self.buffer_size = 75000
+        self.frame_buffer = bytearray(self.buffer_size)
         self.connected = False
 
+        # Retry unusable frames with exponential backoff
+        self.max_retries = 20
+        self.retry_delay = 0.01
+        self.max_retry_delay = 0.5
+
+        # Seconds to wait for the rest of a frame before giving up on it
+        self.frame_timeout = 5.0
+
+        # Frames received, retries, receive calls beyond the first per read and total bytes received
+        self.ResetStats()
+
+        # Use binary frames instead of text, see NegotiateBinary
+        self.binary = False
+
     def Connect(self):
         '''Connect to previously defined connection'''
         self.sock.connect((self.ip_addr, self.port))
+        self.sock.settimeout(self.frame_timeout)
         self.connected = True
 
     def IsConnected(self):
         return self.connected
 
+    def Disconnect(self):
+        '''Tell the server to stop and close the connection'''
+        if self.connected:
+            self.sock.send(COMMAND_END)
+            self.sock.close()
+            self.connected = False
+
     def Reset(self):
-        self.sock.send(b'r')        
+        self.sock.send(COMMAND_RECONNECT)
 
-    def GetComplexData(self, retry_no = 0):
+    def NegotiateBinary(self, timeout = 1.0):
         '''
-        Get some data from TCP connection
+        Ask the server whether it supports binary frames, servers that don't reply keep using text frames
+
+        Args:
+            timeout (float): Seconds to wait for a reply
+
+        Returns:
+            bool: Whether binary frames will be used
+        '''
+        self.sock.send(COMMAND_PROBE)
+        self.sock.settimeout(timeout)
+        try:
+            self.binary = self.ReceiveExact(len(FRAME_MAGIC)) == FRAME_MAGIC
+        except socket.timeout:
+            self.binary = False
+
+            # A late reply would otherwise be read as the start of the first frame
+            self.Drain(timeout)
+        finally:
+            self.sock.settimeout(self.frame_timeout)
+
+        if not self.binary:
+            self.Drain()
+
+        return self.binary
+
+    def ReceiveInto(self, start, end):
+        '''
+        Fill the frame buffer from start to end, growing it if needed
 
         Args:
-            retry_no (int): Retry number, will throw a runtimerror if greater than or equal to 10
+            start (int): Buffer index to start writing at
+            end (int): Buffer index to stop writing at
+
+        Returns:
+            int: end
+        '''
+        if end > len(self.frame_buffer):
+            self.frame_buffer.extend(bytes(end - len(self.frame_buffer)))
+
+        view = memoryview(self.frame_buffer)
+        first = True
+        while start < end:
+            received = self.sock.recv_into(view[start:end])
+            if received == 0:
+                raise RuntimeError('Socket connection broken')
+            if not first:
+                self.stats['partial_reads'] += 1
+            first = False
+            self.stats['bytes_received'] += received
+            start += received
+
+        return end
+
+    def ReceiveExact(self, byte_count):
+        self.ReceiveInto(0, byte_count)
+        return bytes(self.frame_buffer[:byte_count])
+
+    def ReceiveTextFrame(self):
+        '''
+        Receive one text frame into the frame buffer
+
+        Frames are padded with '?' to TEXT_FRAME_LENGTH, longer frames aren't padded and end with ']'
+
+        Returns:
+            str: Frame with the padding removed
+        '''
+        received = self.ReceiveInto(0, TEXT_FRAME_LENGTH)
+        while self.frame_buffer[received - 1] not in TEXT_FRAME_ENDS:
+            if received == len(self.frame_buffer):
+                self.frame_buffer.extend(bytes(len(self.frame_buffer)))
+
+            count = self.sock.recv_into(memoryview(self.frame_buffer)[received:])
+            if count == 0:
+                raise RuntimeError('Socket connection broken')
+            self.stats['partial_reads'] += 1
+            self.stats['bytes_received'] += count
+            received += count
+
+        return self.frame_buffer[:received].decode('utf-8').rstrip('?')
+
+    def GetBinaryFrame(self):
+        '''
+        Request and decode one binary frame
 
         Returns:
-            list: a list of dictionaries one for Module and one for Phase angle. Each key is the frequency index (not in kHz), each value is a list of sampled values at that frequency
+            np.ndarray: complex128 values shaped (frequencies, samples)
+        '''
+        self.sock.send(COMMAND_BINARY_SAMPLE)
 
+        self.ReceiveInto(0, FRAME_HEADER.size)
+        (frame_length, _, _, _) = decode_binary_header(self.frame_buffer)
+        self.ReceiveInto(FRAME_HEADER.size, frame_length)
+
+        return decode_binary_frame(memoryview(self.frame_buffer)[:frame_length])
+
+    def Drain(self, timeout = 0.05):
         '''
+        Discard whatever is left of a broken frame so the next request starts on a frame boundary
+
+        Args:
+            timeout (float): Seconds without new data before the socket counts as drained
+        '''
+        self.sock.settimeout(timeout)
         try:
-            if not self.connected:
-                raise RuntimeError('Socket not connected')
+            while True:
+                count = self.sock.recv_into(self.frame_buffer)
+                if count == 0:
+                    break
+                self.stats['bytes_received'] += count
+        except socket.timeout:
+            pass
+        finally:
+            self.sock.settimeout(self.frame_timeout)
+
+    def ParseComplexData(self, response):
+        '''
+        Parse a text frame
 
-            #if retry_no >= 20:
-            #    raise RuntimeError('Too many retries')
+        Args:
+            response (str): Frame with padding removed
+
+        Returns:
+            dict<int, list<tuple<float, float>>>: List of samples for each frequency index
+        '''
+        if not response:
+            raise ValueError('No data received, retrying')
+
+        if response[0] != '[' or response[-1] != ']':
+            raise ValueError('Data misshapen, retrying')
+
+        response = response.replace('[', '').replace(']','')
+
+        # Parse all values in one pass
+        tokens = response.replace(';', ' ').split()
+        values = parse_complex_array(tokens)
+        if len(values) == 0:
+            raise ValueError('No values in data, retrying')
 
-            # Send command byte
-            self.sock.send(b'c')
+        # Complex readings arrive with their components swapped, values without an imaginary part are real
+        has_imag = np.fromiter(['i' in token for token in tokens], dtype=bool, count=len(tokens))
+        values = np.where(has_imag, values.imag + 1j * values.real, values)
 
-            # Get response and format it
-            response = self.sock.recv(self.buffer_size).decode('utf-8')
-            if not response:
-                raise ValueError('No data received, retrying')
+        if np.any(values.real == 0):
+            raise ValueError('Real component was zero, retrying')
 
-            response = response.replace('?', '')
-            if response[0] != '[' or response[-1] != ']':
-                raise ValueError('Data misshapen, retrying')
+        # Values are ordered sample by sample, so every 15th value belongs to the same frequency
+        if len(values) % 15 == 0:
+            return complex_array_to_dict(values.reshape(-1, 15).T)
 
-            response = response.replace('[', '').replace(']','')
+        data_dict = {}
+        for freqbin in range(min(15, len(values))):
+            data_dict[freqbin] = complex_array_to_tuples(values[freqbin::15])
 
-            data_dict = {}
-            
-            # Split into individual values
-            values = response.replace(';', ' ').split(' ')
+        return data_dict
 
+    def GetComplexData(self, max_retries = None):
+        '''
+        Get some data from TCP connection
+
+        Args:
+            max_retries (int): Number of retries before throwing a RuntimeError, defaults to self.max_retries
 
-            # Raise error and try again if lists are not of equal length
+        Returns:
+            dict<int, list<tuple<float, float>>>: Each key is the frequency index (not in kHz), each value is a list of sampled values at that frequency
+
+        '''
+        if not self.connected:
+            raise RuntimeError('Socket not connected')
 
-            for index, value in enumerate(values):   
-                imag = 0
-                real = 0
-                if 'i' not in value:
-                    real = float(value)
-                
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        for retry_no in range(max_retries + 1):
+            if retry_no > 0:
+                self.stats['retries'] += 1
+                time.sleep(min(self.retry_delay * 2 ** (retry_no - 1), self.max_retry_delay))
+
+            try:
+                if self.binary:
+                    values = self.GetBinaryFrame()
+                    if values.size == 0:
+                        raise ValueError('No values in data, retrying')
+                    if np.any(values.real == 0):
+                        raise ValueError('Real component was zero, retrying')
+                    data = complex_array_to_dict(values)
                 else:
-                    (imag, real) = parse_string_to_complex(value)
-
-                if real == 0:
-                    raise ValueError('Real component was zero, retrying')
-               
-                # Convert from string
-                comp = (real, imag)
-
-                # Determine which bin to place value in based on number of sampled frequencies
-                freqbin = index % 15
-
-                # Place value in that bin
-                if freqbin not in data_dict.keys():
-                    data_dict[freqbin] = []
-                data_dict[freqbin].append(comp)
-                    
-            return data_dict
-
-        except RuntimeError as err:
-            print(err)
-            raise err
-
-        except ValueError as err:
-            print(err)
-            self.sock.recv(self.buffer_size)
-            return self.GetComplexData(retry_no = retry_no + 1)    
-                
-        except AttributeError as err:
-            print(err)
-            return self.GetComplexData(retry_no = retry_no + 1)
-
-        except IndexError as err:
-            print(err)
-            return self.GetComplexData(retry_no = retry_no + 1)
-
-        except Exception as err:
-           raise err
+                    # Send command byte
+                    self.sock.send(COMMAND_SAMPLE)
+                    data = self.ParseComplexData(self.ReceiveTextFrame())
+
+                self.stats['frames'] += 1
+                return data
+
+            except (ValueError, UnicodeDecodeError) as err:
+                # Frame was received but is unusable, skip anything left of it
+                print(err)
+                self.Drain()
+
+            except socket.timeout:
+                print('Frame incomplete after %f s, retrying' % (self.frame_timeout))
+                self.Drain()
+
+            except (AttributeError, IndexError) as err:
+                print(err)
+
+        raise RuntimeError('Too many retries')
+
+    def ResetStats(self):
+        self.stats = {'frames': 0, 'retries': 0, 'partial_reads': 0, 'bytes_received': 0}
 
 class VisualisationConnection:
-    def __init__(self, host, port):
+    # Messages that carry a full snapshot, only the latest of each needs to reach the visualiser
+    COALESCED_PREFIXES = ('R', 'C')
+
+    def __init__(self, host, port, background = True, queue_size = 64, binary = False):
+        '''
+        Connection to the visualiser
+
+        Args:
+            host (str): Visualiser address
+            port (int): Visualiser port
+            background (bool): Send from a background thread so send never blocks the caller
+            queue_size (int): Maximum number of queued messages, further messages other than snapshots are dropped
+            binary (bool): Send binary messages, see visualiser_protocol, instead of text
+        '''
         self.ip = host
         self.port = port
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.binary = binary
+
+        self.background = background
+        self.queue_size = queue_size
+        self.queue = deque()
+        self.snapshots = {}
+
+        # Message types whose delta couldn't be queued, further deltas are refused until a full snapshot is sent
+        self.dirty = set()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        self.error = None
+
+        # Messages sent, replaced by a newer snapshot before being sent, and dropped because the queue was full or the connection broke
+        self.sent_count = 0
+        self.coalesced_count = 0
+        self.dropped_count = 0
+        self.refused_delta_count = 0
 
     def connect(self):
         self.sock.connect((self.ip, self.port))
 
+        if self.background:
+            self.running = True
+            self.thread = threading.Thread(target=self.SendLoop, daemon=True)
+            self.thread.start()
+
     def send(self, msg):
-        msg = msg.encode()
+        '''
+        Queue a message. Snapshots of the same type replace each other, so they are never dropped.
+        Deltas are refused if the queue is full, and then until a full snapshot of their type is sent.
+
+        Args:
+            msg (str or bytes): Text or binary message
+
+        Returns:
+            bool: Whether the message will be sent, the caller must send a full snapshot if a delta was refused
+        '''
+        if not self.background:
+            self.SendNow(msg)
+            return True
+
+        (key, delta) = self.MessageKey(msg)
+
+        with self.condition:
+            if self.error is not None or not self.running:
+                self.dropped_count += 1
+                return False
+
+            if delta:
+                if key in self.dirty or len(self.queue) >= self.queue_size:
+                    # Queuing a later delta would leave a gap the visualiser can't see
+                    self.dirty.add(key)
+                    self.refused_delta_count += 1
+                    return False
+                self.queue.append((key, msg))
+            elif key is not None:
+                # A snapshot replaces the pending snapshot and all pending deltas of its type
+                pending_count = len(self.queue)
+                self.queue = deque([item for item in self.queue if not (item[0] == key and item[1] is not None)])
+                self.coalesced_count += pending_count - len(self.queue)
+                self.dirty.discard(key)
+
+                if key in self.snapshots:
+                    self.snapshots[key] = msg
+                    self.coalesced_count += 1
+                    return True
+
+                self.snapshots[key] = msg
+                self.queue.append((key, None))
+            else:
+                if len(self.queue) >= self.queue_size:
+                    self.dropped_count += 1
+                    return False
+                self.queue.append((None, msg))
+
+            self.condition.notify()
+            return True
+
+    def MessageKey(self, msg):
+        '''
+        Find the coalescing key of a message
+
+        Args:
+            msg (str or bytes): Text or binary message
+
+        Returns:
+            (str, bool): R or C for series messages, None for other messages, and whether the message is a delta
+        '''
+        if isinstance(msg, str):
+            return (msg[0] if len(msg) > 0 and msg[0] in self.COALESCED_PREFIXES else None, False)
+
+        if len(msg) == 0 or msg[0] != MESSAGE_MARKER:
+            return (None, False)
+
+        (message_type, flags) = decode_message_header(msg)[:2]
+        key = message_type.decode()
+        if key not in self.COALESCED_PREFIXES:
+            return (None, False)
+        return (key, bool(flags & FLAG_DELTA))
+
+    def SendPoint(self, prefix, text, values):
+        '''
+        Send a single point message such as P or A
+
+        Args:
+            prefix (str): Message type
+            text (str): Text message, sent if the connection isn't binary
+            values (list<float>): Values of the binary message
+        '''
+        if self.binary:
+            self.send(encode_message(prefix.encode(), values))
+        else:
+            self.send(text)
+
+    def SendNow(self, msg):
+        if isinstance(msg, str):
+            msg = msg.encode()
         totalsent = 0
         while totalsent < len(msg):
             sent = self.sock.send(msg[totalsent:])
             if sent == 0:
                 raise RuntimeError("socket connection broken")
-            totalsent = totalsent + sent  
\ No newline at end of file
+            totalsent = totalsent + sent
+
+    def SendLoop(self):
+        while True:
+            with self.condition:
+                while self.running and len(self.queue) == 0:
+                    self.condition.wait()
+                if len(self.queue) == 0:
+                    return
+
+                (key, msg) = self.queue.popleft()
+                if msg is None:
+                    msg = self.snapshots.pop(key)
+
+            try:
+                self.SendNow(msg)
+                self.sent_count += 1
+            except (OSError, RuntimeError) as err:
+                print('Visualiser connection lost: %s' % (str(err)))
+                with self.condition:
+                    self.error = err
+                    self.dropped_count += 1 + len(self.queue)
+                    self.queue.clear()
+                    self.snapshots.clear()
+                return
+
+    def Flush(self, timeout = None):
+        '''
+        Wait until all queued messages have been sent
+
+        Args:
+            timeout (float): Maximum seconds to wait, waits indefinitely if None
+
+        Returns:
+            bool: Whether the queue was emptied
+        '''
+        end = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            with self.condition:
+                if len(self.queue) == 0 or self.error is not None:
+                    return len(self.queue) == 0
+            if end is not None and time.perf_counter() > end:
+                return False
+            time.sleep(0.001)
+
+    def close(self, timeout = 1.0):
+        if self.thread is not None:
+            self.Flush(timeout)
+            with self.condition:
+                self.running = False
+                self.condition.notify()
+            self.thread.join(timeout)
+        self.sock.close()
@@ -0,0 +1,114 @@
+import math, time
+import numpy as np
+from scan_planner import move_time
+
+# Classes
+
+class RTDEControlStandIn:
+    def __init__(self, ip, connect_time = 2.0, reconnect_time = 0.2, script_upload_time = 0.3, drop_rate = 0, time_scale = 1.0, seed = None):
+        """Initialises a local stand-in for rtde_control.RTDEControlInterface that simulates connection setup and trajectory time.
+
+        Args:
+            ip (str): Robot address, only kept for reference
+            connect_time (float): Seconds to set up a new interface, a real one takes seconds
+            reconnect_time (float): Seconds for reconnect on an existing interface
+            script_upload_time (float): Seconds for reuploadScript
+            drop_rate (float): Probability that the connection drops after a move
+            time_scale (float): Multiplies all simulated durations, use less than 1 to run faster than real time
+            seed (int): Seed for dropped connections
+
+        Returns:
+            New RTDEControlStandIn object
+        """
+        self.ip = ip
+        self.connect_time = connect_time
+        self.reconnect_time = reconnect_time
+        self.script_upload_time = script_upload_time
+        self.drop_rate = drop_rate
+        self.time_scale = time_scale
+        self.rng = np.random.default_rng(seed)
+
+        self.pose = None
+        self.move_count = 0
+        self.simulated_time = 0
+
+        self.Wait(connect_time)
+        self.connected = True
+        self.script_running = True
+
+    def Wait(self, duration):
+        self.simulated_time += duration
+        time.sleep(duration * self.time_scale)
+
+    def isConnected(self):
+        return self.connected
+
+    def isProgramRunning(self):
+        return self.connected and self.script_running
+
+    def disconnect(self):
+        self.connected = False
+
+    def reconnect(self):
+        self.Wait(self.reconnect_time)
+        self.connected = True
+        self.script_running = True
+        return True
+
+    def stopScript(self):
+        self.script_running = False
+
+    def reuploadScript(self):
+        self.Wait(self.script_upload_time)
+        self.script_running = True
+        return True
+
+    def moveL(self, pose, speed = 0.25, acceleration = 1.2):
+        """Simulates a linear move or a blended path, waiting for the time a trapezoidal profile would take
+
+        Args:
+            pose (list<double> or list<list<double>>): Target [x, y, z, rx, ry, rz], or a path of [x, y, z, rx, ry, rz, speed, acceleration, blend radius] waypoints
+            speed (float): Top speed in m/s, for single moves
+            acceleration (float): Acceleration in m/s^2, for single moves
+
+        Returns:
+            bool: True once the move is done
+        """
+        if not self.connected:
+            raise RuntimeError('RTDE control interface not connected')
+        if not self.script_running:
+            raise RuntimeError('RTDE control script not running')
+
+        path = pose if isinstance(pose[0], (list, tuple)) else [list(pose) + [speed, acceleration, 0]]
+
+        # The robot only stops at waypoints without blending, so each run of blended segments is one trapezoidal move
+        # over its combined length. Corners cut by blending are ignored.
+        run_length = 0
+        for waypoint in path:
+            if self.pose is not None:
+                run_length += math.dist(self.pose[:3], waypoint[:3])
+            self.pose = list(waypoint[:6])
+
+            if waypoint[8] == 0 or waypoint is path[-1]:
+                self.Wait(float(move_time(run_length, waypoint[6], waypoint[7])))
+                run_length = 0
+
+        self.move_count += 1
+
+        if self.drop_rate > 0 and self.rng.random() < self.drop_rate:
+            self.connected = False
+
+        return True
+
+# Functions
+
+def standin_factory(**kwargs):
+    """Controller factory for Robot that creates stand-ins
+
+    Args:
+        kwargs: Passed on to RTDEControlStandIn
+
+    Returns:
+        function: Factory taking an IP address
+    """
+    return lambda ip: RTDEControlStandIn(ip, **kwargs)
@@ -1,10 +1,11 @@
 from calculation_functions import ConductivitySet
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from util import stringify_complex, transpose_list_of_lists
 
 class Sampler:
-    def __init__(self, model, sampling_positions, vme_robot, depth_info, dry_run, sampling_info, measurement_conn, visualiser_conn, output_prefix, cse_position, position_indices, cse=None, cse_height=None):
+    def __init__(self, model, sampling_positions, vme_robot, depth_info, dry_run, sampling_info, measurement_conn, visualiser_conn, output_prefix, cse_position, position_indices, cse=None, cse_height=None, pipelined=False, acquisition_log=None, blend_radius=None):
         self.model = model
         self.vme = vme_robot
         self.cse_position = cse_position
@@ -25,14 +26,29 @@ class Sampler:
         self.cse = cse
         self.cse_height = cse_height
 
-    def Sample(self, index):
+        # Process each position's data on a worker thread while the robot moves to the next position
+        self.pipelined = pipelined
+        self.position_times = []
+
+        # Binary log shared by the whole session, readings go to data_path as text if None
+        self.acquisition_log = acquisition_log
+        self.data_path = 'data.txt'
+
+        # Lift, move to the next position and lower as one blended path when lifting between positions
+        self.blend_radius = blend_radius
+        self.lowered_index = None
+
+    def Sample(self, index, on_data = None):
         pos = self.sampling_positions[index]       
         vme_height = self.height
 
-        self.vme.Move(pos[0], pos[1], vme_height)
+        if self.blend_radius is not None and self.lift_between:
+            self.MoveToSample(index)
+        else:
+            self.vme.Move(pos[0], pos[1], vme_height)
 
-        if self.lift_between:
-            self.vme.Move(pos[0], pos[1], vme_height - self.lift_height)
+            if self.lift_between:
+                self.vme.Move(pos[0], pos[1], vme_height - self.lift_height)
 
         time.sleep(0.1)
 
@@ -41,12 +57,43 @@ class Sampler:
             for _ in range(10):
                 data = self.measurement_conn.GetComplexData()
 
-        if self.lift_between:
+        # Hand the data over before lifting, so processing overlaps the lift
+        if on_data is not None:
+            on_data(data)
+
+        # With blending the lift is part of the path to the next position, except after the last one
+        if self.lift_between and (self.blend_radius is None or index == len(self.sampling_positions) - 1):
             self.vme.Move(pos[0], pos[1], vme_height)
+            self.lowered_index = None
         
         return data
 
+    def MoveToSample(self, index):
+        """Lifts the VME from the position it was lowered at, moves it over and lowers it at the given position in one path
+
+        Args:
+            index (int): Index of sampling position
+
+        Returns:
+            None
+        """
+        pos = self.sampling_positions[index]
+
+        waypoints = []
+        if self.lowered_index is not None:
+            last_pos = self.sampling_positions[self.lowered_index]
+            waypoints.append((last_pos[0], last_pos[1], self.height, self.blend_radius))
+        waypoints.append((pos[0], pos[1], self.height, self.blend_radius))
+        waypoints.append((pos[0], pos[1], self.height - self.lift_height, 0))
+
+        self.vme.MovePath(waypoints)
+        self.lowered_index = index
+
     def SaveData(self, data):
+        if self.acquisition_log is not None:
+            self.acquisition_log.Append(data[0], data[1])
+            return
+
         timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
         val = '; '.join([str(round(v, 4)) for v in data[0]])
         data_vals = ['%s; %s' % (timestamp, val)]
@@ -56,23 +103,80 @@ class Sampler:
 
         measurement_data = '; '.join(data_vals) + '\r\n'
 
-        with open('data.txt', 'a+') as f:
+        with open(self.data_path, 'a+') as f:
             f.write(measurement_data)
         pass
 
+    def IsStrange(self, values):
+        return max(values) > 20 or min(values) < -20
+
+    def ProcessData(self, data):
+        """Adds a position's data to the conductivity set
+
+        Args:
+            data (dict<int, list<tuple<float, float>>>): Data as returned by GetComplexData
+
+        Returns:
+            bool: False if the latest conductivities look wrong and sampling should restart
+        """
+        self.cs.AddData(data)
+        if len(self.cs.conductivities) > 0:
+            if self.IsStrange(self.cs.conductivities[-1]):
+                return False
+        return True
+
     def SampleAll(self):
+        if self.pipelined:
+            return self.SampleAllPipelined()
+
         self.cs.Reset()
+        self.position_times = []
         for i in range(len(self.sampling_positions)):
+            tic = time.perf_counter()
             data = self.Sample(i)
             if not self.dry_run:
-                self.cs.AddData(data)
-                if len(self.cs.conductivities) > 0:
-                    lastvals = self.cs.conductivities[-1]
-                    if max(lastvals) > 20 or min(lastvals) < -20:
-                        print("Strange data detected, resetting")
-                        self.SampleAll()
-                        return
-                    pass
+                if not self.ProcessData(data):
+                    print("Strange data detected, resetting")
+                    return self.SampleAll()
+            self.position_times.append(time.perf_counter() - tic)
+
+        return self.Finish()
+
+    def SampleAllPipelined(self):
+        self.cs.Reset()
+        self.position_times = []
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = []
+
+            def submit(data):
+                pending.append(executor.submit(self.ProcessData, data))
+
+            for i in range(len(self.sampling_positions)):
+                tic = time.perf_counter()
+                self.Sample(i, on_data=None if self.dry_run else submit)
+
+                # The previous position has had the whole move to finish processing
+                if len(pending) > 1 and not pending[-2].result():
+                    print("Strange data detected, resetting")
+                    pending[-1].result()
+                    return self.SampleAllPipelined()
+                self.position_times.append(time.perf_counter() - tic)
+
+            if len(pending) > 0 and not pending[-1].result():
+                print("Strange data detected, resetting")
+                return self.SampleAllPipelined()
+
+        return self.Finish()
+
+    def Finish(self):
+        """Checks all conductivities, saves the data and predicts from it
+
+        Returns:
+            float: Prediction, None if dry running
+        """
+        self.ReportTimes()
+
         if self.dry_run:
             return
 
@@ -80,8 +184,7 @@ class Sampler:
         c_min = min([item for sublist in self.cs.conductivities for item in sublist])
         if c_max > 20 or c_min < -20:
             print("Strange data detected, resetting")
-            self.SampleAll()
-            return
+            return self.SampleAll()
 
         for i, val in enumerate(self.sampling_positions):
             data_set = self.cs.raw_data[i]
@@ -98,6 +201,13 @@ class Sampler:
 
         if self.position_indices[0] is not None and self.position_indices[1] is not None:
             vis_data = "P[%d;%d;%f]" % (self.position_indices[0], self.position_indices[1], prediction)
-            self.visualiser_conn.send(vis_data)
+            self.visualiser_conn.SendPoint('P', vis_data, [self.position_indices[0], self.position_indices[1], prediction])
+
+        return prediction
+
+    def ReportTimes(self):
+        if len(self.position_times) == 0:
+            return
 
-        return prediction
\ No newline at end of file
+        total = sum(self.position_times)
+        print('%s sampling: %d positions in %f s, %f s per position' % ('Pipelined' if self.pipelined else 'Sequential', len(self.position_times), total, total / len(self.position_times)))
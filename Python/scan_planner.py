@@ -0,0 +1,219 @@
+import time
+import numpy as np
+
+# moveL speed and acceleration used by Robot.Move
+MOVE_SPEED = 0.5
+MOVE_ACCELERATION = 0.5
+
+# Functions
+
+def move_time(distance, speed = MOVE_SPEED, acceleration = MOVE_ACCELERATION):
+    """Duration of straight line moves with a trapezoidal velocity profile
+
+    Args:
+        distance (np.ndarray): Move lengths in metres
+        speed (float): Top speed in m/s
+        acceleration (float): Acceleration and deceleration in m/s^2
+
+    Returns:
+        np.ndarray: Move durations in seconds
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+
+    # Short moves never reach top speed and follow a triangular profile
+    ramp_distance = speed * speed / acceleration
+    return np.where(distance < ramp_distance, 2 * np.sqrt(distance / acceleration), distance / speed + speed / acceleration)
+
+def grid_points(dimensions, x_samples, y_samples):
+    """Grid positions in the order main.generate_grid_positions lists them
+
+    Args:
+        dimensions (tuple<float, float, float, float>): x start, y start, x end and y end in metres
+        x_samples (int): Number of positions along x
+        y_samples (int): Number of positions along y
+
+    Returns:
+        np.ndarray: Positions shaped (x_samples * y_samples, 2), x then y
+    """
+    (x_start, y_start, x_end, y_end) = dimensions
+    x, y = np.meshgrid(np.linspace(x_start, x_end, x_samples), np.linspace(y_start, y_end, y_samples), indexing='ij')
+    return np.round(np.stack([x.ravel(), y.ravel()], axis=1), 5)
+
+def transition_times(points, vme_distances = [6, 7, 9, 11, 15, 21], speed = MOVE_SPEED, acceleration = MOVE_ACCELERATION):
+    """Time spent travelling between consecutive CSE positions, the CSE moves to the next position then the VME moves from its last sampling position to its first at the next
+
+    Args:
+        points (np.ndarray): CSE positions shaped (positions, 2) in visiting order
+        vme_distances (list<float>): VME distances from the CSE in mm, in sampling order
+        speed (float): Top speed in m/s
+        acceleration (float): Acceleration in m/s^2
+
+    Returns:
+        np.ndarray: Seconds for each of the positions - 1 transitions
+    """
+    steps = np.diff(points, axis=0)
+    cse_distance = np.hypot(steps[:, 0], steps[:, 1])
+
+    # The VME starts at the last sampling distance along x and ends at the first
+    vme_distance = np.hypot(steps[:, 0] + (vme_distances[0] - vme_distances[-1]) / 1000, steps[:, 1])
+
+    return move_time(cse_distance, speed, acceleration) + move_time(vme_distance, speed, acceleration)
+
+def estimate_run_time(points, vme_distances = [6, 7, 9, 11, 15, 21], lift_height = 0.01, settle_time = 0.1, acquisition_time = 1.0, speed = MOVE_SPEED, acceleration = MOVE_ACCELERATION):
+    """Estimates the robot time of a grid run visiting the positions in the given order
+
+    Args:
+        points (np.ndarray): CSE positions shaped (positions, 2) in visiting order
+        vme_distances (list<float>): VME distances from the CSE in mm, in sampling order
+        lift_height (float): Lift between positions in metres
+        settle_time (float): Sampler's wait after lowering the VME
+        acquisition_time (float): Time for the sampler's readings at one VME position
+        speed (float): Top speed in m/s
+        acceleration (float): Acceleration in m/s^2
+
+    Returns:
+        dict<str, float>: Total seconds and the seconds spent travelling between positions
+    """
+    travel = float(np.sum(transition_times(points, vme_distances, speed, acceleration)))
+
+    # Per position: CSE lowers and lifts, the VME moves between sampling positions, lowers, samples and lifts at each
+    lift = float(move_time(lift_height, speed, acceleration))
+    vme_steps = np.abs(np.diff(vme_distances)) / 1000
+    per_position = 2 * lift + float(np.sum(move_time(vme_steps, speed, acceleration))) + len(vme_distances) * (2 * lift + settle_time + acquisition_time)
+
+    return {'total': travel + len(points) * per_position, 'travel': travel}
+
+def serpentine_order(points):
+    """Visits the grid column by column, reversing direction along y on every other column
+
+    Args:
+        points (np.ndarray): Positions shaped (positions, 2)
+
+    Returns:
+        np.ndarray: Indices into points in visiting order
+    """
+    columns = np.unique(points[:, 0], return_inverse=True)[1]
+    direction = np.where(columns % 2 == 0, 1, -1)
+    return np.lexsort((direction * points[:, 1], columns))
+
+def nearest_neighbour_order(points, start = 0):
+    """Greedily visits the closest unvisited position next
+
+    Args:
+        points (np.ndarray): Positions shaped (positions, 2)
+        start (int): Index of the first position
+
+    Returns:
+        np.ndarray: Indices into points in visiting order
+    """
+    count = len(points)
+    visited = np.zeros(count, dtype=bool)
+    order = np.empty(count, dtype=np.int64)
+
+    current = start
+    for i in range(count):
+        order[i] = current
+        visited[current] = True
+        if i == count - 1:
+            break
+
+        distance = np.hypot(points[:, 0] - points[current, 0], points[:, 1] - points[current, 1])
+        distance[visited] = np.inf
+        current = int(np.argmin(distance))
+
+    return order
+
+def two_opt(points, order, max_passes = 10, speed = MOVE_SPEED, acceleration = MOVE_ACCELERATION):
+    """Improves an open visiting order by reversing segments while that shortens the CSE travel time
+
+    Args:
+        points (np.ndarray): Positions shaped (positions, 2)
+        order (np.ndarray): Indices into points in visiting order, the first position stays first
+        max_passes (int): Maximum number of passes over the order
+        speed (float): Top speed in m/s
+        acceleration (float): Acceleration in m/s^2
+
+    Returns:
+        np.ndarray: Improved order
+    """
+    order = np.array(order)
+    count = len(order)
+
+    def cost(a, b):
+        return move_time(np.hypot(points[a, 0] - points[b, 0], points[a, 1] - points[b, 1]), speed, acceleration)
+
+    for _ in range(max_passes):
+        improved = False
+        for i in range(count - 2):
+            a = order[i]
+            b = order[i + 1]
+            c = order[i + 2:]
+
+            # Reversing order[i + 1:j + 1] replaces edges a-b and c-d with a-c and b-d, the last position has no d
+            d = np.append(order[i + 3:], -1)
+            has_d = d >= 0
+            gain = cost(a, b) - cost(a, c)
+            gain[has_d] += cost(c[has_d], d[has_d]) - cost(b, d[has_d])
+
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-12:
+                j = i + 2 + best
+                order[i + 1:j + 1] = order[i + 1:j + 1][::-1].copy()
+                improved = True
+
+        if not improved:
+            break
+
+    return order
+
+def plan_scan_order(positions, method = 'serpentine', max_passes = 10):
+    """Reorders sampling positions to cut robot travel
+
+    Args:
+        positions (list<tuple>): Positions as generated by main.generate_grid_positions, (x, y) or (x, y, x index, y index)
+        method (str): 'serpentine', 'nearest' or 'two_opt' (nearest neighbour improved by 2-opt)
+        max_passes (int): Maximum 2-opt passes
+
+    Returns:
+        list<tuple>: The same positions in visiting order
+    """
+    points = np.array([position[:2] for position in positions], dtype=np.float64)
+
+    if method == 'serpentine':
+        order = serpentine_order(points)
+    elif method == 'nearest':
+        order = nearest_neighbour_order(points)
+    elif method == 'two_opt':
+        order = two_opt(points, nearest_neighbour_order(points), max_passes)
+    else:
+        raise ValueError('Unknown scan order %s' % (method))
+
+    return [positions[i] for i in order]
+
+def report_scan_plans(points, name, methods = ['serpentine', 'nearest', 'two_opt'], **kwargs):
+    """Prints estimated run times of each ordering against the listed order
+
+    Args:
+        points (np.ndarray): Positions shaped (positions, 2) in listed order
+        name (str): Name of the grid
+        methods (list<str>): Orderings to compare
+        kwargs: Passed on to estimate_run_time
+
+    Returns:
+        None
+    """
+    naive = estimate_run_time(points, **kwargs)
+    print('%s, %d positions, listed order: %f s total, %f s travel' % (name, len(points), naive['total'], naive['travel']))
+
+    for method in methods:
+        tic = time.perf_counter()
+        ordered = np.array(plan_scan_order([tuple(p) for p in points], method))
+        planning_time = time.perf_counter() - tic
+
+        estimate = estimate_run_time(ordered, **kwargs)
+        print('%s: %f s total, %f s travel (%.1f%% less travel), planned in %f s' % (method, estimate['total'], estimate['travel'], 100 * (1 - estimate['travel'] / naive['travel']), planning_time))
+
+if __name__ == "__main__":
+    # Grids used by main.do_work
+    report_scan_plans(grid_points((-0.015, -0.015, 0.015, 0.015), 7, 7), '7x7 grid')
+    report_scan_plans(grid_points((-0.02, -0.02, 0.02, 0.02), 100, 100), '100x100 search grid', methods=['serpentine', 'nearest'])
@@ -0,0 +1,185 @@
+import socket, threading, time
+import numpy as np
+from sensor_protocol import COMMAND_SAMPLE, COMMAND_BINARY_SAMPLE, COMMAND_PROBE, COMMAND_RECONNECT, COMMAND_END, FRAME_MAGIC, encode_binary_frame, encode_text_frame
+
+# Classes
+
+class SensorEmulator:
+    def __init__(self, host = '127.0.0.1', port = 0, frequency_count = 15, sample_count = 99, value_size = 4, seed = None,
+                 latency = 0, jitter = 0, fragment_size = None, fragment_delay = 0, malformed_rate = 0, malformed_kinds = ('misshapen', 'zero'), spectrum = None):
+        """Initialises a stand-in for ElikoTCP.m that serves synthetic spectra over the same protocol.
+
+        Args:
+            host (str): Address to listen on
+            port (int): Port to listen on, 0 picks a free port
+            frequency_count (int): Number of frequencies per sample
+            sample_count (int): Number of samples per reading
+            value_size (int): Bytes per component in binary frames, 4 or 8
+            seed (int): Seed for the synthetic spectra and all simulated faults
+            latency (float): Seconds between a request and its reply
+            jitter (float): Reply latency varies uniformly by up to this many seconds either way
+            fragment_size (int): Send replies in chunks of this many bytes, whole replies if None
+            fragment_delay (float): Seconds between chunks
+            malformed_rate (float): Probability that a reply is malformed
+            malformed_kinds (tuple<str>): Kinds of malformed reply to choose from, 'misshapen', 'zero' and 'truncated'
+            spectrum (function): Called with (frequency_count, sample_count, rng), returns complex values shaped (frequencies, samples), GenerateSpectrum if None
+
+        Returns:
+            New SensorEmulator object
+        """
+        self.frequency_count = frequency_count
+        self.sample_count = sample_count
+        self.value_size = value_size
+        self.rng = np.random.default_rng(seed)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.fragment_size = fragment_size
+        self.fragment_delay = fragment_delay
+        self.malformed_rate = malformed_rate
+        self.malformed_kinds = malformed_kinds
+        self.spectrum = generate_spectrum if spectrum is None else spectrum
+
+        self.frames_sent = 0
+        self.malformed_sent = 0
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.host, self.port = self.server.getsockname()
+
+        self.thread = None
+        self.running = False
+
+    def Start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.Serve, daemon=True)
+        self.thread.start()
+
+    def Stop(self):
+        self.running = False
+        self.server.close()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def GenerateReading(self):
+        """Generates a synthetic reading
+
+        Returns:
+            np.ndarray: Complex values shaped (frequencies, samples) in the order GetComplexData reports them
+        """
+        return self.spectrum(self.frequency_count, self.sample_count, self.rng)
+
+    def Serve(self):
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+
+            # Fragments go out as configured rather than being coalesced by Nagle's algorithm
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            with conn:
+                if not self.HandleClient(conn):
+                    return
+
+    def HandleClient(self, conn):
+        """Answers commands from one client
+
+        Args:
+            conn (socket): Connected client socket
+
+        Returns:
+            bool: False if the client sent the end command
+        """
+        while self.running:
+            command = conn.recv(1)
+            if not command:
+                return True
+
+            if command == COMMAND_SAMPLE or command == COMMAND_BINARY_SAMPLE:
+                self.Reply(conn, self.MakeFrame(command == COMMAND_BINARY_SAMPLE))
+            elif command == COMMAND_PROBE:
+                conn.sendall(FRAME_MAGIC)
+            elif command == COMMAND_RECONNECT:
+                pass
+            elif command == COMMAND_END:
+                return False
+
+        return True
+
+    def MakeFrame(self, binary):
+        """Encodes a new reading, malformed with probability malformed_rate
+
+        Args:
+            binary (bool): Whether to make a binary frame instead of a text frame
+
+        Returns:
+            bytes: Frame to send
+        """
+        reading = self.GenerateReading()
+
+        kind = None
+        if self.malformed_rate > 0 and self.rng.random() < self.malformed_rate:
+            kind = self.malformed_kinds[self.rng.integers(len(self.malformed_kinds))]
+            self.malformed_sent += 1
+
+        # Zero real components are rejected by the client
+        if kind == 'zero':
+            reading[self.rng.integers(self.frequency_count), self.rng.integers(self.sample_count)] = 1j
+
+        frame = encode_binary_frame(reading, self.value_size) if binary else encode_text_frame(reading)
+
+        if kind == 'misshapen':
+            # Wrong magic or missing opening bracket, with the frame length unchanged
+            frame = b'XXXX' + frame[4:] if binary else b' ' + frame[1:]
+        elif kind == 'truncated':
+            # The rest of the frame never arrives
+            frame = frame[:len(frame) // 2]
+
+        return frame
+
+    def Reply(self, conn, frame):
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.fragment_size is None:
+            conn.sendall(frame)
+        else:
+            for start in range(0, len(frame), self.fragment_size):
+                conn.sendall(frame[start:start + self.fragment_size])
+                if self.fragment_delay > 0:
+                    time.sleep(self.fragment_delay)
+
+        self.frames_sent += 1
+
+# Functions
+
+def generate_spectrum(frequency_count, sample_count, rng):
+    """Default synthetic spectrum, decreasing magnitude and a phase shift with frequency plus a little measurement noise
+
+    Args:
+        frequency_count (int): Number of frequencies
+        sample_count (int): Number of samples per frequency
+        rng (np.random.Generator): Source of noise
+
+    Returns:
+        np.ndarray: Complex values shaped (frequencies, samples)
+    """
+    frequency_index = np.arange(frequency_count)[:, np.newaxis]
+    magnitude = 900 - 20 * frequency_index + rng.normal(0, 2, (frequency_count, sample_count))
+    phase = -0.05 - 0.01 * frequency_index + rng.normal(0, 0.001, (frequency_count, sample_count))
+
+    return magnitude * np.sin(phase) + 1j * magnitude * np.cos(phase)
+
+if __name__ == "__main__":
+    # Listen where main.py expects ElikoTCP.m
+    emulator = SensorEmulator(port=30007, latency=0.05, jitter=0.01)
+    print('Sensor emulator listening on %s:%d' % (emulator.host, emulator.port))
+    emulator.Start()
+    emulator.thread.join()
@@ -0,0 +1,134 @@
+import struct
+import numpy as np
+
+# Command bytes understood by ElikoTCP.m and the sensor emulator
+COMMAND_SAMPLE = b'c'
+COMMAND_BINARY_SAMPLE = b'b'
+COMMAND_PROBE = b'p'
+COMMAND_RECONNECT = b'r'
+COMMAND_END = b'e'
+
+# Text frames are mat2str output padded with '?' to a fixed length
+TEXT_FRAME_LENGTH = 30000
+TEXT_PADDING = b'?'
+
+# Binary frames: magic, frame length including header, sample count, frequency count, bytes per value, padding.
+# The header is followed by frequency count x sample count (real, imaginary) pairs, frequency by frequency,
+# with the components in the order GetComplexData reports them.
+FRAME_MAGIC = b'EBIB'
+FRAME_HEADER = struct.Struct('<4sIIHBx')
+# Largest frame accepted from a header, so a corrupt header can't grow the receive buffer without bound
+MAX_FRAME_LENGTH = 1 << 24
+VALUE_TYPES = {4: np.dtype('<f4'), 8: np.dtype('<f8')}
+
+# Classes
+
+class ComplexReading(dict):
+    def __init__(self, values):
+        """Initialises the dictionary returned by GetComplexData, keeping the array it was built from so reducers can skip converting it back.
+
+        The array isn't updated if the dictionary is changed afterwards.
+
+        Args:
+            values (np.ndarray): Complex values shaped (frequencies, samples)
+
+        Returns:
+            New ComplexReading object
+        """
+        super().__init__({freqbin: list(zip(row.real.tolist(), row.imag.tolist())) for freqbin, row in enumerate(values)})
+
+        self.array = np.empty(values.shape + (2,), dtype=np.float64)
+        self.array[..., 0] = values.real
+        self.array[..., 1] = values.imag
+
+# Functions
+
+def encode_binary_frame(values, value_size = 4):
+    """Packs complex sensor values into a binary frame
+
+    Args:
+        values (np.ndarray): Complex values shaped (frequencies, samples)
+        value_size (int): Bytes per component, 4 for float32 or 8 for float64
+
+    Returns:
+        bytes: Encoded frame
+    """
+    values = np.asarray(values)
+    pairs = np.empty(values.shape + (2,), dtype=VALUE_TYPES[value_size])
+    pairs[..., 0] = values.real
+    pairs[..., 1] = values.imag
+
+    payload = pairs.tobytes()
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_HEADER.size + len(payload), values.shape[1], values.shape[0], value_size)
+    return header + payload
+
+def decode_binary_header(header):
+    """Unpacks a binary frame header
+
+    Args:
+        header (bytes): The first FRAME_HEADER.size bytes of a frame
+
+    Returns:
+        (int, int, int, int): Frame length, sample count, frequency count and bytes per value
+    """
+    (magic, frame_length, sample_count, frequency_count, value_size) = FRAME_HEADER.unpack(header[:FRAME_HEADER.size])
+    if magic != FRAME_MAGIC:
+        raise ValueError('Binary frame has wrong magic, retrying')
+    if value_size not in VALUE_TYPES:
+        raise ValueError('Unknown value size %d in binary frame' % (value_size))
+    if frame_length > MAX_FRAME_LENGTH:
+        raise ValueError('Binary frame length %d is over the %d byte limit' % (frame_length, MAX_FRAME_LENGTH))
+    if frame_length != FRAME_HEADER.size + frequency_count * sample_count * 2 * value_size:
+        raise ValueError('Binary frame length doesn\'t match its shape')
+
+    return frame_length, sample_count, frequency_count, value_size
+
+def decode_binary_frame(frame):
+    """Decodes a complete binary frame
+
+    Args:
+        frame (bytes): Header and payload of one frame
+
+    Returns:
+        np.ndarray: complex128 values shaped (frequencies, samples)
+    """
+    (frame_length, sample_count, frequency_count, value_size) = decode_binary_header(frame)
+    if len(frame) < frame_length:
+        raise ValueError('Binary frame incomplete, retrying')
+
+    pairs = np.frombuffer(frame, dtype=VALUE_TYPES[value_size], count=frequency_count * sample_count * 2, offset=FRAME_HEADER.size)
+    pairs = pairs.reshape(frequency_count, sample_count, 2)
+
+    values = np.empty((frequency_count, sample_count), dtype=np.complex128)
+    values.real = pairs[..., 0]
+    values.imag = pairs[..., 1]
+    return values
+
+def encode_text_frame(values):
+    """Formats complex sensor values like ElikoTCP.m, mat2str of the rounded sample matrix padded with '?'
+
+    Args:
+        values (np.ndarray): Complex values shaped (frequencies, samples) in the order GetComplexData reports them
+
+    Returns:
+        bytes: Encoded frame
+    """
+    # The sensor's real and imaginary parts arrive swapped in GetComplexData, so swap them back
+    rows = []
+    for sample in np.asarray(values).T:
+        tokens = ['%s%s%si' % (format(round(v.imag, 4), '.15g'), '+' if v.real >= 0 else '-', format(abs(round(v.real, 4)), '.15g')) for v in sample]
+        rows.append(' '.join(tokens))
+
+    text = ('[' + ';'.join(rows) + ']').encode()
+    return text.ljust(TEXT_FRAME_LENGTH, TEXT_PADDING)
+
+def complex_array_to_dict(values):
+    """Converts complex values shaped (frequencies, samples) to the dictionary returned by GetComplexData
+
+    Args:
+        values (np.ndarray): Complex values shaped (frequencies, samples)
+
+    Returns:
+        ComplexReading: List of (real, imaginary) samples for each frequency index
+    """
+    return ComplexReading(np.asarray(values))
@@ -1,8 +1,142 @@
-import math, os
+import math, os, itertools
+import numpy as np
+from comsol_cache import ComsolCache
 from calculation_functions import add_noise_point, lymph_equation, normalise_freq
-from util import reshape_data_set_tuples, parse_string_to_complex
+from util import DataWindows, windows_from_rows, parse_complex_array, process_files
 from calculation_functions import calc_conductivity, calc_k
 
+# Shared cache of parsed COMSOL columns, set to None to always parse the text exports
+comsol_cache = ComsolCache()
+
+class GroupedTable:
+    def __init__(self, table):
+        """Groups parsed columns by probe position and lymph node position using a lexsort instead of string keyed dictionaries.
+
+        Groups are kept in order of first appearance and rows within a group in file order, matching group_data_grid.
+
+        Args:
+            table (dict<str, np.ndarray>): Parsed columns as returned by parse_loaded_columns
+
+        Returns:
+            New GroupedTable object
+        """
+        row_count = len(table['distance'])
+        self.has_lymph = 'lymph_x' in table and 'lymph_y' in table
+        self.lymph_suffix = ''
+        if self.has_lymph and 'lymph_size' in table:
+            self.lymph_suffix = ' s' if table['lymph_size'] == 'small' else ' l'
+
+        keys = make_group_keys(table)
+
+        # Stable sort on the key fields, x_dist being the primary key
+        order = np.lexsort((keys['size'], keys['lymph_y'], keys['lymph_x'], keys['y_dist'], keys['x_dist']))
+        sorted_keys = keys[order]
+
+        change = np.ones(row_count, dtype=bool)
+        change[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        starts = np.flatnonzero(change)
+
+        # Rank groups by their first row to restore order of first appearance
+        group_id = np.empty(row_count, dtype=np.int64)
+        group_id[order] = np.cumsum(change) - 1
+        rank = np.empty(len(starts), dtype=np.int64)
+        rank[np.argsort(order[starts])] = np.arange(len(starts))
+        row_rank = rank[group_id]
+
+        self.order = np.argsort(row_rank, kind='stable')
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(row_rank, minlength=len(starts)))))
+
+        # One contiguous copy per column, groups are slices of these
+        self.table = {key: values[self.order] if isinstance(values, np.ndarray) else values for key, values in table.items()}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def Group(self, index):
+        """Gets the columns of one group as views
+
+        Args:
+            index (int): Group index
+
+        Returns:
+            dict<str, np.ndarray>: Columns of the group
+        """
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return {key: values[start:end] if isinstance(values, np.ndarray) else values for key, values in self.table.items()}
+
+    def Key(self, index):
+        """Gets the key group_data_grid would use for a group
+
+        Args:
+            index (int): Group index
+
+        Returns:
+            str: Group key
+        """
+        start = self.offsets[index]
+        key = '%s %s' % (self.table['x_dist'][start].item(), self.table['y_dist'][start].item())
+        if self.has_lymph:
+            key = '%s %d %d%s' % (key, self.table['lymph_x'][start], self.table['lymph_y'][start], self.lymph_suffix)
+        return key
+
+    def Depth(self):
+        depths = np.unique(self.table['depth'])
+        if len(depths) > 1:
+            raise Exception('Same data set can\'t have more than one depth')
+        return depths[0].item()
+
+    def ToDict(self):
+        """Builds the dictionary of row lists returned by group_data_grid
+
+        Returns:
+            dict<str, list<dict>>: Rows binned by group key
+        """
+        rows = table_to_rows(self.table)
+        return {self.Key(index): rows[self.offsets[index]:self.offsets[index + 1]] for index in range(len(self))}
+
+    def Windows(self, n, real_potential = None, imaginary_potential = None):
+        """Builds windows of n consecutive samples within each group
+
+        Args:
+            n (int): Number of consecutive samples in each window
+            real_potential (np.ndarray): Replacement real potentials in original row order, e.g. a noisy copy (optional)
+            imaginary_potential (np.ndarray): Replacement imaginary potentials in original row order (optional)
+
+        Returns:
+            DataWindows: Windows over the grouped rows
+        """
+        real = self.table['real_potential'] if real_potential is None else real_potential[self.order]
+        imag = self.table['imaginary_potential'] if imaginary_potential is None else imaginary_potential[self.order]
+        values = np.column_stack((self.table['distance'], real, imag))
+
+        position = None
+        lymph = None
+        if 'x_dist' in self.table:
+            position = np.column_stack((self.table['x_dist'], self.table['y_dist'])).astype(np.float64)
+            if self.has_lymph:
+                lymph = np.column_stack((self.table['lymph_x'], self.table['lymph_y'])).astype(np.float64)
+
+        return DataWindows(values, self.offsets, n, self.table['frequency'], position, lymph)
+
+def make_group_keys(table):
+    """Builds the structured array of grouping fields for each row
+
+    Args:
+        table (dict<str, np.ndarray>): Parsed columns as returned by parse_loaded_columns
+
+    Returns:
+        np.ndarray: Structured array with x_dist, y_dist, lymph_x, lymph_y and size fields
+    """
+    keys = np.zeros(len(table['distance']), dtype=[('x_dist', 'f8'), ('y_dist', 'f8'), ('lymph_x', 'f8'), ('lymph_y', 'f8'), ('size', 'i1')])
+    for field in ['x_dist', 'y_dist', 'lymph_x', 'lymph_y']:
+        if field in table:
+            keys[field] = table[field]
+
+    has_lymph = 'lymph_x' in table and 'lymph_y' in table
+    keys['size'] = 1 if has_lymph and table.get('lymph_size') == 'small' else 0
+
+    return keys
+
 def parse_loaded_data(vals, filepath = None, noise = None, distance_filter = None, invert_imag = True):
     """Formats the loaded data into a generic dictionary structure and splits up the complex potential
 
@@ -16,8 +150,10 @@ def parse_loaded_data(vals, filepath = None, noise = None, distance_filter = Non
         list<dict>: A collection of parsed loaded data
     """
 
+    potentials = parse_complex_array([val['potential'] for val in vals])
+
     data = []
-    for val in vals:
+    for index, val in enumerate(vals):
         this_val = {}
 
         # Handle distance d
@@ -29,7 +165,8 @@ def parse_loaded_data(vals, filepath = None, noise = None, distance_filter = Non
         # Load frequency
         this_val['frequency'] = int(val['frequency'])
 
-        (real, imag) = parse_string_to_complex(val['potential'])
+        real = float(potentials[index].real)
+        imag = float(potentials[index].imag)
         if invert_imag:
             imag = -imag
         this_val['imaginary_potential'] = imag
@@ -102,6 +239,141 @@ def load_comsol_with_header(file_path, header, skip_line_count = 5):
 
     return data
 
+def get_lymph_size(file_path):
+    file_name = os.path.split(file_path)
+    return 'small' if file_name[-1][0] == 'D' else 'large'
+
+def parse_comsol_columns(file_path, header, skip_line_count = 5):
+    """Parses a COMSOL export into one array per header column
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        skip_line_count (int): Number of header lines to skip
+
+    Returns:
+        dict<str, np.ndarray>: Complex array for the potential column, float arrays for the rest
+    """
+    vals = load_comsol_with_header(file_path, header, skip_line_count)
+
+    columns = {}
+    for column in header:
+        if column == 'potential':
+            columns[column] = parse_complex_array([val[column] for val in vals])
+        else:
+            columns[column] = np.array([float(val[column]) for val in vals], dtype=np.float64)
+
+    return columns
+
+def load_comsol_columns(file_path, header, skip_line_count = 5, cache = True):
+    """Loads the parsed columns of a COMSOL export, reusing cached arrays when the file is unchanged
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        skip_line_count (int): Number of header lines to skip
+        cache (bool): Whether to use the shared column cache
+
+    Returns:
+        dict<str, np.ndarray>: Parsed columns, memory-mapped if loaded from cache
+    """
+    if not os.path.exists(file_path):
+        return
+
+    use_cache = cache and comsol_cache is not None
+    if use_cache:
+        columns = comsol_cache.Load(file_path, header, skip_line_count)
+        if columns is not None:
+            return columns
+
+    columns = parse_comsol_columns(file_path, header, skip_line_count)
+
+    if use_cache:
+        comsol_cache.Store(file_path, header, skip_line_count, columns)
+
+    return columns
+
+def parse_loaded_columns(columns, lymph_size = None, filepath = None, noise = None, distance_filter = None, invert_imag = True):
+    """Array equivalent of parse_loaded_data working on whole columns at once
+
+    Args:
+        columns (dict<str, np.ndarray>): Parsed columns as returned by load_comsol_columns
+        lymph_size (str): Size of lymph node in the data, 'small' or 'large' (optional)
+        filepath (str): File name including extension of processed file (optional)
+        noise (bool): Whether to add noise to the loaded data
+        distance_filter (list<int>): List of distances to skip
+        invert_imag (bool): Whether to invert the sign of the imaginary potential
+
+    Returns:
+        dict<str, np.ndarray>: Parsed columns keyed like the dictionaries of parse_loaded_data
+    """
+    distance = columns['distance'].astype(np.int64)
+
+    keep = slice(None)
+    if distance_filter:
+        keep = ~np.isin(distance, distance_filter)
+        distance = distance[keep]
+
+    table = {'distance': distance}
+    table['frequency'] = columns['frequency'][keep].astype(np.int64)
+
+    potential = columns['potential'][keep]
+    table['real_potential'] = potential.real.copy()
+    table['imaginary_potential'] = -potential.imag if invert_imag else potential.imag.copy()
+
+    for key in ['x_dist', 'y_dist', 'lymph_x', 'lymph_y', 'depth']:
+        if key in columns:
+            table[key] = columns[key][keep].astype(np.int64)
+
+    if lymph_size:
+        table['lymph_size'] = lymph_size
+
+    if 'angle' in columns:
+        angle = columns['angle'][keep]
+        angle_rad = angle * math.pi/180
+        table['x_dist'] = distance * np.cos(angle_rad)
+        table['y_dist'] = distance * np.sin(angle_rad)
+        table['angle'] = np.round(angle).astype(np.int64)
+
+    if filepath:
+        file_name = os.path.splitext(os.path.basename(filepath))[0]
+        coordinates = [float(c) for c in file_name.split('_')]
+        table['position'] = 'X: %d Y: %d Z: %d' % (coordinates[0], coordinates[1], coordinates[2])
+
+    if noise:
+        table['imaginary_potential'] = table['imaginary_potential'] * np.random.normal(1, 0.001, len(distance))
+        table['real_potential'] = table['real_potential'] * np.random.normal(1, 0.001, len(distance))
+
+    return table
+
+def table_to_rows(table):
+    """Expands parsed columns into the list of dictionaries returned by parse_loaded_data
+
+    Args:
+        table (dict<str, np.ndarray>): Parsed columns as returned by parse_loaded_columns
+
+    Returns:
+        list<dict>: A collection of parsed loaded data
+    """
+    keys = [key for key, values in table.items() if isinstance(values, np.ndarray)]
+    constants = {key: values for key, values in table.items() if not isinstance(values, np.ndarray)}
+
+    lymph_keys = None
+    if 'lymph_x' in table and 'lymph_y' in table:
+        suffix = ''
+        if 'lymph_size' in table:
+            suffix = ' s' if table['lymph_size'] == 'small' else ' l'
+        lymph_keys = ['%d %d%s' % (l_x, l_y, suffix) for l_x, l_y in zip(table['lymph_x'].tolist(), table['lymph_y'].tolist())]
+
+    data = []
+    for index, values in enumerate(zip(*[table[key].tolist() for key in keys])):
+        this_val = dict(zip(keys, values))
+        this_val.update(constants)
+        if lymph_keys is not None:
+            this_val['lymph_key'] = lymph_keys[index]
+        data.append(this_val)
+
+    return data
 
 def get_data(file_path, header, noise, distance_filter = None):
     """Gets a set of data from a file path given a header format
@@ -115,13 +387,31 @@ def get_data(file_path, header, noise, distance_filter = None):
     Returns:
         list<dict<keys, values>>: A collection of parsed loaded data
     """
-    vals = load_comsol_with_header(file_path, header, skip_line_count=5)
+    columns = load_comsol_columns(file_path, header, skip_line_count=5)
     invert_imag = False if 'real' in file_path else True
-    
-    data = parse_loaded_data(vals, noise = noise, distance_filter = distance_filter, invert_imag=invert_imag)
+
+    table = parse_loaded_columns(columns, get_lymph_size(file_path), noise = noise, distance_filter = distance_filter, invert_imag=invert_imag)
+    data = table_to_rows(table)
 
     return data
 
+def load_table(file_path, header, noise = None, distance_filter = None):
+    """Gets a set of data from a file path as parsed columns instead of dictionaries
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        noise (bool) opt: Whether to add noise to the loaded data
+        distance_filter (list<int>): List of distances to skip
+
+    Returns:
+        dict<str, np.ndarray>: Parsed columns as returned by parse_loaded_columns
+    """
+    columns = load_comsol_columns(file_path, header, skip_line_count=5)
+    invert_imag = False if 'real' in file_path else True
+
+    return parse_loaded_columns(columns, get_lymph_size(file_path), noise = noise, distance_filter = distance_filter, invert_imag=invert_imag)
+
 def get_data_grid(file_path, header, noise = None, distance_filter = None):
     """Gets a set of grid based data from a file path given a header format
 
@@ -134,9 +424,19 @@ def get_data_grid(file_path, header, noise = None, distance_filter = None):
     Returns:
         list<dict<position, dict<keys, values>>>: A collection of parsed loaded data
     """
+    grouped = GroupedTable(load_table(file_path, header, noise, distance_filter))
 
-    data = get_data(file_path, header, noise, distance_filter)
-    
+    return grouped.ToDict(), grouped.Depth()
+
+def group_data_grid(data):
+    """Sorts parsed data into bins based on probe position and lymph node position
+
+    Args:
+        data (list<dict>): A collection of parsed loaded data
+
+    Returns:
+        list<dict<position, dict<keys, values>>>: A collection of parsed loaded data
+    """
     data_dict = {}
 
     # Depths for lymph equation
@@ -184,47 +484,250 @@ def calc_conductivities(data):
 
 
 def load_data(file_path, header, data_type, samples_to_group, noise = False):
-    X_grid, depth_ground = get_data_grid(file_path, header, noise)
+    grouped = GroupedTable(load_table(file_path, header, noise))
 
-    data = reshape_data_set_tuples(X_grid, samples_to_group)
+    return build_data_points(grouped, grouped.Depth(), data_type, samples_to_group)
 
-    for index, vals in enumerate(data):
-        conductivities = calc_conductivities(vals[1])
-        
-        data[index].append(conductivities)
+def build_data_points(X_grid, depth_ground, data_type, samples_to_group, real_potential = None, imaginary_potential = None):
+    if isinstance(X_grid, GroupedTable):
+        windows = X_grid.Windows(samples_to_group, real_potential, imaginary_potential)
+        first_key = X_grid.Key(0)
+    else:
+        windows = windows_from_rows(X_grid, samples_to_group)
+        first_key = list(X_grid.keys())[0]
 
-        data[index].append(sum(vals[4])/len(vals[4]))
+    conductivities = windows.Conductivities()
+    means = conductivities.sum(axis=1) / conductivities.shape[1]
 
     if data_type == 'training':
         l_type = 0
-        if 's' in list(X_grid.keys())[0]:
+        if 's' in first_key:
             l_type = 1
 
+        # Only the first two samples of each window are used for the ground truth
+        data = windows.ToDataPoints(conductivities, means, rows=2)
+
         ret = [[val[3], lymph_equation(val[1][0], val[1][1], depth_ground, val[2][0]-8, val[2][1], l_type)] for val in data]
         return ret
 
     elif data_type == 'test':
-        return data
+        return windows.ToDataPoints(conductivities, means)
 
     raise Exception('Could not parse meaning of data')
-    
 
-def load_training_data(headers, paths, samples_to_group, augment=True, normalise_frequency=True):
-    training_data = []
+def add_noise_copies(table, copies, rng, mean = 1, std_dev = 0.001):
+    """Generates noisy copies of the parsed potentials with a single random draw
+
+    Args:
+        table (dict<str, np.ndarray>): Parsed columns as returned by parse_loaded_columns
+        copies (int): Number of noisy copies to generate
+        rng (np.random.Generator): Random generator to draw noise from
+        mean (float): Mean of multiplicative noise
+        std_dev (float): Standard deviation of multiplicative noise
+
+    Returns:
+        (np.ndarray, np.ndarray): Real and imaginary potentials, each shaped (copies, rows)
+    """
+    factors = rng.normal(mean, std_dev, size=(2, copies, len(table['distance'])))
+    return table['real_potential'] * factors[0], table['imaginary_potential'] * factors[1]
+
+def iter_augmented_data(file_path, header, samples_to_group, copies = 15, batch_size = None, rng = None, include_original = False):
+    """Parses a file once and yields batches of noise augmented training data
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        samples_to_group (int): Number of consecutive distances per data point
+        copies (int): Number of noisy copies to generate
+        batch_size (int): Number of noisy copies per yielded batch, all copies at once if None
+        rng (np.random.Generator): Random generator to draw noise from, seed with np.random.default_rng(seed) for reproducible sets
+        include_original (bool): Whether to yield the data without noise as the first batch
+
+    Yields:
+        list<list>: Training data in the format returned by load_data
+    """
+    table = load_table(file_path, header)
+    rng = np.random.default_rng() if rng is None else rng
+    batch_size = max(copies, 1) if batch_size is None else batch_size
+
+    # Noise doesn't change the grouping, so the rows are only grouped once
+    grouped = GroupedTable(table)
+    depth_ground = grouped.Depth()
+
+    if include_original:
+        yield build_data_points(grouped, depth_ground, 'training', samples_to_group)
+
+    for start in range(0, copies, batch_size):
+        real, imag = add_noise_copies(table, min(batch_size, copies - start), rng)
+
+        batch = []
+        for real_copy, imag_copy in zip(real, imag):
+            batch.extend(build_data_points(grouped, depth_ground, 'training', samples_to_group, real_copy, imag_copy))
+
+        yield batch
+
+def augment_training_data(file_path, header, samples_to_group, copies = 15, rng = None):
+    data = []
+    for batch in iter_augmented_data(file_path, header, samples_to_group, copies, rng = rng):
+        data.extend(batch)
+    return data
+
+def iter_comsol_chunks(file_path, header, skip_line_count = 5, chunk_size = 100000):
+    """Reads a COMSOL export in fixed size chunks of rows without loading the whole file
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        skip_line_count (int): Number of header lines to skip
+        chunk_size (int): Number of rows per chunk
+
+    Yields:
+        dict<str, np.ndarray>: Parsed columns of a chunk, like load_comsol_columns
+    """
+    with open(file_path, newline='\r\n') as f:
+        for _ in itertools.islice(f, skip_line_count):
+            pass
+
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+
+            split_lines = [split_comsol_line(line) for line in lines if line.strip()]
+
+            columns = {}
+            for column, index in header.items():
+                values = [split_line[index] for split_line in split_lines]
+                if column == 'potential':
+                    columns[column] = parse_complex_array(values)
+                else:
+                    columns[column] = np.array(values, dtype=np.float64)
+
+            yield columns
+
+def iter_table_groups(tables):
+    """Regroups a stream of parsed chunks into batches of complete groups.
+
+    Groups are taken to be contiguous runs of rows, as written by COMSOL parameter sweeps,
+    so only the last, possibly incomplete, group of each chunk is carried over.
+
+    Args:
+        tables (iterator<dict<str, np.ndarray>>): Parsed chunks as returned by parse_loaded_columns
+
+    Yields:
+        dict<str, np.ndarray>: Parsed columns containing only complete groups
+    """
+    carry = None
+    for table in tables:
+        if carry is not None:
+            table = {key: np.concatenate((carry[key], values)) if isinstance(values, np.ndarray) else values for key, values in table.items()}
+
+        keys = make_group_keys(table)
+        if len(keys) == 0:
+            continue
+
+        # Start of the last run in the chunk
+        changes = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        last_start = changes[-1] if len(changes) > 0 else 0
+
+        carry = {key: values[last_start:] if isinstance(values, np.ndarray) else values for key, values in table.items()}
+        if last_start > 0:
+            yield {key: values[:last_start] if isinstance(values, np.ndarray) else values for key, values in table.items()}
+
+    if carry is not None:
+        yield carry
+
+def iter_data_points(file_path, header, data_type, samples_to_group, noise = False, distance_filter = None, chunk_size = 100000):
+    """Streaming equivalent of load_data, peak memory is bounded by the chunk size rather than the file size
+
+    Args:
+        file_path (str): Path to data file
+        header (dict): A dictionary over keys and their column numbers in the data file
+        data_type (str): 'training' or 'test', see load_data
+        samples_to_group (int): Number of consecutive distances per data point
+        noise (bool): Whether to add noise to the loaded data
+        distance_filter (list<int>): List of distances to skip
+        chunk_size (int): Number of rows read from the file at a time
+
+    Yields:
+        list<list>: Data points of the groups completed by each chunk, in the format returned by load_data
+    """
+    lymph_size = get_lymph_size(file_path)
+    invert_imag = False if 'real' in file_path else True
+
+    chunks = iter_comsol_chunks(file_path, header, 5, chunk_size)
+    tables = (parse_loaded_columns(columns, lymph_size, noise = noise, distance_filter = distance_filter, invert_imag = invert_imag) for columns in chunks)
+
+    depth_ground = None
+    for table in iter_table_groups(tables):
+        grouped = GroupedTable(table)
+
+        depth = grouped.Depth()
+        if depth_ground is not None and depth != depth_ground:
+            raise Exception('Same data set can\'t have more than one depth')
+        depth_ground = depth
+
+        yield build_data_points(grouped, depth_ground, data_type, samples_to_group)
+
+def iter_training_data(headers, paths, samples_to_group, augment = True, copies = 15, batch_size = 1, seed = None, normalise_frequency = True):
+    """Lazily loads training data, yielding augmented batches on demand instead of holding the full set in memory
+
+    Args:
+        headers (list<dict>): Header format for each folder
+        paths (list<str>): Folders of data files
+        samples_to_group (int): Number of consecutive distances per data point
+        augment (bool): Whether to add noisy copies of each file
+        copies (int): Number of noisy copies per file
+        batch_size (int): Number of noisy copies per yielded batch
+        seed (int): Seed for the augmentation noise
+
+    Yields:
+        (list, list): x and y values of a batch
+    """
+    rng = np.random.default_rng(seed)
+
+    for header, folder_path in zip(headers, paths):
+
+        if not os.path.exists(folder_path):
+            raise FileNotFoundError('Folder does not exist')
+
+        for filename in sorted(os.listdir(folder_path)):
+            file_copies = copies if augment else 0
+            for batch in iter_augmented_data(os.path.join(folder_path, filename), header, samples_to_group, file_copies, batch_size, rng, include_original=True):
+                x_batch = [val[0] for val in batch]
+                if normalise_frequency:
+                    x_batch = normalise_freq(x_batch)
+
+                yield x_batch, [val[1] for val in batch]
+
+def load_training_file(file_path, header, samples_to_group, copies, seed):
+    rng = np.random.default_rng(seed)
+
+    data = []
+    for batch in iter_augmented_data(file_path, header, samples_to_group, copies, rng = rng, include_original=True):
+        data.extend(batch)
+    return data
+
+def load_training_data(headers, paths, samples_to_group, augment=True, normalise_frequency=True, seed=None, workers=None):
+    file_args = []
     for header, folder_path in zip(headers, paths):
 
         if not os.path.exists(folder_path):
             raise FileNotFoundError('Folder does not exist')
 
-        dirlist = os.listdir(folder_path)
+        dirlist = sorted(os.listdir(folder_path))
 
         for filename in dirlist:
-            print('Loading %s' % filename)
-            training_data.extend(load_data(os.path.join(folder_path, filename), header, 'training', samples_to_group))
-            if augment:
-                print('Augmenting...\n')
-                for _ in range(15):
-                    training_data.extend(load_data(os.path.join(folder_path, filename), header, 'training', samples_to_group, noise = True))
+            file_copies = 15 if augment else 0
+            file_args.append((os.path.join(folder_path, filename), header, samples_to_group, file_copies))
+
+    # One noise seed per file keeps the augmented set independent of the number of workers
+    file_seeds = np.random.SeedSequence(seed).spawn(len(file_args))
+    file_args = [args + (file_seed,) for args, file_seed in zip(file_args, file_seeds)]
+
+    training_data = []
+    for data in process_files(load_training_file, file_args, workers):
+        training_data.extend(data)
 
     x_train = [val[0] for val in training_data]
     if normalise_frequency:
@@ -232,4 +735,4 @@ def load_training_data(headers, paths, samples_to_group, augment=True, normalise
 
     y_train = [val[1] for val in training_data]
 
-    return x_train, y_train
\ No newline at end of file
+    return x_train, y_train
@@ -0,0 +1,82 @@
+import os, json
+import pytest
+import dataset_builder
+from dataset_builder import IncrementalDatasetBuilder
+
+# Functions
+
+def fake_training_rows(file_path, feature_count = 75):
+    # One row per file, all features set to the number in the file
+    with open(file_path, 'r') as f:
+        value = float(f.read())
+    return [(True, [value] * feature_count)]
+
+def make_builder(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_builder, 'load_training_rows', fake_training_rows)
+    return IncrementalDatasetBuilder(str(tmp_path / 'files'), str(tmp_path / 'dataset.bin'), str(tmp_path / 'dataset.manifest.json'))
+
+def write_files(tmp_path, values):
+    os.makedirs(tmp_path / 'files', exist_ok=True)
+    for name, value in values.items():
+        with open(tmp_path / 'files' / name, 'w') as f:
+            f.write(str(value))
+
+def stored_values(builder):
+    with open(builder.manifest_path, 'r') as f:
+        manifest = json.load(f)
+    features = builder.store.Load()[1]
+    return {name: features[entry['start'], 0] for name, entry in manifest['files'].items() if entry['count'] > 0}
+
+def test_failed_build_keeps_store_and_manifest(tmp_path, monkeypatch):
+    write_files(tmp_path, {'a': 1, 'b': 2, 'c': 3})
+    builder = make_builder(tmp_path, monkeypatch)
+    builder.Build()
+
+    # Removing a file compacts the store, then loading the new file fails
+    os.remove(tmp_path / 'files' / 'a')
+    write_files(tmp_path, {'d': 4})
+    def failing_rows(file_path, feature_count = 75):
+        raise RuntimeError('load failed')
+    monkeypatch.setattr(dataset_builder, 'load_training_rows', failing_rows)
+    with pytest.raises(RuntimeError):
+        builder.Build()
+
+    builder = make_builder(tmp_path, monkeypatch)
+    assert stored_values(builder) == {'a': 1, 'b': 2, 'c': 3}
+
+    builder.Build()
+    assert stored_values(builder) == {'b': 2, 'c': 3, 'd': 4}
+    assert len(builder.store) == 3
+
+def test_interrupted_replace_is_finished(tmp_path, monkeypatch):
+    write_files(tmp_path, {'a': 1, 'b': 2})
+    builder = make_builder(tmp_path, monkeypatch)
+    builder.Build()
+
+    # Stop right after the store was replaced, before the manifest
+    os.remove(tmp_path / 'files' / 'a')
+    replace = os.replace
+    def interrupted_replace(source, destination):
+        replace(source, destination)
+        if destination == builder.store_path:
+            raise KeyboardInterrupt()
+    monkeypatch.setattr(dataset_builder.os, 'replace', interrupted_replace)
+    with pytest.raises(KeyboardInterrupt):
+        builder.Build()
+    monkeypatch.setattr(dataset_builder.os, 'replace', replace)
+
+    builder = make_builder(tmp_path, monkeypatch)
+    assert stored_values(builder) == {'b': 2}
+    assert len(builder.store) == 1
+
+def test_training_loads_built_dataset(tmp_path, monkeypatch):
+    model_testing = pytest.importorskip('model_testing')
+    write_files(tmp_path, {'a': 1, 'b': 2})
+    monkeypatch.setattr(dataset_builder, 'load_training_rows', fake_training_rows)
+    monkeypatch.chdir(tmp_path)
+
+    assert sorted([data[0] for _, data in model_testing.load_built_training_data(str(tmp_path / 'files'))]) == [1, 2]
+
+    # A rebuild picks up new files before training
+    write_files(tmp_path, {'c': 3})
+    assert sorted([data[0] for _, data in model_testing.load_built_training_data(str(tmp_path / 'files'))]) == [1, 2, 3]
@@ -0,0 +1,83 @@
+import time
+import numpy as np
+from util import Logger, read_binary_log
+
+# Classes
+
+class Unprintable:
+    def __str__(self):
+        raise ValueError('can\'t format')
+
+class FailingFile:
+    def __init__(self, file, failures):
+        """Wraps a file so the first writes fail
+
+        Args:
+            file (file): File to wrap
+            failures (int): Number of writes that raise
+        """
+        self.file = file
+        self.failures = failures
+
+    def write(self, data):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError('disk full')
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+# Functions
+
+def wait_for(condition, timeout = 5.0):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        time.sleep(0.01)
+    return condition()
+
+def test_binary_log_round_trip_with_long_text(tmp_path):
+    path = str(tmp_path / 'robot.log')
+    long_text = 'x' * 100000
+
+    logger = Logger(path, 'binary')
+    logger.LogData([1.5, long_text, 'Info'], tag='Move')
+    logger.LogData(list(range(70000)), tag='Path')
+    logger.Close()
+
+    entries = read_binary_log(path)
+    assert [(tag, values[:3]) for _, tag, values in entries] == [('Move', [1.5, long_text, 'Info']), ('Path', [0.0, 1.0, 2.0])]
+    assert len(entries[1][2]) == 70000
+    assert logger.failed_count == 0
+
+def test_binary_log_keeps_complex_values(tmp_path):
+    path = str(tmp_path / 'robot.log')
+
+    logger = Logger(path, 'binary')
+    logger.LogData([np.complex128(1 + 2j), 3 - 4j, np.float32(0.5), np.int64(7)], tag='Sample')
+    logger.Close()
+
+    assert read_binary_log(path)[0][2] == [str(np.complex128(1 + 2j)), str(3 - 4j), 0.5, 7.0]
+
+def test_flush_thread_survives_errors(tmp_path):
+    path = str(tmp_path / 'robot.log')
+    logger = Logger(path, flush_interval=0.01)
+
+    # An entry that can't be formatted is skipped
+    logger.LogData([Unprintable()])
+    logger.LogData(['Info', 'after bad entry'])
+    assert wait_for(lambda: logger.written_count == 1)
+    assert logger.failed_count == 1
+
+    # A failing write doesn't stop later flushes
+    logger.file = FailingFile(logger.file, 1)
+    logger.LogData(['Info', 'lost'])
+    assert wait_for(lambda: logger.flush_error_count == 1)
+    logger.LogData(['Info', 'after failed write'])
+    assert wait_for(lambda: logger.written_count == 2)
+    assert logger.thread.is_alive()
+    logger.Close()
+
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    assert [line.strip().split(' | ')[2] for line in lines] == ['Info; after bad entry', 'Info; after failed write']
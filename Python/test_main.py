@@ -0,0 +1,37 @@
+import math
+import pytest
+from robot_controller import Robot
+
+# main needs the model and active search dependencies
+main = pytest.importorskip('main')
+
+# Classes
+
+class NullLogger:
+    def LogData(self, data, tag = None):
+        pass
+
+# Functions
+
+def make_robots():
+    robot1 = Robot('vme', main.ur1_Rot, main.theta1 - (math.pi/2), main.ur1_Org, main.r1_calibration, NullLogger())
+    robot2 = Robot('cse', main.ur2_Rot, main.theta2 - (math.pi/2), main.ur2_Org, main.r2_calibration, NullLogger())
+    return robot1, robot2
+
+@pytest.mark.parametrize('lift_between', [True, False])
+def test_initial_height(lift_between):
+    depth_info = main.DepthInfo(surface_height=0.046, sampling_depth=0.002, lift_height=0.01, lift_between=lift_between)
+    expected = 0.046 - 0.002 + (0.01 if lift_between else 0)
+    assert depth_info.InitialHeight() == pytest.approx(expected)
+
+@pytest.mark.parametrize('lift_between', [True, False])
+def test_check_run_positions(lift_between):
+    robot1, robot2 = make_robots()
+    sampling_info = main.SamplingInfo(initial_d=0.004, step_size=0.001, sample_count=10, fixed_distances=[6, 7, 9, 11, 15, 21])
+    depth_info = main.DepthInfo(surface_height=0.046, sampling_depth=0.002, lift_height=0.01, lift_between=lift_between)
+
+    grid_positions = main.generate_grid_positions((-0.02, -0.02, 0.02, 0.02), 100, 100)
+    main.check_run_positions(robot1, robot2, grid_positions, sampling_info, depth_info, safe_move_vme=True)
+
+    with pytest.raises(RuntimeError):
+        main.check_run_positions(robot1, robot2, main.generate_grid_positions((-2, -2, 2, 2), 5, 5), sampling_info, depth_info)
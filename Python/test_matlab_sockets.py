@@ -0,0 +1,129 @@
+import socket, threading, time
+import numpy as np
+from robot_sockets import MatlabSockets
+from sensor_emulator import SensorEmulator
+from util import parse_string_to_complex
+from sensor_protocol import COMMAND_SAMPLE, COMMAND_BINARY_SAMPLE, COMMAND_PROBE, COMMAND_END, FRAME_MAGIC, FRAME_HEADER, MAX_FRAME_LENGTH, encode_text_frame, encode_binary_frame
+
+# Functions
+
+def start_text_server(frame, probe_delay):
+    """Starts a text only server that answers the binary probe late
+
+    Args:
+        frame (bytes): Text frame sent for every sample command
+        probe_delay (float): Seconds before the probe is answered
+
+    Returns:
+        (int, socket): Port and listening socket
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            while True:
+                command = conn.recv(1)
+                if not command or command == COMMAND_END:
+                    return
+                if command == COMMAND_PROBE:
+                    time.sleep(probe_delay)
+                    conn.sendall(FRAME_MAGIC)
+                elif command == COMMAND_SAMPLE:
+                    conn.sendall(frame)
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1], server
+
+def start_binary_server(frames):
+    """Starts a binary server that sends the given frames in turn, one per binary sample command
+
+    Args:
+        frames (list<bytes>): Frames to send
+
+    Returns:
+        (int, socket): Port and listening socket
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            pending = list(frames)
+            while True:
+                command = conn.recv(1)
+                if not command or command == COMMAND_END:
+                    return
+                if command == COMMAND_PROBE:
+                    conn.sendall(FRAME_MAGIC)
+                elif command == COMMAND_BINARY_SAMPLE:
+                    conn.sendall(pending.pop(0))
+
+    threading.Thread(target=serve, daemon=True).start()
+    return server.getsockname()[1], server
+
+def test_late_probe_reply_is_drained():
+    values = SensorEmulator(seed=0).GenerateReading()
+    port, server = start_text_server(encode_text_frame(values), probe_delay=0.1)
+
+    conn = MatlabSockets('127.0.0.1', port)
+    conn.Connect()
+    assert not conn.NegotiateBinary(timeout=0.05)
+
+    data = conn.GetComplexData(max_retries=0)
+    assert conn.stats['retries'] == 0
+    np.testing.assert_allclose([v for frequency in data.values() for v in frequency], [(v.real, v.imag) for v in np.round(values.T, 4).T.ravel()])
+
+    conn.Disconnect()
+    server.close()
+
+def parse_baseline(response):
+    """Parses a text frame value by value like the original GetComplexData"""
+    data = {}
+    for index, value in enumerate(response.replace('[', '').replace(']', '').replace(';', ' ').split()):
+        if 'i' not in value:
+            (real, imag) = (float(value), 0)
+        else:
+            (imag, real) = parse_string_to_complex(value)
+        data.setdefault(index % 15, []).append((real, imag))
+    return data
+
+def test_mixed_frame_matches_baseline():
+    rng = np.random.default_rng(0)
+    tokens = []
+    for index in range(15 * 4):
+        (a, b) = rng.uniform(1, 100, 2) * rng.choice([-1, 1], 2)
+        if index % 7 == 3:
+            tokens.append(format(round(a, 4), '.15g'))
+        else:
+            tokens.append('%s%s%si' % (format(round(a, 4), '.15g'), '+' if b >= 0 else '-', format(abs(round(b, 4)), '.15g')))
+    response = '[' + ';'.join([' '.join(tokens[i:i + 15]) for i in range(0, len(tokens), 15)]) + ']'
+
+    data = MatlabSockets('127.0.0.1', 0).ParseComplexData(response)
+    expected = parse_baseline(response)
+    assert data.keys() == expected.keys()
+    for frequency in expected:
+        np.testing.assert_allclose(data[frequency], expected[frequency])
+
+def test_oversized_binary_header_is_retried():
+    values = SensorEmulator(seed=0).GenerateReading()
+
+    # Self-consistent header for 1000 frequencies x 100000 samples of doubles, 1.6 GB
+    oversized = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_HEADER.size + 1000 * 100000 * 2 * 8, 100000, 1000, 8)
+    port, server = start_binary_server([oversized, encode_binary_frame(values, value_size=8)])
+
+    conn = MatlabSockets('127.0.0.1', port)
+    conn.Connect()
+    assert conn.NegotiateBinary()
+
+    data = conn.GetComplexData(max_retries=1)
+    assert conn.stats['retries'] == 1
+    assert len(conn.frame_buffer) <= MAX_FRAME_LENGTH
+    np.testing.assert_allclose([v for frequency in data.values() for v in frequency], [(v.real, v.imag) for v in values.ravel()])
+
+    conn.Disconnect()
+    server.close()
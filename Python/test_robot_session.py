@@ -0,0 +1,91 @@
+import pytest
+import robot_session
+from robot_controller import Robot
+from robot_session import RobotSession, SessionManager
+from rtde_standin import RTDEControlStandIn, standin_factory
+
+# Classes
+
+class NullLogger:
+    def LogData(self, data, tag = None):
+        pass
+
+class FailingStandIn(RTDEControlStandIn):
+    """Stand-in whose connection drops on the first move and never comes back"""
+    def reconnect(self):
+        raise RuntimeError('RTDE control interface could not reconnect')
+
+# Functions
+
+def make_robot(ip, factory):
+    return Robot(ip, [0, 3.14, 0], 0, [0, 0, 0], [0, 0, 0], NullLogger(), controller_factory=factory)
+
+def test_open_records_connect_times():
+    robots = {'vme': make_robot('vme', standin_factory(time_scale=0)), 'cse': make_robot('cse', standin_factory(time_scale=0))}
+    sessions = SessionManager(robots, retry_delay=0)
+    sessions.Open()
+
+    for robot in robots.values():
+        assert robot.controller.isConnected()
+        assert len(robot.connect_times) == 1
+
+    assert sessions.CheckHealth() == {'vme': True, 'cse': True}
+
+    sessions.Close()
+    for robot in robots.values():
+        assert robot.controller is None
+        assert robot.session is None
+
+def test_resume_reuses_interface():
+    robot = make_robot('vme', standin_factory(time_scale=0))
+    session = RobotSession(robot, 'vme', retry_delay=0)
+    session.Open()
+    controller = robot.controller
+
+    robot.Idle()
+    assert not controller.isProgramRunning()
+    assert session.idle_count == 1
+
+    # The next move resumes the stopped script on the same interface
+    robot.Move(0.1, 0.1, 0.1)
+    assert robot.controller is controller
+    assert controller.isProgramRunning()
+    assert controller.move_count == 1
+    assert len(session.resume_times) == 1
+    assert len(robot.connect_times) == 1
+    assert not session.idle
+
+def test_dropped_connection_reconnects():
+    robot = make_robot('vme', standin_factory(time_scale=0, drop_rate=1))
+    sessions = SessionManager({'vme': robot}, retry_delay=0)
+    sessions.Open()
+    controller = robot.controller
+
+    # Every move drops the connection, each following move reconnects first
+    for i in range(3):
+        robot.Move(0.1, 0.1, 0.1 * i)
+    session = sessions.sessions['vme']
+    assert session.reconnect_count == 2
+    assert robot.controller is controller
+    assert controller.move_count == 3
+
+    assert sessions.CheckHealth() == {'vme': False}
+    assert session.reconnect_count == 3
+    assert len(robot.connect_times) == 4
+    assert session.IsHealthy()
+
+def test_reconnect_gives_up_after_max_retries(monkeypatch):
+    robot = make_robot('vme', lambda ip: FailingStandIn(ip, drop_rate=1, time_scale=0))
+    session = RobotSession(robot, 'vme', max_retries=4, retry_delay=1, max_retry_delay=3)
+    session.Open()
+    robot.Move(0.1, 0.1, 0.1)
+
+    delays = []
+    monkeypatch.setattr(robot_session.time, 'sleep', delays.append)
+    with pytest.raises(RuntimeError, match='could not reconnect'):
+        robot.Move(0.1, 0.1, 0.2)
+
+    # Backoff doubles from retry_delay and is capped at max_retry_delay
+    assert delays == [1, 2, 3, 3]
+    assert session.reconnect_count == 5
+    assert robot.controller.move_count == 1
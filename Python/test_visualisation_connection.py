@@ -0,0 +1,87 @@
+import socket, threading
+import numpy as np
+from calculation_functions import ConductivitySet
+from robot_sockets import VisualisationConnection
+from sensor_emulator import SensorEmulator
+from sensor_protocol import complex_array_to_dict
+from visualiser_protocol import VisualiserStreamDecoder, encode_message, decode_message
+
+# Functions
+
+def start_stalled_visualiser(release, read_size = 4096):
+    """Starts a visualiser stand-in that doesn't read until release is set, then decodes everything
+
+    Args:
+        release (threading.Event): Set to start reading
+        read_size (int): Receive buffer size
+
+    Returns:
+        (int, socket, VisualiserStreamDecoder, threading.Thread): Port, listening socket, decoder and reading thread
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, read_size)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    decoder = VisualiserStreamDecoder()
+
+    def serve():
+        conn, _ = server.accept()
+        release.wait()
+        with conn:
+            while True:
+                data = conn.recv(read_size)
+                if not data:
+                    return
+                decoder.Feed(data)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return server.getsockname()[1], server, decoder, thread
+
+def test_binary_series_survive_slow_consumer():
+    positions = 200
+    emulator = SensorEmulator(seed=0)
+    readings = [complex_array_to_dict(emulator.GenerateReading()) for _ in range(positions)]
+    vme_positions = [(0.004 + 0.001 * i, 0) for i in range(positions)]
+
+    release = threading.Event()
+    port, server, decoder, thread = start_stalled_visualiser(release)
+    conn = VisualisationConnection('127.0.0.1', port, queue_size=4, binary=True)
+    conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    conn.connect()
+
+    cs = ConductivitySet(conn, (0, 0), vme_positions)
+    for data in readings:
+        cs.AddData(data)
+
+    release.set()
+    conn.close(timeout=10)
+    thread.join(10)
+    server.close()
+
+    # The queue did overflow, yet nothing the visualiser shows may be missing
+    assert conn.refused_delta_count > 0
+    assert conn.error is None
+    for prefix, series in [(b'R', cs.data), (b'C', cs.conductivities)]:
+        expected = decode_message(encode_message(prefix, series))[3]
+        np.testing.assert_array_equal(decoder.series[prefix], expected)
+
+def test_snapshot_replaces_pending_deltas():
+    conn = VisualisationConnection('127.0.0.1', 0, queue_size=4, binary=True)
+    conn.running = True
+
+    assert conn.send(encode_message(b'R', [[1.0], [2.0]], start=1, delta=True))
+    assert conn.send(encode_message(b'P', [[1.0, 2.0, 3.0]]))
+    assert conn.send(encode_message(b'R', [[1.0], [2.0], [3.0]]))
+    assert [item[0] for item in conn.queue] == [None, 'R']
+    assert conn.coalesced_count == 1
+
+    # Fill the queue, the delta is refused and so is every delta until the next snapshot
+    assert conn.send(encode_message(b'C', [[1.0]], start=1, delta=True))
+    assert conn.send(encode_message(b'A', [[1.0, 2.0]]))
+    assert not conn.send(encode_message(b'C', [[2.0]], start=2, delta=True))
+    conn.queue.popleft()
+    assert not conn.send(encode_message(b'C', [[3.0]], start=3, delta=True))
+    assert conn.send(encode_message(b'C', [[1.0], [2.0], [3.0], [4.0]]))
+    assert conn.send(encode_message(b'C', [[5.0]], start=4, delta=True))
+    assert conn.refused_delta_count == 2
@@ -0,0 +1,168 @@
+import os
+import numpy as np
+
+# File layout: a fixed size header followed by fixed size (label, features) records.
+# The record count is derived from the file size so appending never rewrites the header.
+STORE_MAGIC = b'EBITRAIN'
+STORE_VERSION = 1
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u2'), ('feature_count', '<u2'), ('reserved', 'V20')])
+
+# Classes
+
+class TrainingStore:
+    def __init__(self, path, feature_count = 75):
+        """Initialises an appendable binary store of (label, feature vector) training records.
+
+        Args:
+            path (str): Path to store file, created on first append
+            feature_count (int): Number of features per record, must match an existing file
+
+        Returns:
+            New TrainingStore object
+        """
+        self.path = path
+        self.feature_count = feature_count
+        self.record_dtype = np.dtype([('label', '<u1'), ('features', '<f8', (feature_count,))], align=True)
+
+        if os.path.exists(self.path):
+            self.ReadHeader()
+
+    def ReadHeader(self):
+        header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header['magic'][0] != STORE_MAGIC:
+            raise ValueError('%s is not a training data store' % (self.path))
+
+        if header['version'][0] != STORE_VERSION:
+            raise ValueError('Unsupported training data store version %d' % (header['version'][0]))
+
+        if header['feature_count'][0] != self.feature_count:
+            raise ValueError('Store has %d features per record, expected %d' % (header['feature_count'][0], self.feature_count))
+
+    def WriteHeader(self):
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header['magic'] = STORE_MAGIC
+        header['version'] = STORE_VERSION
+        header['feature_count'] = self.feature_count
+
+        with open(self.path, 'wb') as f:
+            f.write(header.tobytes())
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+
+        # A partially written last record is ignored
+        return (os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // self.record_dtype.itemsize
+
+    def Append(self, labels, features):
+        """Appends records to the end of the store
+
+        Args:
+            labels (list<bool>): Ground truth of each record
+            features (list<list<float>>): Feature vector of each record
+
+        Returns:
+            None
+        """
+        features = np.asarray(features, dtype=np.float64).reshape(-1, self.feature_count)
+
+        records = np.zeros(len(features), dtype=self.record_dtype)
+        records['label'] = np.asarray(labels, dtype=bool)
+        records['features'] = features
+
+        if not os.path.exists(self.path):
+            self.WriteHeader()
+
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+
+    def AppendPairs(self, training_data):
+        """Appends (label, features) pairs as produced by load_real_model_data
+
+        Args:
+            training_data (list<tuple<bool, list<float>>>): Records to append
+
+        Returns:
+            None
+        """
+        if len(training_data) == 0:
+            return
+
+        self.Append([gt for gt, _ in training_data], [data for _, data in training_data])
+
+    def KeepRanges(self, ranges):
+        """Compacts the store in place, keeping only the given record ranges
+
+        Args:
+            ranges (list<tuple<int, int>>): (start, count) of each range to keep, ranges must be in ascending order
+
+        Returns:
+            list<int>: New start index of each kept range
+        """
+        starts = []
+        write_index = 0
+
+        if len(self) > 0:
+            records = np.memmap(self.path, dtype=self.record_dtype, mode='r+', offset=HEADER_DTYPE.itemsize, shape=(len(self),))
+            for start, count in ranges:
+                # Ranges only ever move towards the front, so earlier kept records are never overwritten
+                if start != write_index:
+                    records[write_index:write_index + count] = records[start:start + count]
+                starts.append(write_index)
+                write_index += count
+            records.flush()
+            del records
+
+            with open(self.path, 'r+b') as f:
+                f.truncate(HEADER_DTYPE.itemsize + write_index * self.record_dtype.itemsize)
+
+        return starts
+
+    def Records(self):
+        """Memory-maps all complete records of the store
+
+        Returns:
+            np.ndarray: Structured array with label and features fields, empty if the store doesn't exist
+        """
+        count = len(self)
+        if count == 0:
+            return np.zeros(0, dtype=self.record_dtype)
+
+        return np.memmap(self.path, dtype=self.record_dtype, mode='r', offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+    def Load(self):
+        """Loads the store as ready to use arrays without parsing
+
+        Returns:
+            (np.ndarray, np.ndarray): Labels as booleans shaped (records,) and memory-mapped features shaped (records, feature_count)
+        """
+        records = self.Records()
+        return records['label'].astype(bool), records['features']
+
+# Functions
+
+def import_text_training_data(text_path, store_path, feature_count = 75):
+    """Imports a 'gt|v1;v2;...' text file as written by the old save_training_data
+
+    Args:
+        text_path (str): Path to text file, e.g. 'data.txt'
+        store_path (str): Path to binary store, records are appended if it exists
+        feature_count (int): Number of features per record
+
+    Returns:
+        TrainingStore: Store containing the imported records
+    """
+    labels = []
+    features = []
+    with open(text_path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            split_line = line.split('|')
+            labels.append(split_line[0] == 'True')
+            features.append(np.array(split_line[1].split(';'), dtype=np.float64))
+
+    store = TrainingStore(store_path, feature_count)
+    store.Append(labels, features)
+
+    return store
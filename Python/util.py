@@ -1,5 +1,9 @@
-import inspect, math, uuid, re
+import sys, json, math, uuid, re, time, struct, threading, atexit
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Classes
 
@@ -36,23 +40,317 @@ class progress_bar:
             print()
 
 
+# Binary log records: length of the rest of the record, timestamp, caller length and value count,
+# followed by the caller name and each value as a type byte, 'd' + float64 or 's' + u32 length + utf-8 text
+LOG_RECORD_HEADER = struct.Struct('<IdBI')
+LOG_TEXT_LENGTH = struct.Struct('<I')
+LOG_FORMATS = ('text', 'jsonl', 'binary')
+
 class Logger:
-    def __init__(self, path):
+    def __init__(self, path, format = 'text', buffer_size = 8192, flush_interval = 0.5):
+        """Initialises a buffered logger. Entries are kept in a ring buffer and written by a background thread that keeps the file open.
+
+        Args:
+            path (str): Path to log file, appended to
+            format (str): 'text' for the original '<timestamp> | <caller> | <values>' lines, 'jsonl' for one JSON object per line or 'binary'
+            buffer_size (int): Entries kept before the oldest are dropped, the flush thread is woken when half full
+            flush_interval (float): Longest time in seconds an entry waits before being written
+
+        Returns:
+            New Logger object
+        """
+        if format not in LOG_FORMATS:
+            raise ValueError('Unknown log format %s' % (format))
+
         self.path = path
+        self.format = format
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped_count = 0
+        self.written_count = 0
+
+        # Entries that couldn't be formatted and flushes that failed, the flush thread carries on after either
+        self.failed_count = 0
+        self.flush_error_count = 0
+
+        self.file = open(path, 'ab' if format == 'binary' else 'a')
+        self.write_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.FlushLoop, daemon=True)
+        self.thread.start()
+
+        # Entries still buffered when the program ends are written on exit
+        atexit.register(self.Close)
+
+    def LogData(self, data, tag = None):
+        """Buffers an entry, formatting and writing happen on the flush thread
+
+        Args:
+            data (list): Values to log, converted with str when written
+            tag (str): Name logged with the entry, the calling function's name if None
+
+        Returns:
+            None
+        """
+        if tag is None:
+            tag = sys._getframe(1).f_code.co_name
+
+        buffer = self.buffer
+        if len(buffer) == self.buffer_size:
+            self.dropped_count += 1
+        buffer.append((time.time(), tag, tuple(data)))
+
+        if len(buffer) > self.buffer_size >> 1:
+            self.wake.set()
+
+    def FlushLoop(self):
+        while self.running:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            try:
+                self.Flush()
+            except Exception as err:
+                # Keep flushing later entries, a dead flush thread would let the buffer fill silently
+                self.flush_error_count += 1
+                print('%s: writing log entries failed: %s' % (self.path, str(err)))
+
+    def Flush(self):
+        """Writes all buffered entries, entries that can't be formatted are counted in failed_count and skipped
+
+        Returns:
+            None
+        """
+        with self.write_lock:
+            if self.file.closed:
+                return
+
+            entries = []
+            while self.buffer:
+                entries.append(self.buffer.popleft())
+
+            if len(entries) == 0:
+                return
+
+            formatted = []
+            for entry in entries:
+                try:
+                    formatted.append(self.FormatEntry(*entry))
+                except Exception:
+                    self.failed_count += 1
+
+            self.file.write((b'' if self.format == 'binary' else '').join(formatted))
+            self.file.flush()
+            self.written_count += len(formatted)
+
+    def FormatEntry(self, timestamp, tag, data):
+        if self.format == 'binary':
+            return encode_log_record(timestamp, tag, data)
+        if self.format == 'jsonl':
+            return json.dumps({'time': timestamp, 'caller': tag, 'data': list(data)}, default=str) + '\n'
+        return '%s | %s | %s\r\n' % (datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f"), tag, '; '.join([str(item) for item in data]))
+
+    def Close(self):
+        if not self.running:
+            return
+
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        self.Flush()
+        with self.write_lock:
+            self.file.close()
+        atexit.unregister(self.Close)
+
+        if self.dropped_count > 0:
+            print('%s: dropped %d log entries, raise buffer_size' % (self.path, self.dropped_count))
+        if self.failed_count > 0 or self.flush_error_count > 0:
+            print('%s: %d log entries couldn\'t be formatted, %d flushes failed' % (self.path, self.failed_count, self.flush_error_count))
+
+class DataWindows:
+    def __init__(self, values, group_offsets, n, frequency = None, position = None, lymph = None):
+        """Array backed equivalent of reshape_data_tuples, exposing every window of n consecutive distance samples as a view.
+
+        Args:
+            values (np.ndarray): (distance, real, imaginary) rows shaped (rows, 3), ordered group by group
+            group_offsets (np.ndarray): Start index of each group in values followed by the total row count
+            n (int): Number of consecutive samples in each window
+            frequency (np.ndarray): Frequency of each row (optional)
+            position (np.ndarray): Probe x and y position of each row shaped (rows, 2) (optional)
+            lymph (np.ndarray): Lymph node x and y position of each row shaped (rows, 2) (optional)
+
+        Returns:
+            New DataWindows object
+        """
+        group_offsets = np.asarray(group_offsets)
+        lengths = np.diff(group_offsets)
+        if len(lengths) > 0 and lengths.min() < n:
+            raise IndexError('n can\'t be larger than length of data list')
+
+        self.n = n
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+
+        # Windows over the whole array, shaped (rows - n + 1, n, 3), without copying
+        self.windows = sliding_window_view(self.values, n, axis=0).transpose(0, 2, 1)
+
+        # Only windows that start and end within the same group are used
+        window_counts = lengths - n + 1
+        self.starts = np.concatenate([np.arange(start, start + count) for start, count in zip(group_offsets[:-1], window_counts)] + [np.zeros(0, dtype=np.int64)])
+        group_index = np.repeat(np.arange(len(lengths)), window_counts)
+
+        # Metadata in arrays parallel to starts, frequency is taken from the first row of each group
+        self.frequency = None if frequency is None else np.asarray(frequency)[group_offsets[:-1]][group_index]
+        self.position = None if position is None else np.asarray(position)[self.starts]
+        self.lymph = None if lymph is None else np.asarray(lymph)[self.starts]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def Conductivities(self):
+        """Calculates the conductivities between consecutive samples of every window
 
-    def LogData(self, data):
-        caller = inspect.stack()[1].function
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+        Returns:
+            np.ndarray: Conductivities shaped (windows, n - 1)
+        """
+        distance, real, imag = self.values.T
+        k = 1 / distance[:-1] - 1 / distance[1:]
+        real_diff = real[:-1] - real[1:]
+        imag_diff = imag[:-1] - imag[1:]
+
+        # Pairs spanning two groups are calculated too but never selected
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pairs = (k / (2 * np.pi)) * real_diff / (real_diff * real_diff + imag_diff * imag_diff)
+
+        return sliding_window_view(pairs, self.n - 1)[self.starts]
+
+    def ToDataPoints(self, conductivities = None, means = None, rows = None):
+        """Expands the windows into the nested lists returned by reshape_data_tuples
+
+        Args:
+            conductivities (np.ndarray): Conductivities to append to each data point (optional)
+            means (np.ndarray): Mean conductivities to append to each data point (optional)
+            rows (int): Only include the first rows of each window, all n if None
 
-        flat_list = [str(item) for item in data]
-        str_data = '; '.join(flat_list)
-        output_str = '%s | %s | %s\r\n' % (timestamp, caller, str_data)
+        Returns:
+            list<list>: Data points in the reshape_data_tuples format
+        """
+        rows = self.n if rows is None else rows
+        frequency = self.frequency.tolist() if self.frequency is not None else [None] * len(self)
+        position = self.position.tolist() if self.position is not None else None
+        lymph = self.lymph.tolist() if self.lymph is not None else None
+        conductivities = conductivities.tolist() if conductivities is not None else None
+        means = means.tolist() if means is not None else None
+
+        data_points = []
+        for index, start in enumerate(self.starts.tolist()):
+            data_point = [frequency[index], [tuple(v) for v in self.values[start:start + rows].tolist()]]
+            if position is not None:
+                data_point.append(position[index])
+                if lymph is not None:
+                    data_point.append(lymph[index])
+            if conductivities is not None:
+                data_point.append(conductivities[index])
+            if means is not None:
+                data_point.append(means[index])
+            data_points.append(data_point)
 
-        with open(self.path, 'a+') as f:
-            f.write(output_str)
+        return data_points
 
 # Functions
 
+def encode_log_record(timestamp, tag, data):
+    """Encodes one entry of a binary log
+
+    Args:
+        timestamp (float): Seconds since the epoch
+        tag (str): Caller name
+        data (tuple): Values, real numbers are kept as float64 and everything else, complex numbers included, as text
+
+    Returns:
+        bytes: Encoded record
+    """
+    parts = []
+    for item in data:
+        if isinstance(item, (int, float, np.integer, np.floating)) and not isinstance(item, bool):
+            parts.append(b'd' + struct.pack('<d', item))
+        else:
+            text = str(item).encode('utf-8')
+            parts.append(b's' + LOG_TEXT_LENGTH.pack(len(text)) + text)
+
+    # Caller names are cut to fit their length byte, the reader replaces a split character
+    tag = tag.encode('utf-8')[:255]
+    body = tag + b''.join(parts)
+    return LOG_RECORD_HEADER.pack(LOG_RECORD_HEADER.size - 4 + len(body), timestamp, len(tag), len(data)) + body
+
+def read_binary_log(path):
+    """Reads a log written by Logger with format 'binary'
+
+    Args:
+        path (str): Path to log file
+
+    Returns:
+        list<tuple<float, str, list>>: Timestamp, caller and values of each complete entry
+    """
+    with open(path, 'rb') as f:
+        buffer = f.read()
+
+    entries = []
+    offset = 0
+    while offset + LOG_RECORD_HEADER.size <= len(buffer):
+        (length, timestamp, tag_length, count) = LOG_RECORD_HEADER.unpack_from(buffer, offset)
+        end = offset + 4 + length
+        if end > len(buffer):
+            break
+
+        position = offset + LOG_RECORD_HEADER.size
+        tag = buffer[position:position + tag_length].decode('utf-8', errors='replace')
+        position += tag_length
+
+        values = []
+        for _ in range(count):
+            kind = buffer[position:position + 1]
+            if kind == b'd':
+                values.append(struct.unpack_from('<d', buffer, position + 1)[0])
+                position += 9
+            else:
+                text_length = LOG_TEXT_LENGTH.unpack_from(buffer, position + 1)[0]
+                start = position + 1 + LOG_TEXT_LENGTH.size
+                values.append(buffer[start:start + text_length].decode('utf-8'))
+                position = start + text_length
+
+        entries.append((timestamp, tag, values))
+        offset = end
+
+    return entries
+
+def windows_from_rows(data, n):
+    """Builds DataWindows from a dictionary of grouped rows or a single list of rows
+
+    Args:
+        data (dict<key, list<dict>> or list<dict>): Parsed data, as grouped by get_data_grid
+        n (int): Number of consecutive samples in each window
+
+    Returns:
+        DataWindows: Windows over the rows
+    """
+    groups = list(data.values()) if isinstance(data, dict) else [data]
+    rows = [row for group in groups for row in group]
+    group_offsets = np.cumsum([0] + [len(group) for group in groups])
+
+    values = np.array([(row['distance'], row['real_potential'], row['imaginary_potential']) for row in rows], dtype=np.float64).reshape(-1, 3)
+    frequency = np.array([row['frequency'] for row in rows])
+
+    position = None
+    lymph = None
+    if len(rows) > 0 and 'x_dist' in rows[0].keys():
+        position = np.array([(row['x_dist'], row['y_dist']) for row in rows], dtype=np.float64)
+        if 'lymph_x' in rows[0].keys():
+            lymph = np.array([(row['lymph_x'], row['lymph_y']) for row in rows], dtype=np.float64)
+
+    return DataWindows(values, group_offsets, n, frequency, position, lymph)
+
 def reshape_data_set_tuples(data, n):
     if isinstance(data, list):
         return reshape_data_tuples(data, n)
@@ -88,6 +386,38 @@ def reshape_data_tuples(data, n):
 
     return data_points  
 
+def process_files(func, file_args, workers = None):
+    """Runs a loading function over a list of files, optionally on a pool of worker processes
+
+    Args:
+        func (function): Top level function to call, must be picklable when workers > 1
+        file_args (list<tuple>): Arguments for each call, typically starting with the file path
+        workers (int): Number of worker processes, runs in this process if None or 1
+
+    Returns:
+        list: Return values of func in the same order as file_args
+    """
+    p = progress_bar(len(file_args))
+    results = [None] * len(file_args)
+
+    tic = time.perf_counter()
+    if workers is None or workers <= 1:
+        for index, args in enumerate(file_args):
+            results[index] = func(*args)
+            p.step()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(func, *args): index for index, args in enumerate(file_args)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                p.step()
+    toc = time.perf_counter()
+
+    elapsed = max(toc - tic, 1e-9)
+    print('Loaded %d files in %f s (%.1f files/s, %d workers)' % (len(file_args), elapsed, len(file_args) / elapsed, workers or 1))
+
+    return results
+
 def save_measurement(data):
     timestamp = datetime.now().strftime("%d-%b-%Y %H:%M:%S.%f")
     val = '; '.join([str(round(v, 4)) for v in data[0]])
@@ -148,6 +478,24 @@ def parse_string_to_complex(string_val):
 
     return (real, imag)
 
+def parse_complex_array(values):
+    """Parses a whole line, file or socket payload of complex values in one pass
+
+    Args:
+        values (str or list<str>): Text of 'a+bi'/'a-bi' tokens separated by spaces, semicolons or newlines, or a list of such tokens
+
+    Returns:
+        np.ndarray: complex128 array with one entry per token, tokens without an imaginary part get zero imaginary part
+    """
+    if not isinstance(values, str):
+        values = ' '.join(values)
+
+    tokens = values.replace('i', 'j').replace(';', ' ').split()
+    return np.fromiter(map(complex, tokens), dtype=np.complex128, count=len(tokens))
+
+def complex_array_to_tuples(values):
+    return list(zip(values.real.tolist(), values.imag.tolist()))
+
 def transpose_list_of_lists(l):
     t = []
     for x in range(len(l[0])):
@@ -0,0 +1,129 @@
+import struct
+import numpy as np
+
+# Binary visualiser messages start with a byte no text message starts with, followed by
+# the message type (R, C, P or A), flags, components per value, the frame length including the header,
+# the index of the first series carried, the number of series, values per series and padding.
+# The header is followed by series x values x components float32 values.
+MESSAGE_MARKER = 0xEB
+MESSAGE_HEADER = struct.Struct('<BcBBIHHHxx')
+FLAG_DELTA = 1
+MESSAGE_TYPES = (b'R', b'C', b'P', b'A')
+
+# Classes
+
+class VisualiserStreamDecoder:
+    def __init__(self):
+        """Initialises a decoder that rebuilds the visualiser's series from a stream of binary messages.
+
+        Returns:
+            New VisualiserStreamDecoder object
+        """
+        self.buffer = bytearray()
+        self.series = {b'R': np.zeros((0, 0, 1), dtype=np.float32), b'C': np.zeros((0, 0, 1), dtype=np.float32)}
+        self.points = {b'P': [], b'A': []}
+
+    def Feed(self, data):
+        """Adds received bytes and applies every complete message in them
+
+        Args:
+            data (bytes): Bytes as received from the socket, may hold partial messages
+
+        Returns:
+            list<bytes>: Types of the messages applied
+        """
+        self.buffer.extend(data)
+
+        applied = []
+        while len(self.buffer) >= MESSAGE_HEADER.size:
+            frame_length = decode_message_header(self.buffer)[3]
+            if len(self.buffer) < frame_length:
+                break
+
+            (message_type, start, delta, values) = decode_message(self.buffer[:frame_length])
+            del self.buffer[:frame_length]
+
+            if message_type in self.series:
+                self.ApplySeries(message_type, start, delta, values)
+            else:
+                self.points[message_type].append(values[0, :, 0])
+            applied.append(message_type)
+
+        return applied
+
+    def ApplySeries(self, message_type, start, delta, values):
+        if not delta:
+            self.series[message_type] = values
+            return
+
+        current = self.series[message_type]
+        end = start + len(values)
+        if end > len(current) or current.shape[1:] != values.shape[1:]:
+            grown = np.zeros((max(end, len(current)),) + values.shape[1:], dtype=np.float32)
+            if current.shape[1:] == values.shape[1:]:
+                grown[:len(current)] = current
+            current = grown
+
+        current[start:end] = values
+        self.series[message_type] = current
+
+# Functions
+
+def encode_message(message_type, values, start = 0, delta = False):
+    """Packs series or a point into a binary visualiser message
+
+    Args:
+        message_type (bytes): b'R', b'C', b'P' or b'A'
+        values (list<list<float>> or list<list<tuple<float, float>>>): Series of values, or of (real, imaginary) pairs
+        start (int): Index of the first series carried by a delta message
+        delta (bool): Whether the message only updates series from start onwards
+
+    Returns:
+        bytes: Encoded message
+    """
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim == 1:
+        values = values[np.newaxis, :]
+    if values.ndim == 2:
+        values = values[:, :, np.newaxis]
+
+    (rows, columns, components) = values.shape
+    payload = values.tobytes()
+    header = MESSAGE_HEADER.pack(MESSAGE_MARKER, message_type, FLAG_DELTA if delta else 0, components, MESSAGE_HEADER.size + len(payload), start, rows, columns)
+
+    return header + payload
+
+def decode_message_header(header):
+    """Unpacks a binary visualiser message header
+
+    Args:
+        header (bytes): The first MESSAGE_HEADER.size bytes of a message
+
+    Returns:
+        (bytes, int, int, int, int, int, int): Type, flags, components per value, frame length, start, series and values per series
+    """
+    (marker, message_type, flags, components, frame_length, start, rows, columns) = MESSAGE_HEADER.unpack(bytes(header[:MESSAGE_HEADER.size]))
+    if marker != MESSAGE_MARKER:
+        raise ValueError('Not a binary visualiser message')
+    if message_type not in MESSAGE_TYPES:
+        raise ValueError('Unknown visualiser message type %s' % (message_type))
+    if frame_length != MESSAGE_HEADER.size + rows * columns * components * 4:
+        raise ValueError('Visualiser message length doesn\'t match its shape')
+
+    return message_type, flags, components, frame_length, start, rows, columns
+
+def decode_message(frame):
+    """Decodes a complete binary visualiser message
+
+    Args:
+        frame (bytes): Header and payload of one message
+
+    Returns:
+        (bytes, int, bool, np.ndarray): Type, start, whether it is a delta, and float32 values shaped (series, values, components)
+    """
+    (message_type, flags, components, frame_length, start, rows, columns) = decode_message_header(frame)
+    if len(frame) < frame_length:
+        raise ValueError('Visualiser message incomplete')
+
+    values = np.frombuffer(frame, dtype='<f4', count=rows * columns * components, offset=MESSAGE_HEADER.size)
+    return message_type, start, bool(flags & FLAG_DELTA), values.reshape(rows, columns, components).copy()